@@ -1,15 +1,20 @@
-import random
 import streamlit as st
-import plotly.graph_objects as go
-import plotly.express as px
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from datetime import datetime, timedelta
-import sqlite3
-import pandas as pd
-import json
-import os
+import atexit
+import functools
 import sys
+import time
 from pathlib import Path
 
+# pandas e plotly são importados dentro das funções que os usam: só as
+# páginas que mostram tabelas ou gráficos pagam o import (~0,5 s a frio).
+# O mesmo para backtest, sweep, liquidation e notify (estes dois trazem o
+# requests): ver benchmarks/startup.py --check
+
+from trading import (analytics, cache, db, distribution, downsample, history, metrics, mtm, ohlc,
+                     retention, rollups, settings, supervisor, ticks)
+
 # Adicionar path do projeto
 sys.path.append(str(Path(__file__).parent.parent / 'bots'))
 
@@ -21,229 +26,769 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# CSS Customizado
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #1f77b4;
-        margin-bottom: 0.5rem;
-    }
-    .sub-header {
-        font-size: 1.2rem;
-        color: #666;
-        margin-bottom: 2rem;
-    }
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 10px;
-        padding: 20px;
-        color: white;
-        text-align: center;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .metric-value {
-        font-size: 2rem;
-        font-weight: bold;
-    }
-    .metric-label {
-        font-size: 0.9rem;
-        opacity: 0.9;
-    }
-    .positive { 
-        color: #2ecc71; 
-        font-weight: bold;
-    }
-    .negative { 
-        color: #e74c3c; 
-        font-weight: bold;
-    }
-    .neutral {
-        color: #f39c12;
-        font-weight: bold;
-    }
-    .strategy-card {
-        background-color: #f8f9fa;
-        border-radius: 10px;
-        padding: 15px;
-        margin-bottom: 10px;
-        border-left: 4px solid #1f77b4;
-    }
-    .trade-row {
-        background-color: #ffffff;
-        border-radius: 5px;
-        padding: 10px;
-        margin-bottom: 5px;
-        border: 1px solid #e0e0e0;
-    }
-    .status-indicator {
-        display: inline-block;
-        width: 10px;
-        height: 10px;
-        border-radius: 50%;
-        margin-right: 5px;
-    }
-    .status-active { background-color: #2ecc71; }
-    .status-paused { background-color: #f39c12; }
-    .status-inactive { background-color: #e74c3c; }
-    .log-entry {
-        font-family: 'Courier New', monospace;
-        font-size: 0.85rem;
-        padding: 5px;
-        border-bottom: 1px solid #eee;
-    }
-    .stButton>button {
-        border-radius: 20px;
-        padding: 10px 24px;
-        font-weight: bold;
-    }
-</style>
-""", unsafe_allow_html=True)
+# CSS Customizado (lido do disco uma vez por processo; ver load_styles)
+STYLE_PATH = Path(__file__).parent / 'assets' / 'style.css'
 
 # Configurações
 INITIAL_BANKROLL = 1000.0  # $1000 USD conforme solicitado
 
+# Gráfico de equity: pontos enviados ao browser (~largura em pixels)
+EQUITY_CHART_POINTS = 1500
+EQUITY_DOWNSAMPLING = 'lttb'  # 'lttb' ou 'minmax'
+
+# Linhas e pontos passam a WebGL (Scattergl) acima deste número de pontos
+WEBGL_POINTS = 1000
+# Cores das estratégias nas sobreposições (paleta por omissão do Plotly)
+STRATEGY_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                   '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
+
+STATUS_LABELS = {
+    'active': '🟢 ATIVO',
+    'starting': '🔵 A ARRANCAR',
+    'stalled': '🟠 LENTO',
+    'paused': '🟡 PAUSADO',
+    'crashed': '🔴 FALHOU',
+    'inactive': '🔴 INATIVO'
+}
+# Estado do worker (bloco do supervisor) -> chave de STATUS_LABELS
+WORKER_STATUS = {
+    supervisor.RUNNING: 'active',
+    supervisor.STARTING: 'starting',
+    supervisor.PAUSED: 'paused',
+    supervisor.CRASHED: 'crashed',
+    supervisor.STOPPED: 'inactive'
+}
+# Worker a correr sem heartbeat há mais de STALL_AFTER s aparece como lento
+STALL_AFTER = 10
+
+# Modo live: intervalo de atualização (s) de cada widget; 0 desativa
+REFRESH_INTERVALS = {
+    'sidebar': 5,
+    'positions': 10,
+    'trades': 10
+}
+REFRESH_LABELS = {
+    'sidebar': 'Status da sidebar',
+    'positions': 'Posições Abertas',
+    'trades': 'Trades Recentes'
+}
+
+# Histórico de trades
+HISTORY_PAGE_SIZE = 50
+# Trades no máximo num CSV exportado pelo dashboard (~150 bytes cada)
+HISTORY_EXPORT_MAX_ROWS = 100000
+HISTORY_STATUS = {'Todos': None, 'Aberto': db.STATUS_OPEN, 'Fechado': db.STATUS_CLOSED}
+
+# Gráficos de mercado: barras mínimas na janela (escolhe a resolução OHLC)
+MARKET_CHART_BARS = 200
+MARKET_CHART_PERIODS = {'1 dia': 1, '7 dias': 7, '30 dias': 30, '90 dias': 90, 'Tudo': None}
+
+# Modos de operação; no modo Backtest o dashboard lê a DB de um backtest
+MODES = ["Paper Trading", "Backtest", "Live"]
+BACKTEST_RESOLUTIONS = {'1 minuto': '1m', '5 minutos': '5m', '1 hora': '1h', 'Ticks': None}
+
+# Varrimento de parâmetros: métrica -> (coluna, ordem ascendente no ranking)
+SWEEP_METRICS = {
+    'Sharpe': ('sharpe', False),
+    'P&L ($)': ('pnl', False),
+    'Max Drawdown (%)': ('max_drawdown', True)
+}
+SWEEP_TOP = 20
+
+# Cache partilhada pelas sessões: validade dos dados fora da DB (ticks,
+# estado dos workers) e memória máxima dos resultados guardados
+LIVE_TTL = 1.0  # s
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# s para enviar os alertas em espera de um notifier substituído (corre no
+# run do script que mudou as configurações)
+NOTIFIER_CLOSE_TIMEOUT = 1.0
+
 # ==================== FUNÇÕES DE DADOS ====================
 
-def init_database():
-    """Inicializa database se não existir"""
-    db_path = Path(__file__).parent.parent / 'bots' / 'data' / 'trading_bot.db'
-    db_path.parent.mkdir(parents=True, exist_ok=True)
+def get_db_path():
+    """DB da sessão: a dos bots ou, no modo Backtest, a do backtest escolhido"""
+    run = st.session_state.get('backtest_run')
+    if st.session_state.get('mode') == 'Backtest' and run:
+        from trading import backtest
+        return backtest.run_path(run)
+    return db.DB_PATH
+
+@st.cache_resource(on_release=db.ConnectionPool.close)
+def open_pool(db_path):
+    """Pool de ligações a uma DB, partilhado por todas as sessões"""
+    return db.ConnectionPool(db_path)
+
+@st.cache_resource(on_release=cache.VersionedCache.close)
+def open_cache(db_path):
+    """Cache de resultados de uma DB, partilhada pelas sessões e invalidada quando há commits"""
+    return cache.VersionedCache(db_path, max_bytes=CACHE_MAX_BYTES, session=get_session_id)
+
+def release_db(db_path):
+    """Fecha o pool e a cache de uma DB (antes e depois de o ficheiro ser trocado)"""
+    open_pool.clear(db_path)
+    open_cache.clear(db_path)
+
+def get_session_id():
+    """Sessão do Streamlit da thread atual (None fora de um run)"""
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+def get_pool():
+    """Pool de ligações à DB da sessão"""
+    return open_pool(get_db_path())
+
+def get_cache():
+    """Cache de resultados da DB da sessão"""
+    return open_cache(get_db_path())
+
+def versioned(func=None, ttl=None, rows=None, track_db=True):
+    """Reutiliza o resultado de um getter enquanto o data_version da DB não mudar.
     
-    if not db_path.exists():
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS trades (
-                id TEXT PRIMARY KEY,
-                market_id TEXT,
-                strategy TEXT,
-                direction TEXT,
-                entry_price REAL,
-                exit_price REAL,
-                size_usd REAL,
-                quantity REAL,
-                entry_time TIMESTAMP,
-                exit_time TIMESTAMP,
-                status TEXT,
-                pnl REAL,
-                pnl_pct REAL,
-                exit_reason TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS daily_metrics (
-                date TEXT PRIMARY KEY,
-                starting_bankroll REAL,
-                ending_bankroll REAL,
-                daily_pnl REAL,
-                daily_pnl_pct REAL,
-                num_trades INTEGER,
-                win_rate REAL,
-                sharpe_ratio REAL,
-                max_drawdown REAL
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+    O resultado é partilhado por todas as sessões; ``ttl`` (s) limita a
+    validade dos que dependem de dados fora da DB e ``track_db=False``
+    ignora os commits (a chave já identifica os dados).
+    """
+    if func is None:
+        return functools.partial(versioned, ttl=ttl, rows=rows, track_db=track_db)
+    # getter.* inclui a consulta à cache; query.* só corre quando há miss
+    compute = metrics.timed(f'query.{func.__name__}', rows=rows)(func)
+    @metrics.timed(f'getter.{func.__name__}', rows=rows)
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return get_cache().get_or_compute(
+            cache.call_key(func, args, kwargs), lambda: compute(*args, **kwargs),
+            ttl=ttl, name=func.__name__, track_db=track_db)
+    return wrapper
+
+@st.cache_resource
+def get_tick_store():
+    """Armazém de ticks de preço (memmaps partilhados por todas as sessões)"""
+    return ticks.TickStore(ticks.TICKS_DIR)
+
+@st.cache_resource
+def get_bar_store():
+    """Barras OHLCV por mercado, mantidas a partir do armazém de ticks"""
+    return ohlc.BarStore(get_tick_store())
+
+@st.cache_resource
+def get_status_block():
+    """Bloco de estado do supervisor dos workers (memória partilhada, lido sem IPC)"""
+    return supervisor.StatusBlock()
+
+@st.cache_resource
+def open_exchange(live):
+    """Destino das ordens de fecho: a exchange (modo Live) ou os preços dos ticks"""
+    from trading import liquidation
+    if live:
+        return liquidation.ExchangeClient(liquidation.EXCHANGE_URL)
+    return liquidation.PaperExchange(get_tick_store())
+
+def close_notifier(notifier):
+    """Esvazia as filas e pára as threads de um notifier largado da cache"""
+    atexit.unregister(notifier.close)
+    notifier.close(NOTIFIER_CLOSE_TIMEOUT)
 
-def get_mock_data():
-    """Retorna dados mock para demonstração"""
-    dates = pd.date_range(start='2026-02-20', periods=10, freq='H')
+@st.cache_resource(max_entries=1, on_release=close_notifier)
+def open_notifier(config):
+    """Notifier do dashboard para uma configuração dos canais (threads de envio próprias)"""
+    from trading import notify
+    notifier = notify.from_config(dict(config))
+    # O on_release não corre quando o processo sai
+    atexit.register(notifier.close)
+    return notifier
+
+def get_notifier():
+    """Notifier com os canais guardados; recriado quando as configurações mudam"""
+    return open_notifier(tuple(sorted(settings.load_notifications().items())))
+
+@st.cache_resource
+def get_started_at():
+    """Hora de arranque do processo do dashboard"""
+    return datetime.now()
+
+@st.cache_resource
+def load_styles():
+    """CSS da página, lido do disco uma vez por processo"""
+    return f"<style>\n{STYLE_PATH.read_text(encoding='utf-8')}</style>"
+
+@st.cache_resource
+@metrics.timed('init_database')
+def init_database():
+    """Bootstrap do processo: migrações do schema e recursos partilhados.
     
-    # Simular curva de equity
-    equity = [INITIAL_BANKROLL]
-    for i in range(1, 10):
-        change = equity[-1] * random.uniform(-0.02, 0.03)
-        equity.append(equity[-1] + change)
+    Corre uma vez por processo; nos reruns seguintes é só uma consulta à
+    cache de recursos.
+    """
+    # O pool aplica as migrações em falta (PRAGMA user_version) ao abrir
+    get_pool()
+    get_cache()
+    get_started_at()
+    load_styles()
+
+@versioned
+def refresh_rollups():
+    """Incorpora nos rollups os trades fechados desde o último rerun"""
+    with get_pool().connection() as conn:
+        rollups.refresh(conn, INITIAL_BANKROLL)
+
+@st.cache_data(max_entries=32)
+@metrics.timed('query.load_equity_curve')
+def load_equity_curve(version, start, end, points):
+    """Série de equity reduzida a ~points pontos (cache por DB, janela e resolução)"""
+    import pandas as pd
     
+    with get_pool().connection() as conn:
+        ts, equity = rollups.equity_curve(conn, INITIAL_BANKROLL, start, end)
+    ts, equity = downsample.downsample(ts, equity, points, method=EQUITY_DOWNSAMPLING)
     return pd.DataFrame({
-        'timestamp': dates,
+        'timestamp': pd.to_datetime(ts.astype('int64'), unit='s'),
         'equity': equity
     })
 
+@versioned
+def get_equity_curve(start=None, end=None, points=None):
+    """Retorna a curva de equity entre start e end (todo o histórico por omissão)"""
+    with get_pool().connection() as conn:
+        version = (str(get_db_path()), rollups.sequence(conn))
+    return load_equity_curve(version, start, end, points or EQUITY_CHART_POINTS)
+
+@versioned
+def get_equity_range():
+    """Retorna (primeiro, último) fecho de trade como datetime"""
+    with get_pool().connection() as conn:
+        first, last = rollups.closed_range(conn)
+    return db.parse_time(first), db.parse_time(last)
+
+def format_duration(delta):
+    """Formata um timedelta como '2h 15m'"""
+    minutes = max(int(delta.total_seconds() // 60), 0)
+    if minutes >= 24 * 60:
+        return f"{minutes // (24 * 60)}d {minutes % (24 * 60) // 60}h"
+    return f"{minutes // 60}h {minutes % 60}m"
+
+@versioned
 def get_trading_stats():
     """Retorna estatísticas de trading"""
-    # Mock data - substituir por dados reais da DB
+    with get_pool().connection() as conn:
+        totals = rollups.read_strategies(conn).values()
+        today = rollups.read_day(conn)
+        open_positions = db.count_open_trades(conn)
+    
+    total_trades = sum(t['num_trades'] for t in totals)
+    winning_trades = sum(t['wins'] for t in totals)
+    losing_trades = sum(t['losses'] for t in totals)
+    total_pnl = sum(t['pnl_sum'] for t in totals)
+    current_bankroll = INITIAL_BANKROLL + total_pnl
+    # Sem trades fechados hoje o dia começa com o capital atual
+    today = today or {'starting_bankroll': current_bankroll, 'daily_pnl': 0.0, 'daily_pnl_pct': 0.0}
+    
     return {
-        'current_bankroll': 1045.50,
-        'total_pnl': 45.50,
-        'total_pnl_pct': 4.55,
-        'daily_pnl': 12.30,
-        'daily_pnl_pct': 1.19,
-        'open_positions': 2,
-        'total_trades': 8,
-        'winning_trades': 5,
-        'losing_trades': 3,
-        'win_rate': 62.5,
-        'avg_trade_pnl': 5.69
+        'current_bankroll': current_bankroll,
+        'starting_bankroll': today['starting_bankroll'],
+        'total_pnl': total_pnl,
+        'total_pnl_pct': total_pnl / INITIAL_BANKROLL * 100,
+        'daily_pnl': today['daily_pnl'],
+        'daily_pnl_pct': today['daily_pnl_pct'],
+        'open_positions': open_positions,
+        'total_trades': total_trades,
+        'winning_trades': winning_trades,
+        'losing_trades': losing_trades,
+        'win_rate': winning_trades / total_trades * 100 if total_trades else 0.0,
+        'avg_trade_pnl': total_pnl / total_trades if total_trades else 0.0
     }
 
+@versioned
+def load_open_trades():
+    """Linhas dos trades abertos"""
+    with get_pool().connection() as conn:
+        return [dict(row) for row in db.fetch_open_trades(conn)]
+
+@versioned
+def get_position_book():
+    """Posições abertas em arrays (reconstruído só quando a DB muda)"""
+    return mtm.PositionBook(load_open_trades())
+
+def get_risk_limits():
+    """Limites de risco guardados (settings.json)"""
+    return settings.load_risk_limits()
+
+@versioned
+def get_retention_status():
+    """Tamanho da DB quente e arquivos mensais (ver trading.retention)"""
+    with get_pool().connection() as conn:
+        return retention.status(conn)
+
+@versioned(ttl=LIVE_TTL, rows=lambda result: len(result[0]))
+def get_portfolio_marks():
+    """Reavalia as posições abertas ao último preço de cada mercado.
+    
+    Retorna (livro, marks): ver mtm.mark. O limite de perda diária é
+    max_daily_loss_pct do capital de início do dia.
+    """
+    book = get_position_book()
+    stats = get_trading_stats()
+    limit = get_risk_limits()['max_daily_loss_pct'] / 100 * stats['starting_bankroll']
+    prices = get_tick_store().last_prices(book.markets)
+    return book, mtm.mark(book, prices, stats['daily_pnl'], limit)
+
+@versioned(ttl=LIVE_TTL)
 def get_open_positions():
-    """Retorna posições abertas"""
-    return [
-        {
-            'market': 'BTC > $100K by March 2026',
-            'strategy': 'Momentum',
-            'entry': 0.65,
-            'current': 0.72,
-            'pnl_pct': 10.77,
-            'size': 50.00,
-            'time': '2h 15m',
-            'direction': 'LONG'
-        },
-        {
-            'market': 'Trump says "Russia" in SOTU',
-            'strategy': 'MeanReversion',
-            'entry': 0.12,
-            'current': 0.14,
-            'pnl_pct': 16.67,
-            'size': 40.00,
-            'time': '4h 30m',
-            'direction': 'LONG'
+    """Retorna posições abertas (dict de colunas)"""
+    book, marks = get_portfolio_marks()
+    
+    now = datetime.now().timestamp()
+    return {
+        'market': [book.markets[i] for i in book.market],
+        'strategy': [book.strategies[i] for i in book.strategy],
+        'entry': book.entry_price,
+        'current': marks['price'],
+        'pnl_pct': marks['pnl_pct'],
+        'unrealized': marks['unrealized'],
+        'size': book.size,
+        'time': [format_duration(timedelta(seconds=now - ts)) for ts in book.entry_ts],
+        'direction': [('LONG' if sign > 0 else 'SHORT') for sign in book.direction]
+    }
+
+def get_worker_status():
+    """Estado dos workers lido do bloco partilhado: dict nome -> campos do registo"""
+    block = get_status_block()
+    now = time.time()
+    alive = block.supervisor_alive(now)
+    snapshot = block.snapshot()
+    workers = {}
+    for i, name in enumerate(snapshot['name']):
+        heartbeat = snapshot['heartbeat'][i]
+        status = WORKER_STATUS[snapshot['state'][i]] if alive else 'inactive'
+        if status == 'active' and now - heartbeat > STALL_AFTER:
+            status = 'stalled'
+        workers[name] = {
+            'status': status,
+            'command': int(snapshot['command'][i]),
+            'started': snapshot['started'][i] if alive and snapshot['pid'][i] else None,
+            'heartbeat_age': now - heartbeat if heartbeat else None,
+            'last_trade': snapshot['last_trade'][i] or None,
+            'loop_ms': float(snapshot['loop_ms_avg'][i]),
+            'restarts': int(snapshot['restarts'][i]),
+            'error': snapshot['error'][i]
         }
-    ]
+    return workers
 
+@versioned(ttl=LIVE_TTL)
 def get_strategy_status():
     """Retorna status das estratégias"""
-    return [
-        {'name': 'Momentum', 'pnl': 28.50, 'win_rate': 65, 'status': 'active', 'trades': 4},
-        {'name': 'MeanReversion', 'pnl': 17.00, 'win_rate': 60, 'status': 'active', 'trades': 3},
-        {'name': 'Scalping', 'pnl': 0, 'win_rate': 0, 'status': 'paused', 'trades': 0},
-        {'name': 'Contrarian', 'pnl': 0, 'win_rate': 0, 'status': 'inactive', 'trades': 0}
-    ]
+    metrics = get_strategy_metrics()
+    workers = get_worker_status()
+    
+    strategies = []
+    for name in dict.fromkeys([*supervisor.STRATEGIES, *metrics]):
+        m = metrics.get(name, {'num_trades': 0, 'win_rate': 0.0, 'pnl_sum': 0.0})
+        worker = workers.get(name, {'status': 'inactive', 'command': supervisor.STOP})
+        strategies.append({
+            'name': name,
+            'pnl': m['pnl_sum'],
+            'win_rate': round(m['win_rate']),
+            'status': worker['status'],
+            'trades': m['num_trades'],
+            'worker': worker if name in workers else None
+        })
+    return strategies
+
+@st.cache_resource(max_entries=2)
+@metrics.timed('query.load_closed_trades', rows=lambda result: len(result[0]['pnl']))
+def load_closed_trades(version):
+    """Arrays NumPy dos trades fechados para uma versão (DB, watermark) dos rollups"""
+    with get_pool().connection() as conn:
+        trades = analytics.load_closed_trades(conn)
+    return trades, analytics.strategy_metrics(trades, base=INITIAL_BANKROLL)
+
+@versioned
+def get_closed_trades():
+    """Retorna os trades fechados como arrays (recarregados só com trades novos)"""
+    with get_pool().connection() as conn:
+        version = (str(get_db_path()), rollups.sequence(conn))
+    return load_closed_trades(version)[0]
+
+@versioned
+def get_strategy_analytics():
+    """Retorna as métricas vetorizadas por estratégia (analytics)"""
+    with get_pool().connection() as conn:
+        version = (str(get_db_path()), rollups.sequence(conn))
+    return load_closed_trades(version)[1]
+
+@versioned
+def get_history_page(filters, after, page_size=None):
+    """Retorna uma página do histórico (linhas, cursor seguinte)"""
+    with get_pool().connection() as conn:
+        rows, next_cursor = history.fetch_page(conn, filters, after, page_size or HISTORY_PAGE_SIZE)
+    return [dict(row) for row in rows], next_cursor
+
+@metrics.timed('getter.export_history_csv')
+def export_history_csv(filters):
+    """CSV do histórico filtrado, até HISTORY_EXPORT_MAX_ROWS trades.
+
+    O download_button envia o ficheiro inteiro de uma vez, por isso o CSV
+    fica todo em memória; o limite mantém-no em algumas dezenas de MB. O
+    histórico completo exporta-se com ``python -m trading.history export``.
+    """
+    with get_pool().connection() as conn:
+        return ''.join(history.iter_csv(conn, filters, limit=HISTORY_EXPORT_MAX_ROWS)).encode('utf-8')
+
+@st.cache_data(max_entries=4)
+@metrics.timed('query.load_sweep', rows=lambda result: len(result['results']['strategy']))
+def load_sweep(name, mtime):
+    """Resultado de um varrimento (cache até o ficheiro mudar)"""
+    from trading import sweep
+    return sweep.load(name)
+
+def get_sweep_mtime(name):
+    """Versão (mtime) do ficheiro de um varrimento"""
+    from trading import sweep
+    return (sweep.SWEEP_DIR / f'{name}.json').stat().st_mtime
+
+def get_sweep(name):
+    """Retorna o varrimento de parâmetros gravado com este nome"""
+    return load_sweep(name, get_sweep_mtime(name))
+
+@versioned(track_db=False)
+def load_sweep_rows(name, mtime, strategy):
+    """Combinações de uma estratégia num varrimento (DataFrame)"""
+    import pandas as pd
+    
+    with metrics.span('pandas.sweep') as span:
+        rows = pd.DataFrame(load_sweep(name, mtime)['results'])
+        rows = rows[rows['strategy'] == strategy].drop(columns='strategy')
+        span.rows = len(rows)
+    return rows
 
+def get_sweep_rows(name, strategy):
+    """Retorna as combinações de uma estratégia no varrimento gravado com este nome"""
+    return load_sweep_rows(name, get_sweep_mtime(name), strategy)
+
+@versioned(track_db=False)
+def load_sweep_heatmap(name, mtime, strategy, metric, size):
+    """Heatmap stop × take-profit de uma métrica para um tamanho de posição"""
+    import plotly.graph_objects as go
+    
+    column, ascending = SWEEP_METRICS[metric]
+    rows = load_sweep_rows(name, mtime, strategy)
+    grid = rows[rows['max_position_pct'] == size].pivot_table(
+        index='stop_loss_pct', columns='take_profit_pct', values=column)
+    with metrics.span('chart.sweep_heatmap', rows=grid.size):
+        fig = go.Figure(go.Heatmap(
+            z=grid.values,
+            x=[f"{v:.0f}%" for v in grid.columns],
+            y=[f"{v:.0f}%" for v in grid.index],
+            colorscale='RdYlGn_r' if ascending else 'RdYlGn',
+            colorbar=dict(title=metric)
+        ))
+        fig.update_layout(xaxis_title="Take Profit", yaxis_title="Stop Loss", height=400)
+    return fig
+
+def get_sweep_heatmap(name, strategy, metric, size):
+    """Retorna o heatmap de um varrimento (partilhado até o ficheiro mudar)"""
+    return load_sweep_heatmap(name, get_sweep_mtime(name), strategy, metric, size)
+
+@versioned(ttl=LIVE_TTL, track_db=False)
+def get_market_bars(market_id, start, end):
+    """Retorna (resolução, barras) do mercado entre start e end (ms)"""
+    bar_store = get_bar_store()
+    # Incremental: só agrega os ticks chegados desde a última chamada
+    bar_store.update(market_id)
+    resolution = ohlc.pick_resolution(start, end, MARKET_CHART_BARS)
+    return resolution, bar_store.bars(market_id, resolution, start, end)
+
+@versioned
+def get_strategy_metrics():
+    """Retorna os rollups por estratégia (strategy_metrics)"""
+    with get_pool().connection() as conn:
+        return rollups.read_strategies(conn)
+
+@versioned
 def get_recent_trades():
     """Retorna trades recentes"""
+    with get_pool().connection() as conn:
+        rows = db.fetch_recent_trades(conn, limit=5)
+    
     return [
-        {'time': '14:32:15', 'strategy': 'Momentum', 'market': 'BTC_100K', 'action': 'BUY', 'price': 0.65, 'pnl': None},
-        {'time': '14:28:10', 'strategy': 'MeanRev', 'market': 'Trump_Russia', 'action': 'BUY', 'price': 0.12, 'pnl': None},
-        {'time': '13:45:22', 'strategy': 'Momentum', 'market': 'ETH_5000', 'action': 'SELL', 'price': 0.45, 'pnl': '+3.2%'},
-        {'time': '12:15:08', 'strategy': 'MeanRev', 'market': 'China_Coup', 'action': 'SELL', 'price': 0.05, 'pnl': '+8.0%'},
-        {'time': '11:30:45', 'strategy': 'Momentum', 'market': 'NATO_Expand', 'action': 'BUY', 'price': 0.78, 'pnl': '-2.1%'}
+        {
+            'time': db.parse_time(row['time']).strftime('%H:%M:%S'),
+            'strategy': row['strategy'],
+            'market': row['market_id'],
+            'action': row['action'],
+            'price': row['price'],
+            'pnl': f"{row['pnl_pct']:+.1f}%" if row['pnl_pct'] is not None else None
+        }
+        for row in rows
     ]
 
+# ==================== FIGURAS ====================
+# Construídas uma vez por versão dos dados e partilhadas pelas sessões
+# (o st.plotly_chart só serializa a figura, não a altera)
+
+def scatter_trace(x, y, **kwargs):
+    """Trace de linha/pontos: SVG até WEBGL_POINTS pontos, WebGL (Scattergl) acima"""
+    import plotly.graph_objects as go
+    
+    trace = go.Scattergl if len(x) > WEBGL_POINTS else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+@versioned
+def get_equity_figure(start=None, end=None):
+    """Gráfico da curva de equity entre start e end"""
+    import plotly.graph_objects as go
+    
+    equity_data = get_equity_curve(start, end)
+    with metrics.span('chart.equity', rows=len(equity_data)):
+        fig = go.Figure()
+        fig.add_trace(scatter_trace(
+            equity_data['timestamp'],
+            equity_data['equity'],
+            mode='lines',
+            name='Equity',
+            line=dict(color='#1f77b4', width=2),
+            fill='tozeroy',
+            fillcolor='rgba(31, 119, 180, 0.2)'
+        ))
+        
+        fig.add_hline(y=INITIAL_BANKROLL, line_dash="dash", line_color="red", 
+                     annotation_text="Capital Inicial")
+        
+        fig.update_layout(
+            xaxis_title="Data/Hora",
+            yaxis_title="USD",
+            hovermode='x unified',
+            showlegend=False,
+            height=400
+        )
+    return fig
+
+@versioned
+def get_strategy_table():
+    """Tabela de métricas por estratégia (DataFrame)"""
+    import pandas as pd
+    
+    results = get_strategy_analytics()
+    with metrics.span('pandas.strategy_metrics', rows=len(results['strategy'])):
+        return pd.DataFrame({
+            'Estratégia': results['strategy'],
+            'Trades': results['trades'],
+            'Win Rate (%)': results['win_rate'].round(1),
+            'P&L Total ($)': results['total_pnl'].round(2),
+            'Avg Trade ($)': results['avg_pnl'].round(2),
+            'Mediana ($)': results['median_pnl'].round(2),
+            'Sharpe': results['sharpe'].round(2),
+            'Sortino': results['sortino'].round(2),
+            'Profit Factor': results['profit_factor'].round(2),
+            'Expectancy ($)': results['expectancy'].round(2),
+            'Max Drawdown (%)': results['max_drawdown'].round(1)
+        })
+
+@versioned
+def get_strategy_win_rate_figure():
+    """Barras de win rate (cor = P&L) das estratégias com trades"""
+    import plotly.express as px
+    
+    strategy_metrics = get_strategy_table()
+    with metrics.span('chart.strategy_win_rate', rows=len(strategy_metrics)):
+        return px.bar(strategy_metrics[strategy_metrics['Trades'] > 0], 
+                      x='Estratégia', y='Win Rate (%)',
+                      color='P&L Total ($)',
+                      title="Win Rate vs P&L por Estratégia")
+
+@versioned
+def get_returns_distribution():
+    """Bins, quantis e densidade do P&L (%) dos trades fechados, total e por estratégia"""
+    trades = get_closed_trades()
+    with metrics.span('numpy.returns_distribution', rows=len(trades['pnl_pct'])):
+        return distribution.summarize(trades['pnl_pct'], trades['codes'],
+                                      [str(name) for name in trades['strategies']])
+
+@versioned
+def get_returns_histogram(by_strategy=False):
+    """Histograma do P&L (%) com densidade e quantis; só as contagens vão para o browser"""
+    import plotly.graph_objects as go
+    
+    dist = get_returns_distribution()
+    with metrics.span('chart.returns_histogram', rows=len(dist['counts'])):
+        fig = go.Figure()
+        if by_strategy:
+            # Barras sobrepostas nos mesmos bins, uma cor por estratégia
+            for i, (name, group) in enumerate(dist['groups'].items()):
+                color = STRATEGY_COLORS[i % len(STRATEGY_COLORS)]
+                fig.add_trace(go.Bar(x=dist['centers'], y=group['counts'], width=dist['width'],
+                                     name=name, marker_color=color, opacity=0.45,
+                                     legendgroup=name))
+                fig.add_trace(scatter_trace(dist['kde_x'], group['kde_y'], mode='lines', name=name,
+                                            line=dict(color=color, width=2), legendgroup=name,
+                                            showlegend=False, hoverinfo='skip'))
+        else:
+            fig.add_trace(go.Bar(x=dist['centers'], y=dist['counts'], width=dist['width'],
+                                 name='Trades', marker_color='#1f77b4', opacity=0.7))
+            fig.add_trace(scatter_trace(dist['kde_x'], dist['kde_y'], mode='lines', name='Densidade',
+                                        line=dict(color='#ff7f0e', width=2), hoverinfo='skip'))
+        
+        for q, value in dist['quantiles'].items():
+            fig.add_vline(x=value, line_dash="dot", line_color="gray",
+                          annotation_text=f"p{q * 100:g}", annotation_position="top")
+        fig.add_vline(x=0, line_dash="dash", line_color="red")
+        fig.update_layout(
+            title="Distribuição de P&L por Trade (%)",
+            xaxis_title="P&L %",
+            yaxis_title="Frequência",
+            barmode='overlay',
+            bargap=0,
+            height=400
+        )
+    return fig
+
+@versioned(ttl=LIVE_TTL, track_db=False)
+def get_market_figure(market_id, start, end):
+    """Candlestick do mercado entre start e end (ms)"""
+    import pandas as pd
+    import plotly.graph_objects as go
+    
+    _, bars = get_market_bars(market_id, start, end)
+    with metrics.span('chart.market_ohlc', rows=len(bars['ts'])):
+        fig = go.Figure(go.Candlestick(
+            x=pd.to_datetime(bars['ts'], unit='ms'),
+            open=bars['open'],
+            high=bars['high'],
+            low=bars['low'],
+            close=bars['close'],
+            name=market_id
+        ))
+        fig.update_layout(
+            xaxis_title="Data/Hora",
+            yaxis_title="Preço",
+            xaxis_rangeslider_visible=False,
+            height=400
+        )
+    return fig
+
+# ==================== ATUALIZAÇÃO EM TEMPO REAL ====================
+
+def get_refresh_intervals():
+    """Intervalos de atualização (s) por widget, guardados na sessão"""
+    return st.session_state.setdefault('refresh_intervals', dict(REFRESH_INTERVALS))
+
+def live_fragment(func, widget):
+    """Envolve func num st.fragment que se atualiza sozinho no modo live.
+    
+    Só o fragment é re-executado a cada intervalo; o resto da página
+    (gráficos Plotly incluídos) não é reenviado ao browser.
+    """
+    run_every = None
+    if st.session_state.get('live_mode', True):
+        run_every = get_refresh_intervals()[widget] or None
+    return st.fragment(func, run_every=run_every)
+
+def render_sidebar_status():
+    """Bloco de status da sidebar (atualizado por fragment)"""
+    refresh_rollups()
+    stats = get_trading_stats()
+    started_at = get_started_at()
+    uptime = format_duration(datetime.now() - started_at)
+    
+    st.markdown("""
+    **🟢 Status:** Online  
+    **⏱️ Uptime:** {}  
+    **📅 Última atualização:**  
+    {}  
+    **💰 Capital:** ${:,.2f}  
+    **📈 P&L:** {}${:,.2f} ({:+.2f}%)
+    """.format(
+        uptime,
+        datetime.now().strftime("%H:%M:%S"),
+        stats['current_bankroll'],
+        '+' if stats['total_pnl'] >= 0 else '-',
+        abs(stats['total_pnl']),
+        stats['total_pnl_pct']
+    ))
+
+# ==================== INSTRUMENTAÇÃO ====================
+
+def on_metrics_toggled():
+    """Liga/desliga a instrumentação para todo o processo"""
+    metrics.REGISTRY.enabled = st.session_state['metrics_enabled']
+
+def render_debug_panel():
+    """Painel de debug na sidebar com os tempos agregados por span"""
+    with st.sidebar.expander("🐞 Debug"):
+        # Cálculos da cache partilhada: quantas chamadas e sessões serviu cada um
+        computations = get_cache().computations()
+        st.dataframe(
+            {
+                'getter': list(computations),
+                **{field: [c[field] for c in computations.values()]
+                   for field in ('computations', 'served', 'sessions_per_computation', 'max_sessions')}
+            },
+            column_config={
+                'getter': st.column_config.TextColumn("Getter"),
+                'computations': st.column_config.NumberColumn("Cálculos"),
+                'served': st.column_config.NumberColumn("Servidos"),
+                'sessions_per_computation': st.column_config.NumberColumn("Sessões/cálculo", format="%.1f"),
+                'max_sessions': st.column_config.NumberColumn("Máx. sessões")
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+        
+        st.toggle("Instrumentação", value=metrics.REGISTRY.enabled,
+                  key="metrics_enabled", on_change=on_metrics_toggled)
+        if not metrics.REGISTRY.enabled:
+            st.caption("Ligar para medir queries, gráficos e páginas")
+            return
+        
+        import pandas as pd
+        summary = pd.DataFrame(metrics.REGISTRY.summary(), columns=[
+            'span', 'count', 'mean_ms', 'p95_ms', 'last_ms', 'rows'
+        ])
+        st.dataframe(
+            summary,
+            column_config={
+                'span': st.column_config.TextColumn("Span"),
+                'count': st.column_config.NumberColumn("N"),
+                'mean_ms': st.column_config.NumberColumn("Média", format="%.1f ms"),
+                'p95_ms': st.column_config.NumberColumn("p95", format="%.1f ms"),
+                'last_ms': st.column_config.NumberColumn("Último", format="%.1f ms"),
+                'rows': st.column_config.NumberColumn("Linhas")
+            },
+            hide_index=True,
+            use_container_width=True
+        )
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("Limpar", on_click=metrics.REGISTRY.reset, key="metrics_reset",
+                      use_container_width=True)
+        with col2:
+            st.download_button("Prometheus", data=metrics.REGISTRY.to_prometheus,
+                               file_name="trading_dashboard.prom", mime="text/plain",
+                               on_click="ignore", key="metrics_export", use_container_width=True)
+        if metrics.EXPORT_PATH:
+            st.caption(f"Exportado para {metrics.EXPORT_PATH}")
+
 # ==================== PÁGINAS ====================
 
 def page_overview():
     """Página principal - Overview"""
+    import pandas as pd
+    
     st.markdown('<p class="main-header">📊 Polymarket Trading Dashboard</p>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Monitorização em tempo real das estratégias de trading</p>', unsafe_allow_html=True)
     
     stats = get_trading_stats()
+    _, marks = get_portfolio_marks()
     
-    # Métricas principais
+    # Métricas principais (capital e exposição ao último preço de cada mercado)
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
         st.markdown(f"""
         <div class="metric-card">
-            <div class="metric-value">${stats['current_bankroll']:,.2f}</div>
-            <div class="metric-label">Capital Atual</div>
+            <div class="metric-value">${stats['current_bankroll'] + marks['unrealized_total']:,.2f}</div>
+            <div class="metric-label">Capital Atual (MtM)</div>
         </div>
         """, unsafe_allow_html=True)
     
@@ -252,7 +797,7 @@ def page_overview():
         st.markdown(f"""
         <div class="metric-card" style="background: linear-gradient(135deg, #11998e 0%, #38ef7d 100%);">
             <div class="metric-value ${pnl_class}">${stats['total_pnl']:,.2f}</div>
-            <div class="metric-label">Lucro Total ({stats['total_pnl_pct']:.2f}%)</div>
+            <div class="metric-label">Lucro Total ({stats['total_pnl_pct']:.2f}%) · Aberto ${marks['unrealized_total']:+,.2f}</div>
         </div>
         """, unsafe_allow_html=True)
     
@@ -268,7 +813,7 @@ def page_overview():
         st.markdown(f"""
         <div class="metric-card" style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);">
             <div class="metric-value">{stats['open_positions']}</div>
-            <div class="metric-label">Posições Abertas</div>
+            <div class="metric-label">Posições Abertas · ${marks['exposure_total']:,.0f}</div>
         </div>
         """, unsafe_allow_html=True)
     
@@ -281,193 +826,442 @@ def page_overview():
         # Gráfico de equity
         st.subheader("📈 Evolução do Capital")
         
-        # Dados mock - substituir por dados reais
-        equity_data = get_mock_data()
-        
-        fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=equity_data['timestamp'],
-            y=equity_data['equity'],
-            mode='lines',
-            name='Equity',
-            line=dict(color='#1f77b4', width=2),
-            fill='tozeroy',
-            fillcolor='rgba(31, 119, 180, 0.2)'
-        ))
-        
-        fig.add_hline(y=INITIAL_BANKROLL, line_dash="dash", line_color="red", 
-                     annotation_text="Capital Inicial")
-        
-        fig.update_layout(
-            xaxis_title="Data/Hora",
-            yaxis_title="USD",
-            hovermode='x unified',
-            showlegend=False,
-            height=400
-        )
+        # Modo zoom: volta a consultar só a janela visível, com mais detalhe
+        first, last = get_equity_range()
+        start = end = None
+        if first is not None and first < last and st.toggle("🔍 Zoom", key="equity_zoom"):
+            window = st.slider(
+                "Janela",
+                min_value=first,
+                max_value=last,
+                value=(max(first, last - timedelta(days=7)), last),
+                format="DD/MM/YY HH:mm",
+                key="equity_window"
+            )
+            start, end = (t.isoformat(sep=' ') for t in window)
         
-        st.plotly_chart(fig, use_container_width=True)
+        fig = get_equity_figure(start, end)
+        with metrics.span('render.equity', rows=len(fig.data[0].x)):
+            st.plotly_chart(fig, use_container_width=True)
         
         # Estratégias
         st.subheader("🎯 Performance por Estratégia")
         
-        strategies = get_strategy_status()
-        
-        for strat in strategies:
-            status_class = f"status-{strat['status']}"
-            status_text = "🟢 ATIVO" if strat['status'] == 'active' else "🟡 PAUSADO" if strat['status'] == 'paused' else "🔴 INATIVO"
-            
-            col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
-            with col1:
-                st.markdown(f"**{strat['name']}**")
-            with col2:
-                pnl_class = "positive" if strat['pnl'] > 0 else "negative" if strat['pnl'] < 0 else "neutral"
-                st.markdown(f"<span class='{pnl_class}'>${strat['pnl']:,.2f}</span>", unsafe_allow_html=True)
-            with col3:
-                st.markdown(f"{strat['win_rate']}% WR")
-            with col4:
-                st.markdown(status_text)
-            st.markdown("<hr style='margin: 5px 0;'>", unsafe_allow_html=True)
+        # Uma única tabela em vez de st.columns + st.markdown por estratégia
+        with metrics.span('pandas.strategies') as span:
+            strategies = pd.DataFrame(get_strategy_status(), columns=['name', 'pnl', 'win_rate', 'status'])
+            strategies['status'] = strategies['status'].map(STATUS_LABELS)
+            span.rows = len(strategies)
+        st.dataframe(
+            strategies,
+            column_config={
+                'name': st.column_config.TextColumn("Estratégia"),
+                'pnl': st.column_config.NumberColumn("P&L", format="$%.2f"),
+                'win_rate': st.column_config.ProgressColumn("Win Rate", format="%d%%", min_value=0, max_value=100),
+                'status': st.column_config.TextColumn("Status")
+            },
+            hide_index=True,
+            use_container_width=True
+        )
     
     with col_right:
         # Posições abertas
         st.subheader("💰 Posições Abertas")
-        
-        positions = get_open_positions()
-        
-        for pos in positions:
-            pnl_class = "positive" if pos['pnl_pct'] > 0 else "negative"
-            st.markdown(f"""
-            <div class="trade-row">
-                <strong>{pos['market'][:30]}...</strong><br>
-                <small>{pos['strategy']} | {pos['direction']}</small><br>
-                Entrada: ${pos['entry']:.3f} → Atual: ${pos['current']:.3f}<br>
-                <span class="{pnl_class}">{pos['pnl_pct']:+.2f}%</span> | ${pos['size']:.0f} | {pos['time']}
-            </div>
-            """, unsafe_allow_html=True)
+        live_fragment(render_open_positions, 'positions')()
         
         # Trades recentes
         st.subheader("📋 Trades Recentes")
-        
-        trades = get_recent_trades()
-        
-        for trade in trades[:5]:
-            pnl_display = f"<span class='positive'>{trade['pnl']}</span>" if trade['pnl'] and '+' in trade['pnl'] else f"<span class='negative'>{trade['pnl']}</span>" if trade['pnl'] and '-' in trade['pnl'] else "⏳"
-            st.markdown(f"""
-            <div class="log-entry">
-                <small>[{trade['time']}]</small> <strong>{trade['strategy']}</strong><br>
-                {trade['action']} {trade['market']} @ ${trade['price']:.3f} {pnl_display}
-            </div>
-            """, unsafe_allow_html=True)
+        live_fragment(render_recent_trades, 'trades')()
+
+def render_open_positions():
+    """Lista de posições abertas (atualizada por fragment)"""
+    import pandas as pd
+    
+    positions = pd.DataFrame(get_open_positions(), columns=[
+        'market', 'strategy', 'direction', 'entry', 'current', 'pnl_pct', 'unrealized', 'size', 'time'
+    ])
+    
+    if positions.empty:
+        st.caption("Sem posições abertas")
+        return
+    
+    # Formatação via column_config (um Styler custa ~60 ms com 500 linhas)
+    st.dataframe(
+        positions,
+        column_config={
+            'market': st.column_config.TextColumn("Mercado", width="medium"),
+            'strategy': st.column_config.TextColumn("Estratégia"),
+            'direction': st.column_config.TextColumn("Direção"),
+            'entry': st.column_config.NumberColumn("Entrada", format="$%.3f"),
+            'current': st.column_config.NumberColumn("Atual", format="$%.3f"),
+            'pnl_pct': st.column_config.NumberColumn("P&L", format="%+.2f%%"),
+            'unrealized': st.column_config.NumberColumn("P&L ($)", format="$%+.2f"),
+            'size': st.column_config.NumberColumn("Tamanho", format="$%.0f"),
+            'time': st.column_config.TextColumn("Tempo")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+def render_recent_trades():
+    """Últimos trades (atualizado por fragment)"""
+    trades = get_recent_trades()
+    
+    # Um único bloco HTML para a lista inteira
+    entries = []
+    for trade in trades[:5]:
+        pnl_display = f"<span class='positive'>{trade['pnl']}</span>" if trade['pnl'] and '+' in trade['pnl'] else f"<span class='negative'>{trade['pnl']}</span>" if trade['pnl'] and '-' in trade['pnl'] else "⏳"
+        entries.append(f"""
+        <div class="log-entry">
+            <small>[{trade['time']}]</small> <strong>{trade['strategy']}</strong><br>
+            {trade['action']} {trade['market']} @ ${trade['price']:.3f} {pnl_display}
+        </div>
+        """)
+    st.markdown("".join(entries), unsafe_allow_html=True)
 
 def page_analysis():
     """Página de análise detalhada"""
+    import pandas as pd
+    
     st.header("📊 Análise Detalhada")
     
     # Tabs para diferentes análises
-    tab1, tab2, tab3 = st.tabs(["Performance", "Distribuição", "Histórico"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Performance", "Distribuição", "Histórico", "Mercados", "Otimização"])
     
     with tab1:
         st.subheader("Métricas por Estratégia")
         
-        strategy_metrics = pd.DataFrame({
-            'Estratégia': ['Momentum', 'MeanReversion', 'Scalping', 'Contrarian'],
-            'Trades': [4, 3, 0, 0],
-            'Win Rate (%)': [65, 60, 0, 0],
-            'P&L Total ($)': [28.50, 17.00, 0, 0],
-            'Avg Trade ($)': [7.13, 5.67, 0, 0],
-            'Max Drawdown (%)': [5.2, 3.8, 0, 0]
-        })
-        
-        st.dataframe(strategy_metrics, use_container_width=True)
+        st.dataframe(get_strategy_table(), use_container_width=True)
         
         # Gráfico de barras comparativo
-        fig = px.bar(strategy_metrics[strategy_metrics['Trades'] > 0], 
-                    x='Estratégia', y='Win Rate (%)',
-                    color='P&L Total ($)',
-                    title="Win Rate vs P&L por Estratégia")
-        st.plotly_chart(fig, use_container_width=True)
+        fig = get_strategy_win_rate_figure()
+        with metrics.span('render.strategy_win_rate'):
+            st.plotly_chart(fig, use_container_width=True)
     
     with tab2:
         st.subheader("Distribuição de Retornos")
         
-        # Histograma de P&L
-        returns = [3.2, -1.5, 2.8, 5.2, -2.1, 1.8, 4.5, -0.5]
-        fig = px.histogram(returns, nbins=10, 
-                          title="Distribuição de P&L por Trade (%)",
-                          labels={'value': 'P&L %', 'count': 'Frequência'})
-        fig.add_vline(x=0, line_dash="dash", line_color="red")
-        st.plotly_chart(fig, use_container_width=True)
+        # Histograma de P&L (bins calculados no servidor)
+        returns = get_closed_trades()['pnl_pct']
+        by_strategy = st.toggle("Por estratégia", key="returns_by_strategy")
+        fig = get_returns_histogram(by_strategy)
+        with metrics.span('render.returns_histogram', rows=len(returns)):
+            st.plotly_chart(fig, use_container_width=True)
+        
+        dist = get_returns_distribution()
+        if any(dist['clipped']):
+            below, above = dist['clipped']
+            st.caption(f"{below} trades abaixo de {dist['edges'][0]:.1f}% e {above} acima de "
+                       f"{dist['edges'][-1]:.1f}% contados nos bins das pontas")
         
         # Estatísticas descritivas
-        st.metric("Média", f"{sum(returns)/len(returns):.2f}%")
-        st.metric("Melhor Trade", f"+{max(returns):.1f}%")
-        st.metric("Pior Trade", f"{min(returns):.1f}%")
+        summary = analytics.describe_returns(returns)
+        st.metric("Média", f"{summary['mean']:.2f}%")
+        st.metric("Melhor Trade", f"{summary['best']:+.1f}%")
+        st.metric("Pior Trade", f"{summary['worst']:.1f}%")
+        
+        # Quantis (total e por estratégia)
+        if dist['quantiles']:
+            rows = {'Todas': dist['quantiles'], **{name: group['quantiles']
+                                                  for name, group in dist['groups'].items()}}
+            st.dataframe(pd.DataFrame({
+                'Estratégia': list(rows),
+                **{f"p{q * 100:g} (%)": [round(qs.get(q, float('nan')), 2) for qs in rows.values()]
+                   for q in distribution.QUANTILES}
+            }), hide_index=True, use_container_width=True)
     
     with tab3:
         st.subheader("Histórico Completo de Trades")
         
-        trade_history = pd.DataFrame({
-            'Data': ['22/02 14:32', '22/02 14:28', '22/02 13:45', '22/02 12:15', '22/02 11:30'],
-            'Mercado': ['BTC_100K', 'Trump_Russia', 'ETH_5000', 'China_Coup', 'NATO_Expand'],
-            'Estratégia': ['Momentum', 'MeanRev', 'Momentum', 'MeanRev', 'Momentum'],
-            'Direção': ['LONG', 'LONG', 'SHORT', 'SHORT', 'LONG'],
-            'Entrada': [0.65, 0.12, 0.48, 0.05, 0.78],
-            'Saída': [None, None, 0.45, 0.05, 0.76],
-            'P&L (%)': [None, None, 3.2, 8.0, -2.1],
-            'Status': ['Aberto', 'Aberto', 'Fechado', 'Fechado', 'Fechado']
-        })
+        # Filtros aplicados em SQL
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            strategy = st.selectbox("Estratégia", ["Todas", *supervisor.STRATEGIES], key="history_strategy")
+        with col2:
+            market = st.text_input("Mercado", key="history_market", placeholder="market_id")
+        with col3:
+            status = st.selectbox("Status", list(HISTORY_STATUS), key="history_status")
+        with col4:
+            dates = st.date_input("Período", value=(), key="history_dates")
+        
+        clauses, params = history.build_filters(
+            strategy=None if strategy == "Todas" else strategy,
+            market=market.strip() or None,
+            status=HISTORY_STATUS[status],
+            start=dates[0] if len(dates) > 0 else None,
+            end=dates[1] + timedelta(days=1) if len(dates) > 1 else None
+        )
+        filters = (tuple(clauses), tuple(params))
+        
+        # Pilha de cursores (entry_time, id) - reiniciada quando os filtros mudam
+        if st.session_state.get('history_filters') != filters:
+            st.session_state['history_filters'] = filters
+            st.session_state['history_cursors'] = [None]
+        cursors = st.session_state['history_cursors']
+        
+        rows, next_cursor = get_history_page(filters, cursors[-1])
+        
+        with metrics.span('pandas.history_page', rows=len(rows)):
+            trade_history = pd.DataFrame({
+                'Data': [db.parse_time(r['entry_time']).strftime('%d/%m %H:%M') for r in rows],
+                'Mercado': [r['market_id'] for r in rows],
+                'Estratégia': [r['strategy'] for r in rows],
+                'Direção': [r['direction'] for r in rows],
+                'Entrada': [r['entry_price'] for r in rows],
+                'Saída': [r['exit_price'] for r in rows],
+                'P&L (%)': [r['pnl_pct'] if r['status'] == db.STATUS_CLOSED else None for r in rows],
+                'Status': ['Fechado' if r['status'] == db.STATUS_CLOSED else 'Aberto' for r in rows]
+            })
         
         st.dataframe(trade_history, use_container_width=True)
+        
+        col1, col2, col3 = st.columns([1, 1, 2])
+        with col1:
+            st.button("◀ Anterior", on_click=cursors.pop, disabled=len(cursors) == 1,
+                      key="history_prev", use_container_width=True)
+        with col2:
+            st.button("Seguinte ▶", on_click=cursors.append, args=(next_cursor,),
+                      disabled=next_cursor is None, key="history_next", use_container_width=True)
+        with col3:
+            st.caption(f"Página {len(cursors)} · {HISTORY_PAGE_SIZE} trades por página")
+        
+        st.download_button(
+            "⬇️ Exportar CSV",
+            data=lambda: export_history_csv(filters),
+            file_name=f"trades_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            mime="text/csv",
+            on_click="ignore",
+            key="history_export"
+        )
+        st.caption(f"A exportação inclui no máximo {HISTORY_EXPORT_MAX_ROWS:,} trades; para o histórico "
+                   "completo use `python -m trading.history export --out trades.csv`")
+    
+    with tab4:
+        st.subheader("Preço por Mercado")
+        
+        # Mercados das posições abertas e da página de histórico atual
+        markets = list(dict.fromkeys([
+            *get_position_book().markets,
+            *(row['market_id'] for row in rows)
+        ]))
+        
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            market = st.selectbox("Mercado", markets, key="chart_market")
+        with col2:
+            period = st.selectbox("Período", list(MARKET_CHART_PERIODS), index=2, key="chart_period")
+        
+        first, last, count = get_tick_store().time_range(market) if market else (None, None, 0)
+        if not count:
+            st.info("Sem histórico de preços para este mercado")
+        else:
+            days = MARKET_CHART_PERIODS[period]
+            start = first if days is None else max(first, last - days * 86400 * 1000)
+            resolution, bars = get_market_bars(market, start, last)
+            fig = get_market_figure(market, start, last)
+            with metrics.span('render.market_ohlc', rows=len(bars['ts'])):
+                st.plotly_chart(fig, use_container_width=True)
+            st.caption(f"{len(bars['ts'])} barras de {resolution} · {count:,} ticks no total")
+    
+    with tab5:
+        render_sweep_results()
+
+def render_sweep_results():
+    """Ranking e heatmap de um varrimento de stop-loss, take-profit e tamanho"""
+    from trading import sweep
+    st.subheader("Varrimento de Parâmetros de Risco")
+    
+    sweeps = sweep.list_sweeps()
+    if not sweeps:
+        st.info("Ainda não há varrimentos")
+        st.caption("Correr com `python -m trading.sweep run --name NOME`")
+        return
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        name = st.selectbox("Varrimento", sweeps, key="sweep_name")
+    result = get_sweep(name)
+    with col2:
+        strategy = st.selectbox("Estratégia", result['strategies'], key="sweep_strategy")
+    with col3:
+        metric = st.selectbox("Métrica", list(SWEEP_METRICS), key="sweep_metric")
+    column, ascending = SWEEP_METRICS[metric]
+    
+    rows = get_sweep_rows(name, strategy)
+    st.caption(f"{result['combinations']} combinações por estratégia · {result['markets']} mercados · "
+               f"time stop {result['time_stop_days']} dias · {result['total_s']:.0f}s com "
+               f"{result['workers']} processos")
+    
+    # Heatmap stop × take-profit para um tamanho de posição
+    sizes = sorted(rows['max_position_pct'].unique())
+    size = st.select_slider("Max Position (%)", sizes, value=sizes[len(sizes) // 2], key="sweep_position")
+    fig = get_sweep_heatmap(name, strategy, metric, size)
+    with metrics.span('render.sweep_heatmap', rows=fig.data[0].z.size):
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.markdown("**Melhores combinações**")
+    ranked = rows.sort_values(column, ascending=ascending).head(SWEEP_TOP)
+    st.dataframe(
+        ranked,
+        column_config={
+            'stop_loss_pct': st.column_config.NumberColumn("Stop Loss", format="%.0f%%"),
+            'take_profit_pct': st.column_config.NumberColumn("Take Profit", format="%.0f%%"),
+            'max_position_pct': st.column_config.NumberColumn("Max Position", format="%.0f%%"),
+            'trades': st.column_config.NumberColumn("Trades"),
+            'win_rate': st.column_config.NumberColumn("Win Rate", format="%.1f%%"),
+            'pnl': st.column_config.NumberColumn("P&L", format="$%.2f"),
+            'pnl_pct': st.column_config.NumberColumn("P&L (%)", format="%+.1f%%"),
+            'sharpe': st.column_config.NumberColumn("Sharpe", format="%.3f"),
+            'max_drawdown': st.column_config.NumberColumn("Max Drawdown", format="%.1f%%")
+        },
+        hide_index=True,
+        use_container_width=True
+    )
+
+def on_strategy_toggled(names):
+    """Callback da tabela de estratégias: arranca ou pára os workers"""
+    block = get_status_block()
+    for row, changes in st.session_state['strategy_toggles']['edited_rows'].items():
+        if 'Ativo' in changes and names[row] in block.names:
+            block.command([names[row]], supervisor.RUN if changes['Ativo'] else supervisor.STOP)
+            st.toast(f"{names[row]} {'ativado' if changes['Ativo'] else 'desativado'}!")
+    if any(block.get(name, 'command') != supervisor.STOP for name in block.names):
+        supervisor.ensure_running(block=block)
+    # A tabela volta a ser criada a partir do bloco de estado
+    st.session_state.pop('strategy_toggles', None)
+
+def set_all_workers(command):
+    """Pausa (ou retoma) todos os workers que não estão parados"""
+    block = get_status_block()
+    names = [name for name in block.names if block.get(name, 'command') != supervisor.STOP]
+    block.command(names, command)
+    if names and command != supervisor.STOP:
+        supervisor.ensure_running(block=block)
+    return names
+
+def close_all_positions():
+    """Fecho de emergência: pausa os bots e fecha todas as posições em paralelo"""
+    import pandas as pd
+
+    from trading import liquidation, notify
+    
+    live = st.session_state.get('mode') == 'Live'
+    if live and not liquidation.EXCHANGE_URL:
+        st.error("Modo Live sem exchange configurada (TRADING_EXCHANGE_URL)")
+        return
+    set_all_workers(supervisor.PAUSE)
+    progress = st.progress(0.0, text="A fechar posições...")
+    
+    def on_fill(fill, done, total):
+        status = "✓" if fill.error is None else "✗"
+        progress.progress(done / total, text=f"{done}/{total} · {fill.position_id} {status}")
+    
+    started = time.perf_counter()
+    conn = db.connect(db.DB_PATH)
+    try:
+        fills = liquidation.flatten(conn, open_exchange(live), on_fill=on_fill)
+    finally:
+        conn.close()
+    elapsed = time.perf_counter() - started
+    
+    failed = [fill for fill in fills if fill.error is not None]
+    if fills:
+        get_notifier().notify("Fecho de emergência",
+                              f"{len(fills) - len(failed)}/{len(fills)} posições fechadas em {elapsed:.2f}s",
+                              notify.CRITICAL)
+    if not fills:
+        progress.empty()
+        st.info("Não há posições abertas")
+    elif failed:
+        st.error(f"⚠️ {len(failed)} de {len(fills)} posições ficaram por fechar")
+        st.dataframe(pd.DataFrame({
+            'Posição': [fill.position_id for fill in failed],
+            'Erro': [fill.error for fill in failed]
+        }), hide_index=True, use_container_width=True)
+    else:
+        st.error(f"⚠️ TODAS AS POSIÇÕES FORAM FECHADAS! ({len(fills)} em {elapsed:.2f}s)")
 
 def page_control():
     """Página de controlo dos bots"""
+    import pandas as pd
+    
     st.header("🎮 Controlo dos Bots")
     
-    # Status geral
+    strategies = get_strategy_status()
+    workers = get_worker_status()
+    now = time.time()
+    
+    # Status geral (bloco de estado do supervisor)
+    running = sum(strat['status'] in ('active', 'stalled') for strat in strategies)
+    started = workers[supervisor.SUPERVISOR]['started']
+    last_trade = max((w['last_trade'] for name, w in workers.items()
+                      if name != supervisor.SUPERVISOR and w['last_trade']), default=None)
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric("Bots Ativos", "2/4", "+1")
+        st.metric("Bots Ativos", f"{running}/{len(supervisor.STRATEGIES)}")
     with col2:
-        st.metric("Uptime", "4h 23m", "")
+        st.metric("Uptime", format_duration(timedelta(seconds=now - started)) if started else "—")
     with col3:
-        st.metric("Último Trade", "2 min", "")
+        st.metric("Último Trade",
+                  format_duration(timedelta(seconds=now - last_trade)) if last_trade else "—")
     
     st.markdown("---")
     
     # Controlo de estratégias
     st.subheader("🤖 Estratégias")
     
-    strategies = [
-        {'name': 'Momentum Trading', 'status': True, 'pnl': 28.50, 'trades': 4},
-        {'name': 'Mean Reversion', 'status': True, 'pnl': 17.00, 'trades': 3},
-        {'name': 'Scalping', 'status': False, 'pnl': 0, 'trades': 0},
-        {'name': 'Contrarian', 'status': False, 'pnl': 0, 'trades': 0}
-    ]
+    book, marks = get_portfolio_marks()
+    limits = get_risk_limits()
+    exposure = dict(zip(book.strategies, marks['strategy_exposure']))
+    unrealized = dict(zip(book.strategies, marks['strategy_unrealized']))
     
+    # Uma única tabela editável; a coluna "Ativo" substitui os toggles por linha
+    st.data_editor(
+        pd.DataFrame({
+            'Estratégia': [strat['name'] for strat in strategies],
+            'P&L ($)': [round(strat['pnl'], 2) for strat in strategies],
+            'Trades': [strat['trades'] for strat in strategies],
+            'Exposição ($)': [round(exposure.get(strat['name'], 0.0), 2) for strat in strategies],
+            'Aberto ($)': [round(unrealized.get(strat['name'], 0.0), 2) for strat in strategies],
+            'Estado': [STATUS_LABELS[strat['status']] for strat in strategies],
+            'Ciclo (ms)': [strat['worker']['loop_ms'] if strat['worker'] else None for strat in strategies],
+            'Heartbeat (s)': [strat['worker']['heartbeat_age'] if strat['worker'] else None
+                              for strat in strategies],
+            'Restarts': [strat['worker']['restarts'] if strat['worker'] else 0 for strat in strategies],
+            'Ativo': [strat['worker'] is not None and strat['worker']['command'] != supervisor.STOP
+                      for strat in strategies]
+        }),
+        column_config={
+            'P&L ($)': st.column_config.NumberColumn(format="$%.2f"),
+            'Exposição ($)': st.column_config.NumberColumn(format="$%.2f"),
+            'Aberto ($)': st.column_config.NumberColumn(format="$%+.2f"),
+            'Ciclo (ms)': st.column_config.NumberColumn(format="%.1f", help="Latência média por ciclo do worker"),
+            'Heartbeat (s)': st.column_config.NumberColumn(format="%.0f"),
+            'Ativo': st.column_config.CheckboxColumn(help="Arrancar/parar o worker da estratégia")
+        },
+        disabled=['Estratégia', 'P&L ($)', 'Trades', 'Exposição ($)', 'Aberto ($)', 'Estado',
+                  'Ciclo (ms)', 'Heartbeat (s)', 'Restarts'],
+        hide_index=True,
+        use_container_width=True,
+        key="strategy_toggles",
+        on_change=on_strategy_toggled,
+        args=([strat['name'] for strat in strategies],)
+    )
     for strat in strategies:
-        with st.container():
-            col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
-            
-            with col1:
-                st.markdown(f"**{strat['name']}**")
-                st.caption(f"P&L: ${strat['pnl']:.2f} | Trades: {strat['trades']}")
-            
-            with col2:
-                new_status = st.toggle("Ativo", value=strat['status'], key=f"toggle_{strat['name']}")
-                if new_status != strat['status']:
-                    st.toast(f"{strat['name']} {'ativado' if new_status else 'desativado'}!")
-            
-            with col3:
-                if st.button("⚙️ Config", key=f"config_{strat['name']}"):
-                    st.session_state['config_strategy'] = strat['name']
-                    st.rerun()
-            
-            with col4:
-                if st.button("📊 Stats", key=f"stats_{strat['name']}"):
-                    st.info(f"Estatísticas de {strat['name']}")
-            
-            st.markdown("<hr style='margin: 10px 0;'>", unsafe_allow_html=True)
+        if strat['status'] == 'crashed' and strat['worker']['error']:
+            st.error(f"{strat['name']}: {strat['worker']['error']}")
+    
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        selected = st.selectbox("Estratégia", [strat['name'] for strat in strategies],
+                                label_visibility="collapsed", key="selected_strategy")
+    with col2:
+        if st.button("⚙️ Config", use_container_width=True):
+            st.session_state['config_strategy'] = selected
+            st.rerun()
+    with col3:
+        if st.button("📊 Stats", use_container_width=True):
+            st.info(f"Estatísticas de {selected}")
     
     # Gestão de risco
     st.subheader("⚠️ Gestão de Risco")
@@ -476,20 +1270,19 @@ def page_control():
     
     with col1:
         st.markdown("**Limites Diários**")
-        daily_loss_used = 450
-        daily_loss_limit = 1000
-        progress = daily_loss_used / daily_loss_limit
-        st.progress(progress, text=f"Daily Loss: ${daily_loss_used}/${daily_loss_limit}")
+        # Perda do dia = P&L realizado hoje + P&L não realizado das posições abertas
+        st.progress(min(marks['daily_loss_used'], 1.0),
+                    text=f"Daily Loss: ${marks['daily_loss']:,.0f}/${marks['daily_loss_limit']:,.0f}")
         
-        max_pos_used = 3
-        max_pos_limit = 5
-        st.progress(max_pos_used/max_pos_limit, text=f"Posições: {max_pos_used}/{max_pos_limit}")
+        max_pos_used = len(book)
+        max_pos_limit = limits['max_concurrent_trades']
+        st.progress(min(max_pos_used / max_pos_limit, 1.0), text=f"Posições: {max_pos_used}/{max_pos_limit}")
     
     with col2:
         st.markdown("**Configurações**")
-        st.slider("Max Position Size (%)", 1, 10, 5, key="max_pos")
-        st.slider("Stop Loss (%)", 5, 50, 20, key="stop_loss")
-        st.slider("Take Profit (%)", 5, 50, 8, key="take_profit")
+        st.slider("Max Position Size (%)", 1, 10, min(limits['max_position_pct'], 10), key="max_pos")
+        st.slider("Stop Loss (%)", 5, 50, limits['stop_loss_pct'], key="stop_loss")
+        st.slider("Take Profit (%)", 5, 50, min(limits['take_profit_pct'], 50), key="take_profit")
     
     # Ações de emergência
     st.markdown("---")
@@ -498,14 +1291,81 @@ def page_control():
     col1, col2 = st.columns(2)
     
     with col1:
-        if st.button("🛑 FECHAR TODAS AS POSIÇÕES", type="primary", use_container_width=True):
-            st.error("⚠️ TODAS AS POSIÇÕES FORAM FECHADAS!")
-            # Aqui viria código para fechar posições
+        # No modo Backtest a DB da sessão não é a dos bots
+        if st.button("🛑 FECHAR TODAS AS POSIÇÕES", type="primary", use_container_width=True,
+                     disabled=get_db_path() != db.DB_PATH):
+            close_all_positions()
     
     with col2:
-        if st.button("⏸️ PAUSAR TODOS OS BOTS", use_container_width=True):
-            st.warning("⏸️ TODOS OS BOTS FORAM PAUSADOS!")
-            # Aqui viria código para pausar bots
+        if any(strat['status'] == 'paused' for strat in strategies):
+            if st.button("▶️ RETOMAR TODOS OS BOTS", use_container_width=True):
+                set_all_workers(supervisor.RUN)
+                st.rerun()
+        elif st.button("⏸️ PAUSAR TODOS OS BOTS", use_container_width=True):
+            paused = set_all_workers(supervisor.PAUSE)
+            if paused:
+                from trading import notify
+                get_notifier().notify("Bots pausados", ", ".join(paused), notify.WARNING)
+                st.warning("⏸️ TODOS OS BOTS FORAM PAUSADOS!")
+            else:
+                st.info("Não há bots a correr")
+
+def run_backtest():
+    """Callback: corre um backtest com os limites de risco do formulário"""
+    from trading import backtest
+    limits = {key: st.session_state.get(f'risk_{key}', value)
+              for key, value in get_risk_limits().items()}
+    name = st.session_state['backtest_name'].strip() or datetime.now().strftime('%Y%m%d-%H%M%S')
+    try:
+        path = backtest.run_path(name)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    # Um backtest com o mesmo nome substitui o ficheiro: as ligações e os
+    # resultados guardados da DB antiga não podem continuar em uso
+    release_db(path)
+    with st.spinner(f"A correr o backtest {name}..."):
+        summary = backtest.run(
+            name,
+            resolution=BACKTEST_RESOLUTIONS[st.session_state['backtest_resolution']],
+            limits=limits,
+            bankroll=INITIAL_BANKROLL,
+            ticks_dir=get_tick_store().root
+        )
+    release_db(path)
+    # O selectbox volta a ser criado com o backtest novo escolhido
+    st.session_state['backtest_run'] = name
+    st.session_state.pop('backtest_run_input', None)
+    st.toast(f"Backtest {name}: {summary['trades']} trades em {summary['total_s']:.1f}s")
+
+def render_backtest_settings():
+    """Escolha do backtest a mostrar e lançamento de um novo"""
+    from trading import backtest
+    runs = backtest.list_runs()
+    if runs:
+        current = st.session_state.get('backtest_run')
+        run = st.selectbox("Backtest", runs, index=runs.index(current) if current in runs else 0,
+                           key="backtest_run_input")
+        st.session_state['backtest_run'] = run
+        st.info(f"O dashboard mostra o backtest {run}")
+    else:
+        st.session_state.pop('backtest_run', None)
+        st.info("Ainda não há backtests")
+    
+    with st.expander("▶️ Novo backtest"):
+        st.text_input("Nome", key="backtest_name", placeholder="data e hora por omissão")
+        st.selectbox("Resolução", list(BACKTEST_RESOLUTIONS), key="backtest_resolution")
+        st.caption("Usa os limites de risco abaixo e todo o histórico de preços")
+        st.button("Correr backtest", on_click=run_backtest, key="backtest_start")
+
+def bounded_input(label, min_value, max_value, value, **kwargs):
+    """number_input com o valor guardado limitado a [min_value, max_value].
+
+    As configurações são editáveis à mão: um valor fora dos limites (ou de
+    outro tipo) faria o Streamlit levantar StreamlitAPIException.
+    """
+    value = type(min_value)(min(max(value, min_value), max_value))
+    return st.number_input(label, min_value, max_value, value, **kwargs)
 
 def page_settings():
     """Página de configurações"""
@@ -521,38 +1381,111 @@ def page_settings():
         st.info(f"Capital atual: ${initial_capital:,.2f}")
     
     with col2:
-        mode = st.selectbox("Modo", ["Paper Trading", "Backtest", "Live"], index=0)
-        st.info(f"Modo atual: {mode}")
+        mode = st.selectbox("Modo", MODES, index=MODES.index(st.session_state.get('mode', MODES[0])),
+                            key="mode_input")
+        st.session_state['mode'] = mode
+        if mode == "Backtest":
+            render_backtest_settings()
+        else:
+            st.info(f"Modo atual: {mode}")
     
     # Configurações de risco
     st.subheader("🛡️ Gestão de Risco")
     
+    limits = get_risk_limits()
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.number_input("Max Position (%)", 1, 20, 5)
-        st.number_input("Max Daily Loss (%)", 1, 50, 10)
+        limits['max_position_pct'] = bounded_input(
+            "Max Position (%)", 1, 20, limits['max_position_pct'], key="risk_max_position_pct")
+        limits['max_daily_loss_pct'] = bounded_input(
+            "Max Daily Loss (%)", 1, 50, limits['max_daily_loss_pct'], key="risk_max_daily_loss_pct")
     
     with col2:
-        st.number_input("Stop Loss (%)", 5, 50, 20)
-        st.number_input("Take Profit (%)", 5, 100, 8)
+        limits['stop_loss_pct'] = bounded_input(
+            "Stop Loss (%)", 5, 50, limits['stop_loss_pct'], key="risk_stop_loss_pct")
+        limits['take_profit_pct'] = bounded_input(
+            "Take Profit (%)", 5, 100, limits['take_profit_pct'], key="risk_take_profit_pct")
     
     with col3:
-        st.number_input("Max Concurrent Trades", 1, 20, 5)
-        st.number_input("Time Stop (dias)", 1, 30, 3)
+        limits['max_concurrent_trades'] = bounded_input(
+            "Max Concurrent Trades", 1, 20, limits['max_concurrent_trades'], key="risk_max_concurrent_trades")
+        limits['time_stop_days'] = bounded_input(
+            "Time Stop (dias)", 1, 30, limits['time_stop_days'], key="risk_time_stop_days")
+    
+    # Atualização em tempo real
+    st.subheader("🔄 Atualização em Tempo Real")
+    
+    live = st.toggle("Modo live", value=st.session_state.get('live_mode', True), key="live_mode_input")
+    st.session_state['live_mode'] = live
+    
+    intervals = get_refresh_intervals()
+    cols = st.columns(len(intervals))
+    for col, widget in zip(cols, intervals):
+        with col:
+            intervals[widget] = bounded_input(
+                f"{REFRESH_LABELS[widget]} (s)", 0, 300, intervals[widget],
+                disabled=not live, key=f"refresh_{widget}"
+            )
     
     # Notificações
     st.subheader("🔔 Notificações")
     
-    st.checkbox("Discord (#alertas)", value=True)
-    st.checkbox("Email", value=False)
-    st.checkbox("Som no browser", value=False)
+    notifications = settings.load_notifications()
+    notifications['discord'] = st.checkbox("Discord (#alertas)", value=notifications['discord'],
+                                           key="notify_discord")
+    notifications['email'] = st.checkbox("Email", value=notifications['email'], key="notify_email",
+                                         help="Servidor SMTP nas variáveis TRADING_SMTP_*")
+    notifications['sound'] = st.checkbox("Som no browser", value=notifications['sound'], key="notify_sound")
+    
+    notifications['discord_webhook'] = st.text_input(
+        "Discord Webhook URL", value=notifications['discord_webhook'], type="password", key="notify_webhook")
+    
+    notifier = get_notifier()
+    if st.button("📨 Enviar alerta de teste", disabled=not notifier.channels):
+        notifier.notify("Alerta de teste", f"Enviado do dashboard às {datetime.now():%H:%M:%S}")
+        st.toast(f"Alerta enviado para: {', '.join(notifier.channels)}")
+    for channel, stats in notifier.stats().items():
+        st.caption(f"{channel}: {stats.get('sent', 0)} alertas em {stats.get('messages', 0)} mensagens · "
+                   f"{stats.get('rate_limited', 0)} rate limits · {stats.get('dropped', 0)} descartados"
+                   + (f" · último erro: {stats['error']}" if stats['error'] else ""))
     
-    st.text_input("Discord Webhook URL", type="password")
+    # Retenção
+    st.subheader("🗄️ Retenção")
+    
+    retention_config = settings.load_retention()
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        retention_config['hot_days'] = bounded_input(
+            "Dias na DB quente", 1, 3650, retention_config['hot_days'], key="retention_hot_days",
+            help="Trades fechados há mais tempo vão para os arquivos mensais")
+    
+    with col2:
+        retention_config['max_hot_mb'] = bounded_input(
+            "Tamanho máximo (MB)", 1, 10240, retention_config['max_hot_mb'], key="retention_max_hot_mb")
+    
+    with col3:
+        retention_config['interval_minutes'] = bounded_input(
+            "Manutenção a cada (min)", 1, 1440, retention_config['interval_minutes'],
+            key="retention_interval_minutes")
+    
+    status = get_retention_status()
+    archived = sum(status['archives'].values())
+    st.caption(f"DB quente: {status['hot_bytes'] / 2**20:.1f} MB · {status['open']} abertos · "
+               f"{status['closed']} fechados · {len(status['archives'])} arquivos mensais "
+               f"({archived / 2**20:.1f} MB)"
+               + (f" · arquivado até {status['archived_until']}" if status['archived_until'] else ""))
+    if not status['incremental']:
+        st.caption("O ficheiro da DB só encolhe depois de um VACUUM completo, que bloqueia a DB: "
+                   "`python -m trading.retention run --vacuum` com os bots parados")
     
     # Guardar
     st.markdown("---")
     if st.button("💾 Guardar Configurações", type="primary"):
+        settings.save_risk_limits(limits)
+        settings.save_notifications(notifications)
+        settings.save_retention(retention_config)
         st.success("✅ Configurações guardadas com sucesso!")
         st.balloons()
 
@@ -560,32 +1493,34 @@ def page_settings():
 
 def main():
     """Função principal"""
-    # Inicializar database
+    # Bootstrap (uma vez por processo)
     init_database()
+    refresh_rollups()
+    
+    # O Streamlit remove os elementos que um run não volta a emitir, por isso
+    # o <style> é reenviado sempre; só a leitura do ficheiro fica em cache
+    st.markdown(load_styles(), unsafe_allow_html=True)
     
     # Sidebar
     st.sidebar.title("🤖 Polymarket Bot")
+    if get_db_path() != db.DB_PATH:
+        st.sidebar.info(f"🧪 Backtest: {st.session_state['backtest_run']}")
     st.sidebar.markdown("---")
     
     # Navegação
-    page = st.sidebar.radio("📍 Navegação", [
-        "📊 Overview",
-        "📈 Análise", 
-        "🎮 Controlo",
-        "⚙️ Configurações"
-    ])
+    pages = {
+        "📊 Overview": page_overview,
+        "📈 Análise": page_analysis,
+        "🎮 Controlo": page_control,
+        "⚙️ Configurações": page_settings
+    }
+    page = st.sidebar.radio("📍 Navegação", list(pages), key="page")
     
     st.sidebar.markdown("---")
     
     # Status na sidebar
-    st.sidebar.markdown("""
-    **🟢 Status:** Online  
-    **⏱️ Uptime:** 4h 23m  
-    **📅 Última atualização:**  
-    {}  
-    **💰 Capital:** $1,045.50  
-    **📈 P&L:** +$45.50 (+4.55%)
-    """.format(datetime.now().strftime("%H:%M:%S")))
+    with st.sidebar:
+        live_fragment(render_sidebar_status, 'sidebar')()
     
     st.sidebar.markdown("---")
     
@@ -595,15 +1530,22 @@ def main():
     st.sidebar.markdown("- [PolymarketScan](https://polymarketscan.com)")
     st.sidebar.markdown("- [Documentação](https://docs.polymarket.com)")
     
+    # Contadores da cache de dados
+    cache_stats = get_cache().stats()
+    st.sidebar.caption(
+        f"🗄️ Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses / "
+        f"{cache_stats['waits']} esperas ({cache_stats['hit_rate']:.0f}%) · "
+        f"{cache_stats['entries']} entradas · {cache_stats['bytes'] / 2**20:.1f} MB"
+    )
+    
     # Renderizar página selecionada
-    if page == "📊 Overview":
-        page_overview()
-    elif page == "📈 Análise":
-        page_analysis()
-    elif page == "🎮 Controlo":
-        page_control()
-    elif page == "⚙️ Configurações":
-        page_settings()
+    render_page = pages[page]
+    with metrics.span(f'page.{render_page.__name__}'):
+        render_page()
+    
+    render_debug_panel()
+    if metrics.REGISTRY.enabled and metrics.EXPORT_PATH:
+        metrics.REGISTRY.write_prometheus(metrics.EXPORT_PATH)
     
     # Footer
     st.markdown("---")
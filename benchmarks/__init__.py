@@ -0,0 +1 @@
+"""Geradores de carga sintética e benchmarks do dashboard."""
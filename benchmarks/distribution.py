@@ -0,0 +1,123 @@
+"""Benchmark do histograma de retornos: bins no browser vs bins no servidor.
+
+Para cada volume gera retornos sintéticos (t de Student, caudas pesadas)
+repartidos por quatro estratégias e constrói duas figuras:
+
+* ``browser``: o ``px.histogram`` anterior, que leva todos os valores para
+  o browser fazer os bins;
+* ``server``: ``distribution.summarize`` e uma figura só com as contagens
+  por bin, a densidade e os quantis (total e sobreposição por estratégia).
+
+Reporta o tamanho do JSON da figura (o que o ``st.plotly_chart`` envia) e
+o tempo de cálculo + serialização. Confirma também que as contagens batem
+com o ``np.histogram`` e mede o erro da KDE por binning contra a KDE exata
+numa amostra.
+
+Uso::
+
+    python -m benchmarks.distribution --volumes 10000 100000 1000000 --out distribution.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import distribution
+
+NAMES = ['Contrarian', 'MeanReversion', 'Momentum', 'Scalping']
+
+
+def synthetic(n, seed):
+    rng = np.random.default_rng(seed)
+    codes = np.sort(rng.integers(0, len(NAMES), n))
+    returns = rng.standard_t(3, n) * 4 + (codes - 1.5)
+    return returns, codes
+
+
+def browser_figure(returns):
+    import plotly.express as px
+    fig = px.histogram(returns, nbins=10, title="Distribuição de P&L por Trade (%)",
+                       labels={'value': 'P&L %', 'count': 'Frequência'})
+    fig.add_vline(x=0, line_dash="dash", line_color="red")
+    return fig
+
+
+def server_figure(returns, codes, by_strategy):
+    import plotly.graph_objects as go
+    dist = distribution.summarize(returns, codes, NAMES)
+    fig = go.Figure()
+    series = dist['groups'].values() if by_strategy else [dist]
+    for group in series:
+        fig.add_trace(go.Bar(x=dist['centers'], y=group['counts'], width=dist['width'], opacity=0.45))
+        fig.add_trace(go.Scatter(x=dist['kde_x'], y=group['kde_y'], mode='lines'))
+    for q, value in dist['quantiles'].items():
+        fig.add_vline(x=value, line_dash="dot", annotation_text=f"p{q * 100:g}")
+    fig.add_vline(x=0, line_dash="dash", line_color="red")
+    fig.update_layout(barmode='overlay', bargap=0)
+    return fig
+
+
+def timed_json(build, repeat):
+    """(p50 ms, bytes) de construir e serializar uma figura"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = build().to_json()
+        times.append(time.perf_counter() - started)
+    return float(np.percentile(times, 50) * 1000), len(payload)
+
+
+def check(returns, codes, sample=5000):
+    """Contagens iguais ao np.histogram e erro da KDE por binning"""
+    dist = distribution.summarize(returns, codes, NAMES)
+    clipped = np.clip(returns, dist['edges'][0], dist['edges'][-1])
+    expected, _ = np.histogram(clipped, bins=dist['edges'])
+    groups_total = sum(group['counts'] for group in dist['groups'].values())
+
+    values = returns[:sample]
+    bw = distribution.bandwidth(values)
+    grid, approx = distribution.kde(values, dist['edges'][0], dist['edges'][-1], bw=bw)
+    exact = np.exp(-0.5 * ((grid[:, None] - values[None, :]) / bw) ** 2).sum(axis=1)
+    exact /= values.size * bw * np.sqrt(2 * np.pi)
+    return {
+        'counts_match': bool(np.array_equal(expected, dist['counts'])),
+        'groups_match': bool(np.array_equal(groups_total, dist['counts'])),
+        'bins': len(dist['counts']),
+        'kde_max_rel_error': float(np.abs(approx - exact).max() / exact.max()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do histograma de retornos')
+    parser.add_argument('--volumes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    results = {'commit': _git_commit(), 'volumes': {}}
+    for n in args.volumes:
+        returns, codes = synthetic(n, args.seed)
+        entry = results['volumes'][str(n)] = {'check': check(returns, codes)}
+        for name, build in (('browser', lambda: browser_figure(returns)),
+                            ('server', lambda: server_figure(returns, codes, False)),
+                            ('server_by_strategy', lambda: server_figure(returns, codes, True))):
+            ms, size = timed_json(build, args.repeat)
+            entry[name] = {'p50_ms': ms, 'json_bytes': size}
+            print(f'{n:>9} {name:>18}: {ms:9.1f}ms  {size / 1024:10.1f} KB', file=sys.stderr)
+        print(f'{"":>9} {"check":>18}: {entry["check"]}', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""Benchmark da escrita de trades com o dashboard a ler em simultâneo.
+
+Numa cópia de uma DB sintética (``benchmarks.synthetic``) o benchmark
+regista trades durante ``--seconds`` segundos de duas formas: um commit
+por registo (o que um bot faria sem API de escrita) e pelo
+``journal.TradeJournal`` (lotes por tamanho/tempo). Cada trade é aberto e
+fechado mais tarde, com ``--open`` posições abertas de cada vez. Um
+processo à parte faz as leituras de uma página do dashboard (posições
+abertas, trades recentes, agregados por estratégia) em ciclo e mede a
+latência de cada uma.
+
+Reporta os registos por segundo (já commitados) e o p50/p99 das leituras
+em cada modo. Verifica também a recuperação do spool: um processo regista
+trades e morre sem flush, e um journal novo tem de os repor.
+
+Uso::
+
+    python -m benchmarks.journal --db /tmp/trading-bench/trades_10000_4s_200m_42.db --out journal.json
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import db, journal, rollups
+
+STRATEGY = 'JournalBench'
+TIME = '2026-01-01 00:00:00'
+
+
+def reader(db_path, stop, results):
+    """Leituras do dashboard em ciclo até ``stop``; devolve as latências (s)"""
+    conn = db.connect(db_path)
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        db.fetch_open_trades(conn)
+        db.fetch_recent_trades(conn)
+        rollups.read_strategies(conn)
+        db.count_open_trades(conn)
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+    results.put(latencies)
+
+
+def per_trade_writer(db_path):
+    """Um commit por registo (referência)"""
+    conn = db.connect(db_path)
+
+    def record_open(*values):
+        with conn:
+            conn.execute(journal.INSERT_OPEN, values)
+
+    def record_close(trade_id, *values):
+        with conn:
+            conn.execute(journal.UPDATE_CLOSE, (*values, trade_id))
+
+    return record_open, record_close, conn.close
+
+
+def journal_writer(db_path, spool_dir, fsync):
+    trades = journal.TradeJournal(db_path, name='bench', spool_dir=spool_dir, fsync=fsync)
+    return trades.record_open, trades.record_close, trades.close
+
+
+def drive(record_open, record_close, seconds, open_positions, prefix):
+    """Abre e fecha trades durante ``seconds``; retorna o número de registos"""
+    queue = deque()
+    records = 0
+    i = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            trade_id = f'{prefix}-{i:09d}'
+            record_open(trade_id, f'mkt-{i % 200}', STRATEGY, 'LONG', 0.5, 25.0, 50.0, TIME)
+            queue.append(trade_id)
+            records += 1
+            i += 1
+            if len(queue) > open_positions:
+                record_close(queue.popleft(), 0.51, TIME, 0.5, 2.0, 'take_profit')
+                records += 1
+    return records
+
+
+def crash_check(db_path, spool_dir, count=1000):
+    """Um processo regista ``count`` trades e morre sem flush; retorna os repostos"""
+    context = get_context('spawn')
+    process = context.Process(target=_crash_worker, args=(db_path, spool_dir, count))
+    process.start()
+    process.join()
+    trades = journal.TradeJournal(db_path, name='crash', spool_dir=spool_dir)
+    recovered = trades.recovered
+    trades.close()
+    conn = db.connect(db_path)
+    stored = conn.execute("SELECT COUNT(*) FROM trades WHERE id LIKE 'crash-%'").fetchone()[0]
+    conn.close()
+    return recovered, stored
+
+
+def _crash_worker(db_path, spool_dir, count):
+    trades = journal.TradeJournal(db_path, name='crash', spool_dir=spool_dir, background=False)
+    for i in range(count):
+        trades.record_open(f'crash-{i:06d}', 'mkt-0', STRATEGY, 'LONG', 0.5, 25.0, 50.0, TIME)
+    os._exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da escrita de trades em lote')
+    parser.add_argument('--db', default='/tmp/trading-bench/trades_10000_4s_200m_42.db',
+                        help='DB de partida (copiada)')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duração de cada modo')
+    parser.add_argument('--open', type=int, default=100, help='posições abertas em simultâneo')
+    parser.add_argument('--fsync', action='store_true', help='fsync do spool a cada registo')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    results = {'commit': _git_commit(), 'source': str(args.db), 'seconds': args.seconds,
+               'fsync': args.fsync, 'modes': {}}
+    context = get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'trades.db'
+        shutil.copy(args.db, db_path)
+        conn = db.connect(db_path)
+        db.init_schema(conn)
+        conn.close()
+
+        for mode in ('per_trade', 'journal'):
+            if mode == 'per_trade':
+                record_open, record_close, close = per_trade_writer(db_path)
+            else:
+                record_open, record_close, close = journal_writer(db_path, tmp, args.fsync)
+            stop = context.Event()
+            queue = context.Queue()
+            process = context.Process(target=reader, args=(db_path, stop, queue))
+            process.start()
+            time.sleep(1.0)  # arranque do processo leitor
+
+            started = time.perf_counter()
+            records = drive(record_open, record_close, args.seconds, args.open, mode)
+            close()  # o journal só conta depois do último flush
+            elapsed = time.perf_counter() - started
+
+            stop.set()
+            latencies = np.array(queue.get()) * 1000
+            process.join()
+            results['modes'][mode] = {
+                'records': records,
+                'records_per_s': records / elapsed,
+                'reads': len(latencies),
+                'read_p50_ms': float(np.percentile(latencies, 50)),
+                'read_p99_ms': float(np.percentile(latencies, 99)),
+            }
+            m = results['modes'][mode]
+            print(f'{mode:>9}: {m["records_per_s"]:>10,.0f} registos/s  leituras {m["reads"]:>6}  '
+                  f'p50 {m["read_p50_ms"]:6.2f}ms  p99 {m["read_p99_ms"]:6.2f}ms', file=sys.stderr)
+
+        # Cada modo deixa exatamente --open trades abertos
+        conn = db.connect(db_path)
+        open_rows = conn.execute('SELECT COUNT(*) FROM trades WHERE strategy = ? AND status = ?',
+                                 (STRATEGY, db.STATUS_OPEN)).fetchone()[0]
+        conn.close()
+        results['open_left'] = open_rows
+        results['consistent'] = open_rows == 2 * args.open
+
+        recovered, stored = crash_check(db_path, tmp)
+        results['crash'] = {'recovered': recovered, 'stored': stored}
+        results['consistent'] &= recovered == stored == 1000
+        print(f'recuperação do spool: {recovered} registos repostos, {stored} na DB', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0 if results['consistent'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""Benchmark do fecho de emergência contra uma exchange simulada local.
+
+``MockExchange`` é um servidor HTTP (uma thread por pedido, keep-alive)
+com a API de ``trading.liquidation``: cada ordem demora uma latência
+log-normal, uma fração responde 503 antes de executar e outra executa mas
+perde a resposta (o cliente esgota o timeout e repete com a mesma chave de
+idempotência). O servidor conta as execuções por chave para confirmar que
+nenhuma posição é fechada duas vezes.
+
+Para cada modo (sequencial, com um worker, e concorrente) o benchmark
+reabre as ``--positions`` posições numa DB temporária, chama
+``liquidation.flatten`` e mede o tempo até à carteira estar a zero (todos
+os fills escritos); reporta p50/p99 sobre ``--repeat`` corridas.
+
+Uso::
+
+    python -m benchmarks.liquidation --positions 50 --repeat 30 --out liquidation.json
+"""
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import db, liquidation
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalhos e corpo saem em writes separados: sem isto o Nagle e o ACK
+    # atrasado do cliente somam ~40ms a cada resposta
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        order = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        key = self.headers.get('Idempotency-Key') or order['client_order_id']
+        exchange = self.server
+        latency, fail, lost, price = exchange.draw()
+        time.sleep(latency)
+        if fail:
+            self._reply(503, {'error': 'indisponível'})
+            return
+        with exchange.lock:
+            fill = exchange.orders.get(key)
+            if fill is None:
+                fill = exchange.orders[key] = {
+                    'order_id': f'ord-{len(exchange.orders)}',
+                    'client_order_id': key,
+                    'status': 'filled',
+                    'price': price,
+                    'filled_at': int(time.time() * 1000),
+                }
+                exchange.executions[key] = exchange.executions.get(key, 0) + 1
+        if lost:
+            # Executada mas a resposta perde-se: o cliente esgota o timeout
+            time.sleep(exchange.lost_delay)
+            return
+        self._reply(200, fill)
+
+
+class MockExchange(ThreadingHTTPServer):
+    """Exchange simulada em 127.0.0.1 (porta livre), a correr numa thread"""
+
+    daemon_threads = True
+
+    def __init__(self, latency_ms=40.0, sigma=0.5, fail_rate=0.03, lost_rate=0.01,
+                 lost_delay=1.0, seed=42):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.latency_ms = latency_ms
+        self.sigma = sigma
+        self.fail_rate = fail_rate
+        self.lost_rate = lost_rate
+        self.lost_delay = lost_delay
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.orders = {}
+        self.executions = {}
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def draw(self):
+        with self.lock:
+            latency = self.rng.lognormal(np.log(self.latency_ms / 1000), self.sigma)
+            u = self.rng.random()
+            price = round(float(self.rng.uniform(0.2, 0.8)), 4)
+        return latency, u < self.fail_rate, self.fail_rate <= u < self.fail_rate + self.lost_rate, price
+
+    def reset(self):
+        with self.lock:
+            self.orders.clear()
+            self.executions.clear()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def open_positions(conn, count, seed=42):
+    """(Re)abre ``count`` posições na tabela trades"""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for i in range(count):
+        price = float(rng.uniform(0.2, 0.8))
+        size = float(rng.uniform(10, 60))
+        rows.append((f'pos-{i:04d}', f'mkt-{i % 20}', 'Momentum', 'LONG' if i % 2 else 'SHORT',
+                     price, size, size / price, '2026-01-01 00:00:00', db.STATUS_OPEN))
+    with conn:
+        conn.execute('DELETE FROM trades')
+        conn.executemany(
+            'INSERT INTO trades (id, market_id, strategy, direction, entry_price, size_usd, quantity, '
+            'entry_time, status, pnl) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)', rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do fecho de emergência')
+    parser.add_argument('--positions', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--workers', type=int, default=liquidation.WORKERS)
+    parser.add_argument('--latency-ms', type=float, default=40.0, help='latência mediana da exchange')
+    parser.add_argument('--fail-rate', type=float, default=0.03, help='fração de respostas 503')
+    parser.add_argument('--lost-rate', type=float, default=0.01, help='fração de respostas perdidas')
+    parser.add_argument('--read-timeout', type=float, default=0.5, help='timeout de leitura por pedido (s)')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    exchange = MockExchange(args.latency_ms, fail_rate=args.fail_rate, lost_rate=args.lost_rate,
+                            lost_delay=args.read_timeout * 2)
+    results = {
+        'commit': _git_commit(),
+        'positions': args.positions,
+        'exchange': {'latency_ms': args.latency_ms, 'fail_rate': args.fail_rate,
+                     'lost_rate': args.lost_rate, 'read_timeout_s': args.read_timeout},
+        'modes': {},
+    }
+    ok = True
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = db.connect(Path(tmp) / 'trades.db')
+        db.init_schema(conn)
+        for mode, workers in (('sequential', 1), ('concurrent', args.workers)):
+            client = liquidation.ExchangeClient(exchange.url, timeout=(1.0, args.read_timeout),
+                                                pool_size=workers)
+            times, attempts, errors, duplicates = [], [], 0, 0
+            for run in range(args.repeat):
+                open_positions(conn, args.positions, seed=run)
+                exchange.reset()
+                started = time.perf_counter()
+                fills = liquidation.flatten(conn, client, workers, budget=60.0)
+                times.append(time.perf_counter() - started)
+                attempts.extend(fill.attempts for fill in fills if fill.error is None)
+                errors += sum(fill.error is not None for fill in fills)
+                duplicates += sum(count > 1 for count in exchange.executions.values())
+                ok &= db.count_open_trades(conn) == sum(fill.error is not None for fill in fills)
+            client.close_session()
+            times = np.array(times)
+            results['modes'][mode] = {
+                'workers': workers,
+                'runs': args.repeat,
+                'p50_s': float(np.percentile(times, 50)),
+                'p99_s': float(np.percentile(times, 99)),
+                'mean_s': float(times.mean()),
+                'retries': int(sum(attempts) - len(attempts)),
+                'errors': errors,
+                'duplicate_executions': duplicates,
+            }
+            ok &= duplicates == 0
+            m = results['modes'][mode]
+            print(f'{mode:>10} ({workers} workers): p50 {m["p50_s"] * 1000:7.0f}ms  '
+                  f'p99 {m["p99_s"] * 1000:7.0f}ms  retries {m["retries"]}  erros {errors}  '
+                  f'duplicados {duplicates}', file=sys.stderr)
+        conn.close()
+    exchange.stop()
+    results['ok'] = ok
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
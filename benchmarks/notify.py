@@ -0,0 +1,194 @@
+"""Benchmark do dispatcher de notificações contra um Discord simulado local.
+
+``StandInDiscord`` é um servidor HTTP com o comportamento dos webhooks do
+Discord: um balde de ``--limit`` pedidos por ``--per`` segundos, com os
+cabeçalhos ``X-RateLimit-*`` em cada resposta e 429 (``retry_after``)
+quando o balde está vazio, mais uma latência fixa por pedido.
+
+Várias threads produtoras emitem uma rajada de alertas (1% CRITICAL, 9%
+WARNING, 90% INFO) o mais depressa possível, como o ciclo de trading num
+dia mau. O benchmark mede a latência de cada ``notify()`` (tem de ficar
+em microssegundos, com o servidor lento ou em rate limit), as mensagens
+enviadas, os 429, os alertas resumidos e descartados, e confirma que
+todos os CRITICAL chegam ao servidor.
+
+Uso::
+
+    python -m benchmarks.notify --alerts 20000 --out notify.json
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import notify
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        server = self.server
+        time.sleep(server.latency)
+        remaining, reset_after = server.take()
+        if remaining < 0:
+            data = json.dumps({'message': 'You are being rate limited.', 'retry_after': reset_after,
+                               'global': False}).encode()
+            self.send_response(429)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+        else:
+            server.record(body['content'])
+            data = b''
+            self.send_response(204)
+            self.send_header('Content-Length', '0')
+        self.send_header('X-RateLimit-Limit', str(server.limit))
+        self.send_header('X-RateLimit-Remaining', str(max(remaining, 0)))
+        self.send_header('X-RateLimit-Reset-After', f'{reset_after:.3f}')
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StandInDiscord(ThreadingHTTPServer):
+    """Webhook simulado em 127.0.0.1 com rate limit por balde fixo"""
+
+    daemon_threads = True
+
+    def __init__(self, limit=5, per=2.0, latency=0.1):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.limit = limit
+        self.per = per
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.window_start = time.monotonic()
+        self.used = 0
+        self.requests = 0
+        self.rejected = 0
+        self.messages = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/api/webhooks/1/bench'
+
+    def take(self):
+        """Gasta um pedido do balde; retorna (restantes, segundos até repor)"""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.per:
+                self.window_start = now
+                self.used = 0
+            self.requests += 1
+            self.used += 1
+            reset_after = self.per - (now - self.window_start)
+            remaining = self.limit - self.used
+            if remaining < 0:
+                self.rejected += 1
+            return remaining, reset_after
+
+    def record(self, content):
+        with self.lock:
+            self.messages.append(content)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def produce(notifier, start, count, rng_seed, latencies):
+    rng = np.random.default_rng(rng_seed)
+    levels = rng.random(count)
+    out = np.empty(count)
+    for k in range(count):
+        i = start + k
+        if levels[k] < 0.01:
+            args = (f'CRIT-{i:06d} perda diária', 'entradas suspensas', notify.CRITICAL)
+        elif levels[k] < 0.10:
+            args = (f'Momentum fechou mkt-{i % 200} (stop_loss)', 'P&L $-4.20', notify.WARNING)
+        else:
+            args = (f'Momentum abriu LONG em mkt-{i % 50}', '0.5120 · $25.00', notify.INFO)
+        started = time.perf_counter()
+        notifier.notify(*args)
+        out[k] = time.perf_counter() - started
+    latencies.append((out, int((levels < 0.01).sum())))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do dispatcher de notificações')
+    parser.add_argument('--alerts', type=int, default=20000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=5, help='pedidos por janela do webhook')
+    parser.add_argument('--per', type=float, default=2.0, help='janela do rate limit (s)')
+    parser.add_argument('--latency', type=float, default=0.1, help='latência do servidor (s)')
+    parser.add_argument('--drain', type=float, default=60.0, help='tempo máximo para esvaziar a fila (s)')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    server = StandInDiscord(args.limit, args.per, args.latency)
+    notifier = notify.Notifier([notify.DiscordSink(server.url)])
+
+    latencies = []
+    per_thread = args.alerts // args.threads
+    threads = [threading.Thread(target=produce, args=(notifier, t * per_thread, per_thread, t, latencies))
+               for t in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    produce_s = time.perf_counter() - started
+    notifier.close(timeout=args.drain)
+    drain_s = time.perf_counter() - started
+    server.stop()
+
+    calls = np.concatenate([out for out, _ in latencies]) * 1e6
+    criticals = sum(n for _, n in latencies)
+    delivered = set(re.findall(r'CRIT-\d{6}', '\n'.join(server.messages)))
+    stats = notifier.stats()['discord']
+    results = {
+        'commit': _git_commit(),
+        'alerts': len(calls),
+        'threads': args.threads,
+        'server': {'limit': args.limit, 'per_s': args.per, 'latency_s': args.latency},
+        'notify_p50_us': float(np.percentile(calls, 50)),
+        'notify_p99_us': float(np.percentile(calls, 99)),
+        'notify_max_us': float(calls.max()),
+        'produce_s': produce_s,
+        'drain_s': drain_s,
+        'requests': server.requests,
+        'rate_limited': server.rejected,
+        'messages': len(server.messages),
+        'stats': stats,
+        'criticals': criticals,
+        'criticals_delivered': len(delivered),
+    }
+    results['ok'] = len(delivered) == criticals
+    print(f'notify(): p50 {results["notify_p50_us"]:.1f}µs  p99 {results["notify_p99_us"]:.1f}µs  '
+          f'max {results["notify_max_us"]:.0f}µs  ({len(calls)} alertas em {produce_s:.2f}s)', file=sys.stderr)
+    print(f'envio: {len(server.messages)} mensagens, {server.rejected} 429, '
+          f'{stats.get("summarized", 0)} resumidos, {stats.get("dropped", 0)} descartados, '
+          f'CRITICAL {len(delivered)}/{criticals}, fila vazia em {drain_s:.1f}s', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0 if results['ok'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
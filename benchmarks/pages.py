@@ -0,0 +1,159 @@
+"""Benchmark de renderização das páginas do dashboard com o AppTest.
+
+Para cada volume gera (ou reutiliza) uma base de dados sintética e mede, por
+página, uma execução a frio (caches do Streamlit limpas, sessão nova) e uma
+a quente (rerun imediato), o número de elementos emitidos e o pico de
+memória alocada durante a execução a frio. Os resultados são escritos em
+JSON para comparar entre commits.
+
+Cada volume corre num processo próprio porque ``trading.db`` lê o caminho
+da base de dados (``TRADING_BOT_DB``) ao ser importado.
+
+Uso::
+
+    python -m benchmarks.pages --volumes 10000 100000 --out bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+APP_PATH = ROOT / 'app.py'
+PAGES = ['📊 Overview', '📈 Análise', '🎮 Controlo', '⚙️ Configurações']
+
+
+def _new_app(page, timeout):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    at.session_state['page'] = page
+    return at
+
+
+def _clear_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def _count_elements(at):
+    return sum(1 for _ in at.main) + sum(1 for _ in at.sidebar)
+
+
+def _timed_run(at):
+    started = time.perf_counter()
+    at.run()
+    return (time.perf_counter() - started) * 1000
+
+
+def bench_page(page, repeat=3, timeout=300):
+    """Tempos (ms) a frio e a quente, elementos e pico de memória de uma página"""
+    cold, warm = [], []
+    for _ in range(repeat):
+        _clear_caches()
+        at = _new_app(page, timeout)
+        cold.append(_timed_run(at))
+        warm.append(_timed_run(at))
+    errors = [str(e.value) for e in at.exception]
+
+    # Passagem separada: o tracemalloc abranda a execução e distorceria os tempos
+    _clear_caches()
+    at = _new_app(page, timeout)
+    tracemalloc.start()
+    at.run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'cold_ms': min(cold),
+        'warm_ms': min(warm),
+        'cold_runs_ms': cold,
+        'warm_runs_ms': warm,
+        'elements': _count_elements(at),
+        'peak_memory_mb': peak / 1024 ** 2,
+        'errors': errors,
+    }
+
+
+def run_volume(pages, repeat):
+    """Corre todas as páginas contra a DB em TRADING_BOT_DB (processo filho)"""
+    sys.path.insert(0, str(ROOT))
+    return {page: bench_page(page, repeat) for page in pages}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das páginas do dashboard')
+    parser.add_argument('--volumes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--strategies', type=int, default=4)
+    parser.add_argument('--markets', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--data-dir', default='/tmp/trading-bench',
+                        help='onde guardar as bases de dados geradas')
+    parser.add_argument('--regenerate', action='store_true',
+                        help='gerar as bases de dados mesmo que já existam')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        json.dump(run_volume(args.pages, args.repeat), sys.stdout)
+        return 0
+
+    from benchmarks import synthetic
+
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    results = {
+        'commit': _git_commit(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('worker', 'out')},
+        'volumes': {},
+    }
+
+    for volume in args.volumes:
+        db_path = data_dir / f'trades_{volume}_{args.strategies}s_{args.markets}m_{args.seed}.db'
+        if args.regenerate or not db_path.exists():
+            for suffix in ('', '-wal', '-shm'):
+                Path(f'{db_path}{suffix}').unlink(missing_ok=True)
+            elapsed = synthetic.generate(db_path, volume, args.strategies, args.markets, args.seed)
+            print(f'{volume} trades gerados ({elapsed:.1f}s)', file=sys.stderr)
+
+        proc = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.pages', '--worker', '--repeat', str(args.repeat),
+             '--pages', *args.pages],
+            cwd=ROOT, env={**os.environ, 'TRADING_BOT_DB': str(db_path)},
+            capture_output=True, text=True, check=True)
+        pages = json.loads(proc.stdout)
+        results['volumes'][str(volume)] = pages
+        for page, r in pages.items():
+            print(f'{volume:>8} {page:<20} frio {r["cold_ms"]:8.1f} ms  quente {r["warm_ms"]:7.1f} ms  '
+                  f'{r["elements"]:4d} elementos  {r["peak_memory_mb"]:7.1f} MB'
+                  + (f'  ERROS: {r["errors"]}' if r['errors'] else ''), file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""Benchmark da retenção: DB quente pequena sem perder histórico.
+
+Copia a DB de partida, mede as leituras do dashboard (agregados, curva de
+equity, trades fechados com métricas, trades recentes e abertos, primeira
+página e páginas fundas do histórico) e os totais, corre
+``retention.maintain`` com a janela pedida e repete as medições com os
+trades antigos nos arquivos mensais.
+
+Reporta o tamanho da DB quente antes e depois, o p50 de cada leitura nos
+dois estados e confirma que nada se perdeu: contagem e soma do P&L dos
+trades fechados, métricas por estratégia, ids percorridos pelo histórico,
+curva de equity completa e ``rollups.verify`` sem diferenças.
+
+Uso::
+
+    python -m benchmarks.retention --db /tmp/trading-bench/trades_100000_4s_200m_42.db --out retention.json
+"""
+import argparse
+import hashlib
+import json
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import analytics, db, history, retention, rollups
+
+BANKROLL = 1000.0
+
+
+def timed(func, repeat):
+    """p50 (ms) de ``repeat`` chamadas"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return float(np.percentile(times, 50) * 1000)
+
+
+def deep_page(conn, depth, page_size=50):
+    """Página ``depth`` do histórico (percorre as anteriores pelo cursor)"""
+    after = None
+    for _ in range(depth):
+        _, after = history.fetch_page(conn, after=after, page_size=page_size)
+    return history.fetch_page(conn, after=after, page_size=page_size)
+
+
+def reads(conn):
+    return {
+        'strategies': lambda: rollups.read_strategies(conn),
+        'equity_curve': lambda: rollups.equity_curve(conn, BANKROLL),
+        'closed_trades': lambda: analytics.strategy_metrics(analytics.load_closed_trades(conn), base=BANKROLL),
+        'recent_trades': lambda: db.fetch_recent_trades(conn, limit=5),
+        'open_trades': lambda: db.fetch_open_trades(conn),
+        'history_first_page': lambda: history.fetch_page(conn),
+        'history_page_200': lambda: deep_page(conn, 200),
+    }
+
+
+def totals(conn):
+    """Tudo o que tem de ficar igual depois do arquivo"""
+    trades = analytics.load_closed_trades(conn)
+    metrics = analytics.strategy_metrics(trades, base=BANKROLL)
+    digest = hashlib.sha256()
+    count = 0
+    for row in history.iter_rows(conn):
+        digest.update(row['id'].encode())
+        count += 1
+    ts, equity = rollups.equity_curve(conn, BANKROLL)
+    return {
+        'closed': int(len(trades['pnl'])),
+        'pnl_sum': round(float(trades['pnl'].sum()), 6),
+        'metrics': {name: {key: round(float(value), 6) for key, value in row.items()
+                           if isinstance(value, (int, float, np.number))}
+                    for name, row in zip(metrics['strategy'], _rows(metrics))},
+        'history_rows': count,
+        'history_sha256': digest.hexdigest(),
+        'equity_points': int(len(ts)),
+        'final_equity': round(float(equity[-1]), 6) if len(equity) else None,
+        'closed_range': list(rollups.closed_range(conn)),
+        'verify': rollups.verify(conn, BANKROLL),
+    }
+
+
+def _rows(metrics):
+    keys = [key for key in metrics if key != 'strategy']
+    return [dict(zip(keys, values)) for values in zip(*(metrics[key] for key in keys))]
+
+
+def measure(db_path, repeat):
+    conn = db.connect(db_path)
+    try:
+        used, free = retention.size(conn)
+        latencies = {name: timed(func, repeat) for name, func in reads(conn).items()}
+        return {'hot_bytes': used, 'free_bytes': free, 'p50_ms': latencies, 'totals': totals(conn)}
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da retenção e do arquivo mensal')
+    parser.add_argument('--db', default='/tmp/trading-bench/trades_100000_4s_200m_42.db',
+                        help='DB de partida (copiada)')
+    parser.add_argument('--days', type=int, default=30, help='dias na DB quente')
+    parser.add_argument('--now', default=None,
+                        help='data de referência (por omissão o dia a seguir ao último exit_time)')
+    parser.add_argument('--repeat', type=int, default=20, help='repetições de cada leitura')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    results = {'commit': _git_commit(), 'source': str(args.db), 'hot_days': args.days}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'trades.db'
+        shutil.copy(args.db, db_path)
+        conn = db.connect(db_path)
+        db.init_schema(conn)
+        rollups.refresh(conn, BANKROLL)
+        last = rollups.closed_range(conn)[1]
+        conn.close()
+        now = datetime.fromisoformat(args.now) if args.now else \
+            datetime.fromisoformat(last[:10]) + timedelta(days=1)
+        results['now'] = now.isoformat(sep=' ')
+
+        before = results['before'] = measure(db_path, args.repeat)
+        config = {'hot_days': args.days, 'max_hot_mb': 1024, 'interval_minutes': 60}
+        # Como na CLI com --vacuum: a primeira volta liga o auto_vacuum incremental
+        run = results['maintain'] = retention.maintain(db_path, config, BANKROLL, now, vacuum=True)
+        # Segunda volta sem trades novos: só o custo fixo da manutenção
+        results['maintain_again'] = retention.maintain(db_path, config, BANKROLL, now)
+        after = results['after'] = measure(db_path, args.repeat)
+        conn = db.connect(db_path)
+        results['status'] = retention.status(conn)
+        conn.close()
+
+    results['unchanged'] = before['totals'] == after['totals'] and not after['totals']['verify']
+    print(f'{run["moved"]} trades arquivados em {run["seconds"]:.1f}s; DB quente '
+          f'{before["hot_bytes"] / 2**20:.1f} MB -> {after["hot_bytes"] / 2**20:.1f} MB '
+          f'({len(results["status"]["archives"])} arquivos)', file=sys.stderr)
+    for name in before['p50_ms']:
+        print(f'  {name:>18}: {before["p50_ms"][name]:8.2f}ms -> {after["p50_ms"][name]:8.2f}ms',
+              file=sys.stderr)
+    print(f'totais iguais: {results["unchanged"]}', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False, default=str)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0 if results['unchanged'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
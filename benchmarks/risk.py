@@ -0,0 +1,181 @@
+"""Benchmark do motor de risco sobre um registo de eventos gravado.
+
+Gera (ou reutiliza) um registo determinístico de eventos de preço e de
+fills: os preços seguem um passeio aleatório por mercado, as entradas e
+saídas discricionárias são sorteadas e as instruções de fecho do motor
+voltam ao registo como fills de fecho, como faria o bot. O benchmark
+relê o registo do disco e mede o débito de ``risk.replay`` num motor
+novo. Com ``--verify`` compara as instruções com uma implementação
+ingénua que percorre todas as posições em cada evento.
+
+Uso::
+
+    python -m benchmarks.risk --events 1000000 --log /tmp/risk-events.jsonl --out risk.json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from benchmarks.synthetic import START_TIME, market_names, strategy_names
+from trading import risk, ticks
+
+
+def generate_events(count, markets=20, strategies=4, seed=42, bankroll=1000.0):
+    """Simula ``count`` eventos com o motor no circuito; retorna a lista de tuplos"""
+    rng = np.random.default_rng(seed)
+    market_ids = market_names(markets)
+    names = strategy_names(strategies)
+    prices = rng.uniform(0.2, 0.8, markets)
+    engine = risk.RiskEngine(bankroll=bankroll)
+
+    kinds = rng.random(count)
+    which = rng.integers(0, markets, count)
+    moves = rng.normal(0, 0.01, count)
+    gaps = rng.integers(0, 2000, count)
+    sizes = rng.uniform(10, 60, count)
+    ts = ticks.to_millis(START_TIME)
+
+    events = []
+    open_ids = []
+    next_id = 0
+    for i in range(count):
+        if len(events) >= count:
+            break
+        ts += int(gaps[i])
+        m = int(which[i])
+        if kinds[i] < 0.004:
+            price = float(prices[m])
+            event = ('open', ts, f'pos-{next_id}', market_ids[m], names[next_id % len(names)],
+                     'LONG' if kinds[i] < 0.002 else 'SHORT', price, round(float(sizes[i]) / price, 4))
+            open_ids.append(f'pos-{next_id}')
+            next_id += 1
+        elif kinds[i] < 0.0042 and open_ids:
+            position_id = open_ids.pop(int(rng.integers(0, len(open_ids))))
+            position = engine.positions.get(position_id)
+            if position is None:
+                continue
+            event = ('close', ts, position_id, float(prices[market_ids.index(position.market)]))
+        else:
+            prices[m] = min(max(prices[m] * (1 + moves[i]), 0.01), 0.99)
+            event = ('price', ts, market_ids[m], round(float(prices[m]), 5))
+        events.append(event)
+        # As instruções do motor voltam como fills de fecho
+        for instruction in engine.process(event):
+            fill = ('close', ts + 1, instruction.position_id, instruction.price)
+            events.append(fill)
+            engine.process(fill)
+            if instruction.position_id in open_ids:
+                open_ids.remove(instruction.position_id)
+    return events[:count]
+
+
+class NaiveRisk(risk.RiskEngine):
+    """Referência O(n) por evento: percorre todas as posições a cada tick"""
+
+    def _arm(self, position):
+        position.closing = False
+
+    def _check(self, ts):
+        out = []
+        for position in list(self.positions.values()):
+            if position.closing:
+                continue
+            price = self.markets[position.market].price
+            low = position.entry * (1 - self._stop if position.sign > 0 else 1 - self._take)
+            high = position.entry * (1 + self._take if position.sign > 0 else 1 + self._stop)
+            if price <= low:
+                self._emit(out, ts, position.id, 'stop_loss' if position.sign > 0 else 'take_profit', price)
+            elif price >= high:
+                self._emit(out, ts, position.id, 'take_profit' if position.sign > 0 else 'stop_loss', price)
+        for position in list(self.positions.values()):
+            if not position.closing and position.opened + self._time_stop <= ts:
+                self._emit(out, ts, position.id, 'time_stop', self.markets[position.market].price)
+        self.recompute_unrealized()
+        if not self.halted and self.daily_loss >= self.daily_loss_limit:
+            self._halt(out, ts)
+        return out
+
+    def on_price(self, ts, market_id, price):
+        if self.day != ts // risk.DAY_MS:
+            self._new_day(ts)
+        market = self.markets.get(market_id)
+        if market is None:
+            market = self.markets[market_id] = risk._Market(market_id)
+        market.price = price
+        return self._check(ts)
+
+    def on_open(self, ts, *args):
+        out = super().on_open(ts, *args)
+        return out + self._check(ts)
+
+
+def _key(instructions):
+    return sorted((i.ts, i.position_id, i.reason) for i in instructions)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do motor de risco')
+    parser.add_argument('--events', type=int, default=1000000)
+    parser.add_argument('--markets', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--log', default='/tmp/trading-bench/risk_events.jsonl',
+                        help='registo de eventos (gerado se não existir)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--verify', type=int, default=20000,
+                        help='eventos a comparar com a referência ingénua (0 desliga)')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    log = Path(args.log)
+    if not log.exists():
+        log.parent.mkdir(parents=True, exist_ok=True)
+        started = time.perf_counter()
+        risk.write_log(log, generate_events(args.events, args.markets, seed=args.seed))
+        print(f'registo gerado em {time.perf_counter() - started:.1f}s: {log}', file=sys.stderr)
+
+    started = time.perf_counter()
+    events = risk.read_log(log)
+    load_s = time.perf_counter() - started
+
+    results = {'commit': _git_commit(), 'log': str(log), 'events': len(events), 'load_s': load_s}
+    best = None
+    for _ in range(args.repeat):
+        engine = risk.RiskEngine()
+        started = time.perf_counter()
+        instructions = risk.replay(engine, events)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    results.update(
+        events_per_s=len(events) / best,
+        replay_s=best,
+        instructions=len(instructions),
+        reasons={reason: sum(1 for i in instructions if i.reason == reason)
+                 for reason in sorted({i.reason for i in instructions})},
+        final=engine.snapshot(),
+    )
+    print(f'replay: {len(events):,} eventos em {best:.2f}s = {len(events) / best:,.0f} eventos/s, '
+          f'{len(instructions)} instruções {results["reasons"]}', file=sys.stderr)
+
+    if args.verify:
+        sample = events[:args.verify]
+        fast = risk.replay(risk.RiskEngine(), sample)
+        slow = risk.replay(NaiveRisk(), sample)
+        results['verified'] = _key(fast) == _key(slow)
+        print(f'verificação ({len(sample)} eventos, {len(fast)} instruções): '
+              f'{"ok" if results["verified"] else "DIFERENTE"}', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0 if results.get('verified', True) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Benchmark da cache partilhada com vários ecrãs a ver o dashboard.
+
+Cada "viewer" é uma thread que, em cada ronda, faz as leituras de uma
+página (agregados por estratégia, trades fechados com as métricas
+vetorizadas, trades recentes, posições abertas) através de uma
+``cache.VersionedCache``. As rondas começam ao mesmo tempo em todos os
+viewers, como os reruns do modo live, e um writer faz commits noutra
+ligação para a versão da DB mudar a meio.
+
+Dois modos sobre a mesma DB: uma cache por viewer (o que cada sessão
+faria sozinha) e uma cache partilhada com single-flight. Reporta os
+cálculos (consultas à DB) por modo, o p50/p99 de cada ronda e, no modo
+partilhado, as sessões servidas por cálculo.
+
+Uso::
+
+    python -m benchmarks.shared_cache --db /tmp/trading-bench/trades_100000_4s_200m_42.db --out shared_cache.json
+"""
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import analytics, cache, db, rollups
+
+BANKROLL = 1000.0
+
+
+def getters(pool, calls):
+    """Leituras de uma página; ``calls`` conta os cálculos de cada uma"""
+    def counted(func):
+        def wrapper():
+            calls[func.__name__] += 1
+            with pool.connection() as conn:
+                return func(conn)
+        wrapper.__name__ = wrapper.__qualname__ = func.__name__
+        return wrapper
+
+    def strategies(conn):
+        return rollups.read_strategies(conn)
+
+    def closed_trades(conn):
+        trades = analytics.load_closed_trades(conn)
+        return trades, analytics.strategy_metrics(trades, base=BANKROLL)
+
+    def recent_trades(conn):
+        return [dict(row) for row in db.fetch_recent_trades(conn, limit=5)]
+
+    def open_trades(conn):
+        return [dict(row) for row in db.fetch_open_trades(conn)]
+
+    return [counted(func) for func in (strategies, closed_trades, recent_trades, open_trades)]
+
+
+def writer(db_path, stop, interval):
+    """Commits periódicos noutra ligação (mudam o data_version)"""
+    conn = db.connect(db_path)
+    with conn:
+        conn.execute('CREATE TABLE IF NOT EXISTS bench_writes (ts REAL)')
+    while not stop.wait(interval):
+        with conn:
+            conn.execute('INSERT INTO bench_writes VALUES (?)', (time.time(),))
+    conn.close()
+
+
+def run_mode(db_path, shared, viewers, rounds, pause, write_interval):
+    pool = db.ConnectionPool(db_path, size=viewers)
+    calls = Counter()
+    funcs = getters(pool, calls)
+    if shared:
+        common = cache.VersionedCache(db_path, session=lambda: threading.current_thread().name)
+        caches = [common] * viewers
+    else:
+        caches = [cache.VersionedCache(db_path) for _ in range(viewers)]
+    barrier = threading.Barrier(viewers)
+    times = [[] for _ in range(viewers)]
+
+    def viewer(i):
+        for _ in range(rounds):
+            barrier.wait()
+            started = time.perf_counter()
+            for func in funcs:
+                caches[i].call(func)
+            times[i].append(time.perf_counter() - started)
+            time.sleep(pause)
+
+    stop = threading.Event()
+    write = threading.Thread(target=writer, args=(db_path, stop, write_interval))
+    write.start()
+    threads = [threading.Thread(target=viewer, args=(i,), name=f'viewer-{i}') for i in range(viewers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    write.join()
+
+    times = np.concatenate(times) * 1000
+    result = {
+        'computations': sum(calls.values()),
+        'computations_per_round': sum(calls.values()) / rounds,
+        'round_p50_ms': float(np.percentile(times, 50)),
+        'round_p99_ms': float(np.percentile(times, 99)),
+        'elapsed_s': elapsed,
+    }
+    if shared:
+        result['stats'] = common.stats()
+        result['by_getter'] = common.computations()
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark da cache partilhada entre sessões')
+    parser.add_argument('--db', default='/tmp/trading-bench/trades_100000_4s_200m_42.db',
+                        help='DB de partida (copiada)')
+    parser.add_argument('--viewers', type=int, default=8, help='sessões em simultâneo')
+    parser.add_argument('--rounds', type=int, default=30, help='reruns por sessão')
+    parser.add_argument('--pause', type=float, default=0.05, help='pausa entre reruns (s)')
+    parser.add_argument('--write-interval', type=float, default=0.5, help='intervalo entre commits (s)')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    results = {'commit': _git_commit(), 'source': str(args.db), 'viewers': args.viewers,
+               'rounds': args.rounds, 'write_interval_s': args.write_interval, 'modes': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / 'trades.db'
+        shutil.copy(args.db, db_path)
+        conn = db.connect(db_path)
+        db.init_schema(conn)
+        rollups.refresh(conn, BANKROLL)
+        conn.close()
+
+        for mode, shared in (('per_session', False), ('shared', True)):
+            m = results['modes'][mode] = run_mode(db_path, shared, args.viewers, args.rounds,
+                                                  args.pause, args.write_interval)
+            print(f'{mode:>11}: {m["computations"]:>5} cálculos ({m["computations_per_round"]:.1f}/ronda)  '
+                  f'ronda p50 {m["round_p50_ms"]:7.2f}ms  p99 {m["round_p99_ms"]:7.2f}ms', file=sys.stderr)
+
+    shared = results['modes']['shared']
+    for name, counts in shared['by_getter'].items():
+        print(f'  {name:>14}: {counts["computations"]:>3} cálculos  {counts["served"]:>4} servidos  '
+              f'{counts["sessions_per_computation"]:.1f} sessões/cálculo', file=sys.stderr)
+    per_session = results['modes']['per_session']['computations']
+    results['reduction'] = per_session / shared['computations'] if shared['computations'] else None
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Tempo de arranque a frio e de rerun do dashboard.
+
+Cada página corre num processo Python novo (sem módulos importados nem
+caches do Streamlit): a primeira execução do script mede o arranque até ao
+primeiro render, incluindo os imports do app.py e o bootstrap da DB; os
+reruns seguintes medem o custo por interação.
+
+Com ``--check`` sai com erro se uma página importar no primeiro render um
+módulo de ``LAZY_MODULES`` que não usa (um import que voltou para o topo
+do app.py) ou se o primeiro render passar de ``--budget-ms``.
+
+Uso::
+
+    python -m benchmarks.startup --db /tmp/bench.db --out startup.json
+    python -m benchmarks.startup --db /tmp/bench.db --repeat 1 --check
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.pages import APP_PATH, PAGES, ROOT, _git_commit
+
+# Módulos pesados ou só de algumas páginas -> páginas que os podem importar
+LAZY_MODULES = {
+    'requests': ('⚙️ Configurações',),  # notify, só com webhook do Discord
+    'trading.liquidation': (),           # só no fecho de emergência
+    'trading.paper': (),                 # só nos workers
+    'trading.backtest': ('📈 Análise', '⚙️ Configurações'),
+    'trading.sweep': ('📈 Análise',),
+}
+
+
+def measure(page, reruns):
+    """Primeiro render e reruns de uma página (corre no processo filho)"""
+    from streamlit.testing.v1 import AppTest
+
+    # O próprio streamlit fica fora da medição: só conta o que o app.py faz
+    at = AppTest.from_file(str(APP_PATH), default_timeout=300)
+    at.session_state['page'] = page
+    modules = set(sys.modules)
+
+    started = time.perf_counter()
+    at.run()
+    first_ms = (time.perf_counter() - started) * 1000
+    new = set(sys.modules) - modules
+    imported = sorted({name.split('.')[0] for name in new})
+
+    times = []
+    for _ in range(reruns):
+        started = time.perf_counter()
+        at.run()
+        times.append((time.perf_counter() - started) * 1000)
+
+    return {
+        'first_run_ms': first_ms,
+        'rerun_ms': statistics.median(times),
+        'rerun_runs_ms': times,
+        'imported': imported,
+        'lazy_imported': sorted(name for name in LAZY_MODULES if name in new),
+        'errors': [str(e.value) for e in at.exception],
+    }
+
+
+def check(results, budget_ms):
+    """Regressões do arranque: módulos importados cedo demais, erros e tempo a mais"""
+    failures = []
+    for page, r in results['pages'].items():
+        for name in r['lazy_imported']:
+            if page not in LAZY_MODULES[name]:
+                failures.append(f'{page}: importa {name} no primeiro render')
+        if r['errors']:
+            failures.append(f'{page}: erros {r["errors"]}')
+        if budget_ms and r['first_run_ms'] > budget_ms:
+            failures.append(f'{page}: primeiro render {r["first_run_ms"]:.0f} ms > {budget_ms:.0f} ms')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Arranque a frio e reruns do dashboard')
+    parser.add_argument('--db', required=True, help='base de dados a usar (ver benchmarks.synthetic)')
+    parser.add_argument('--pages', nargs='+', default=PAGES)
+    parser.add_argument('--reruns', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3, help='processos novos por página')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    parser.add_argument('--check', action='store_true', help='falha se houver regressões (ver LAZY_MODULES)')
+    parser.add_argument('--budget-ms', type=float, default=None, help='com --check, máximo do primeiro render')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        json.dump(measure(args.worker, args.reruns), sys.stdout)
+        return 0
+
+    results = {'commit': _git_commit(), 'db': str(Path(args.db).resolve()), 'pages': {}}
+    for page in args.pages:
+        runs = []
+        for _ in range(args.repeat):
+            proc = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup', '--db', args.db,
+                 '--reruns', str(args.reruns), '--worker', page],
+                cwd=ROOT, env={**os.environ, 'TRADING_BOT_DB': str(args.db)},
+                capture_output=True, text=True, check=True)
+            runs.append(json.loads(proc.stdout))
+        best = min(runs, key=lambda r: r['first_run_ms'])
+        results['pages'][page] = {
+            'first_run_ms': best['first_run_ms'],
+            'first_runs_ms': [r['first_run_ms'] for r in runs],
+            'rerun_ms': statistics.median(r['rerun_ms'] for r in runs),
+            'imported': best['imported'],
+            'lazy_imported': sorted({name for r in runs for name in r['lazy_imported']}),
+            'errors': best['errors'],
+        }
+        r = results['pages'][page]
+        print(f'{page:<20} primeiro render {r["first_run_ms"]:8.1f} ms  rerun {r["rerun_ms"]:6.1f} ms'
+              + (f'  ERROS: {r["errors"]}' if r['errors'] else ''), file=sys.stderr)
+
+    failures = results['failures'] = check(results, args.budget_ms) if args.check else []
+    for line in failures:
+        print(f'FALHA {line}', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
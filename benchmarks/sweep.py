@@ -0,0 +1,72 @@
+"""Benchmark de escalabilidade do varrimento de parâmetros.
+
+Corre o mesmo varrimento (grelha completa por omissão: 1000 combinações
+por estratégia) com 1, 2, 4, ... processos até ``--max-workers`` e regista
+o tempo, o speedup e a eficiência face a um processo. Os preços vêm do
+armazém de ticks (``benchmarks.synthetic --ticks-dir`` gera um ano).
+
+Uso::
+
+    python -m benchmarks.sweep --dir /tmp/trading-bench/ticks --out sweep.json
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks.pages import _git_commit
+from trading import sweep, ticks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do varrimento de parâmetros')
+    parser.add_argument('--dir', default=ticks.TICKS_DIR, help='pasta do armazém de ticks')
+    parser.add_argument('--samples', type=int, help='amostra da grelha (grelha toda por omissão)')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    counts = []
+    workers = 1
+    while workers <= args.max_workers:
+        counts.append(workers)
+        workers *= 2
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    results = {'commit': _git_commit(), 'cpus': os.cpu_count(), 'runs': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Os resultados do benchmark não se misturam com os varrimentos reais
+        sweep.SWEEP_DIR = Path(tmp)
+        base = None
+        for workers in counts:
+            result = sweep.run(f'bench-{workers}', samples=args.samples, workers=workers,
+                               ticks_dir=args.dir)
+            elapsed = result['total_s'] - result['load_s']
+            base = base or elapsed
+            run = {
+                'workers': workers,
+                'combinations': result['combinations'] * len(result['strategies']),
+                'markets': result['markets'],
+                'points': result['points'],
+                'load_s': result['load_s'],
+                'sweep_s': elapsed,
+                'speedup': base / elapsed,
+                'efficiency': base / elapsed / workers,
+            }
+            results['runs'].append(run)
+            print(f'{workers:>3} processos: {elapsed:7.1f}s  speedup {run["speedup"]:.2f}x  '
+                  f'eficiência {run["efficiency"]:.0%}', file=sys.stderr)
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
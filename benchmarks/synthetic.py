@@ -0,0 +1,174 @@
+"""Gerador determinístico de trades sintéticos para benchmarks.
+
+A mesma seed produz sempre a mesma base de dados: os trades são gerados em
+blocos vetorizados com NumPy, inseridos com ``executemany`` e os rollups
+(``daily_metrics`` e ``strategy_metrics``) são reconstruídos no fim.
+Opcionalmente gera também ticks de preço (passeio aleatório) por mercado
+no armazém de ticks.
+
+Uso::
+
+    python -m benchmarks.synthetic --db /tmp/bench.db --trades 100000
+    python -m benchmarks.synthetic --db /tmp/bench.db --ticks-dir /tmp/ticks --ticks 100000
+"""
+import argparse
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from trading import db, rollups, ticks
+
+BASE_STRATEGIES = ['Momentum', 'MeanReversion', 'Scalping', 'Contrarian']
+START_TIME = datetime(2025, 1, 1)
+CHUNK_SIZE = 50000
+
+
+def strategy_names(n):
+    """As estratégias do dashboard seguidas de StrategyN"""
+    return (BASE_STRATEGIES + [f'Strategy{i}' for i in range(len(BASE_STRATEGIES), n)])[:n]
+
+
+def market_names(n):
+    return [f'market-{i:04d}' for i in range(n)]
+
+
+def _format_times(seconds):
+    """Epoch em segundos -> 'YYYY-MM-DD HH:MM:SS'"""
+    stamps = (np.datetime64(START_TIME, 's') + seconds.astype('timedelta64[s]'))
+    return np.char.replace(stamps.astype(str), 'T', ' ')
+
+
+def generate_chunk(rng, first, count, total, n_open, strategies, markets, spacing):
+    """Gera ``count`` trades a partir do índice ``first`` como lista de tuplos.
+
+    Os últimos ``n_open`` trades de ``total`` ficam abertos.
+    """
+    index = np.arange(first, first + count)
+    closed = index < total - n_open
+
+    entry_offset = index * spacing
+    duration = rng.integers(60, 36000, count)
+    entry_price = rng.uniform(0.05, 0.95, count).round(4)
+    size_usd = rng.uniform(10, 60, count).round(2)
+    # Ligeiro edge positivo, com caudas para os drawdowns não serem triviais
+    pnl_pct = (rng.standard_t(4, count) * 6 + 0.8).clip(-100, 300).round(2)
+    pnl = (size_usd * pnl_pct / 100).round(4)
+    exit_price = (entry_price * (1 + pnl_pct / 100)).clip(0.001, 0.999).round(4)
+    strategy = rng.integers(0, len(strategies), count)
+    market = rng.integers(0, len(markets), count)
+    direction = rng.random(count) < 0.5
+    reasons = np.array(['take_profit', 'stop_loss'])[(pnl < 0).astype(int)]
+
+    entry_time = _format_times(entry_offset)
+    exit_time = _format_times(entry_offset + duration)
+
+    rows = []
+    for i in range(count):
+        is_closed = bool(closed[i])
+        rows.append((
+            f'syn-{index[i]:08d}',
+            markets[market[i]],
+            strategies[strategy[i]],
+            'LONG' if direction[i] else 'SHORT',
+            float(entry_price[i]),
+            float(exit_price[i]) if is_closed else None,
+            float(size_usd[i]),
+            float(size_usd[i] / entry_price[i]),
+            str(entry_time[i]),
+            str(exit_time[i]) if is_closed else None,
+            db.STATUS_CLOSED if is_closed else db.STATUS_OPEN,
+            float(pnl[i]) if is_closed else None,
+            float(pnl_pct[i]),
+            str(reasons[i]) if is_closed else None,
+        ))
+    return rows
+
+
+def generate(db_path, trades=10000, strategies=4, markets=200, seed=42, n_open=20,
+             days=365, initial_bankroll=1000.0):
+    """Cria (ou substitui) a base de dados ``db_path`` com trades sintéticos.
+
+    Os trades ficam espaçados uniformemente ao longo de ``days`` dias.
+    Retorna o tempo gasto em segundos.
+    """
+    started = time.perf_counter()
+    conn = db.connect(db_path)
+    db.init_schema(conn)
+    conn.execute('DELETE FROM trades')
+    conn.commit()
+
+    rng = np.random.default_rng(seed)
+    names = strategy_names(strategies)
+    market_ids = market_names(markets)
+    spacing = max(days * 86400 // max(trades, 1), 1)
+    n_open = min(n_open, trades)
+
+    try:
+        for first in range(0, trades, CHUNK_SIZE):
+            count = min(CHUNK_SIZE, trades - first)
+            rows = generate_chunk(rng, first, count, trades, n_open, names, market_ids, spacing)
+            with conn:
+                conn.executemany(
+                    f'INSERT INTO trades ({", ".join(db.TRADE_COLUMNS)}) '
+                    f'VALUES ({", ".join("?" * len(db.TRADE_COLUMNS))})', rows)
+        rollups.rebuild(conn, initial_bankroll)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    return time.perf_counter() - started
+
+
+def generate_ticks(root, markets=200, per_market=10000, seed=42, days=365, chunk_size=CHUNK_SIZE):
+    """Preenche o armazém de ticks com ``per_market`` ticks por mercado.
+
+    Os preços seguem um passeio aleatório limitado a [0.01, 0.99] e os ticks
+    cobrem os mesmos ``days`` dias que os trades; ticks anteriores destes
+    mercados são apagados. Retorna o tempo gasto.
+    """
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    store = ticks.TickStore(root)
+    start_ms = ticks.to_millis(START_TIME)
+    step = max(days * 86400 * 1000 // max(per_market, 1), 1)
+    for market in market_names(markets):
+        store.drop(market)
+        price = rng.uniform(0.1, 0.9)
+        offset = 0
+        for first in range(0, per_market, chunk_size):
+            count = min(chunk_size, per_market - first)
+            gaps = rng.integers(step // 2, step * 3 // 2 + 1, count)
+            ts = start_ms + offset + np.cumsum(gaps)
+            offset = int(ts[-1] - start_ms)
+            prices = (price + np.cumsum(rng.normal(0, 0.002, count))).clip(0.01, 0.99)
+            price = float(prices[-1])
+            volume = rng.exponential(50, count).round(2)
+            store.append(market, ts, prices.round(4), volume)
+    return time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gera uma trading_bot.db sintética')
+    parser.add_argument('--db', required=True, help='caminho da base de dados a criar')
+    parser.add_argument('--trades', type=int, default=10000)
+    parser.add_argument('--strategies', type=int, default=4)
+    parser.add_argument('--markets', type=int, default=200)
+    parser.add_argument('--open', type=int, default=20, help='trades que ficam abertos')
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--ticks-dir', help='armazém de ticks a preencher (opcional)')
+    parser.add_argument('--ticks', type=int, default=10000, help='ticks por mercado')
+    args = parser.parse_args(argv)
+
+    elapsed = generate(args.db, args.trades, args.strategies, args.markets, args.seed,
+                       args.open, args.days)
+    print(f'{args.trades} trades gerados em {args.db} ({elapsed:.1f}s)')
+    if args.ticks_dir:
+        elapsed = generate_ticks(args.ticks_dir, args.markets, args.ticks, args.seed, args.days)
+        print(f'{args.ticks} ticks x {args.markets} mercados em {args.ticks_dir} ({elapsed:.1f}s)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
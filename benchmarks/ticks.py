@@ -0,0 +1,145 @@
+"""Benchmark do armazém de ticks contra a mesma janela lida do SQLite.
+
+Escreve ``--ticks`` ticks de um mercado em lotes (débito de escrita) e mede
+a leitura de janelas de tempo de vários tamanhos: localizar a janela e
+calcular o VWAP sobre as fatias memory-mapped, contra uma tabela SQLite
+indexada por (market_id, ts) lida linha a linha para arrays. Mede também o
+rollup OHLC (construção inicial e update incremental) e a leitura de barras
+na resolução que o gráfico escolheria para cada janela.
+
+Uso::
+
+    python -m benchmarks.ticks --ticks 5000000 --out ticks.json
+"""
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.pages import _git_commit
+from trading import ohlc, ticks
+
+MARKET = 'bench-market'
+WINDOWS = {'1h': 3600, '1d': 86400, '30d': 30 * 86400, 'tudo': None}
+
+
+def _best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        times.append((time.perf_counter() - started) * 1000)
+    return min(times), result
+
+
+def _vwap(price, volume):
+    total = volume.sum()
+    return float((price * volume).sum() / total) if total else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do armazém de ticks')
+    parser.add_argument('--ticks', type=int, default=5000000)
+    parser.add_argument('--batch', type=int, default=10000, help='ticks por append')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--no-sqlite', action='store_true', help='não medir o SQLite')
+    parser.add_argument('--out', default='-', help='ficheiro JSON de saída (- para stdout)')
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(42)
+    # Um tick a cada ~6 s em média: 5M ticks cobrem ~1 ano
+    ts = 1735689600000 + np.cumsum(rng.integers(1000, 11000, args.ticks))
+    price = (0.5 + np.cumsum(rng.normal(0, 0.001, args.ticks))).clip(0.01, 0.99)
+    volume = rng.exponential(50, args.ticks)
+
+    results = {'commit': _git_commit(), 'ticks': args.ticks, 'batch': args.batch, 'windows': {}}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = ticks.TickStore(Path(tmp) / 'ticks')
+        started = time.perf_counter()
+        for i in range(0, args.ticks, args.batch):
+            store.append(MARKET, ts[i:i + args.batch], price[i:i + args.batch],
+                         volume[i:i + args.batch])
+        elapsed = time.perf_counter() - started
+        results['append_ticks_per_s'] = args.ticks / elapsed
+        print(f'append: {args.ticks / elapsed:,.0f} ticks/s', file=sys.stderr)
+
+        conn = None
+        if not args.no_sqlite:
+            conn = sqlite3.connect(Path(tmp) / 'ticks.db')
+            conn.execute('CREATE TABLE ticks (market_id TEXT, ts INTEGER, price REAL, volume REAL)')
+            conn.execute('CREATE INDEX idx_ticks_market_ts ON ticks(market_id, ts)')
+            started = time.perf_counter()
+            conn.executemany('INSERT INTO ticks VALUES (?, ?, ?, ?)',
+                             zip([MARKET] * args.ticks, ts.tolist(), price.tolist(), volume.tolist()))
+            conn.commit()
+            results['sqlite_insert_ticks_per_s'] = args.ticks / (time.perf_counter() - started)
+
+        for label, seconds in WINDOWS.items():
+            end = int(ts[-1])
+            start = int(ts[0]) if seconds is None else end - seconds * 1000
+
+            def from_store():
+                _, p, v = store.read(MARKET, start / 1000, end / 1000)
+                return len(p), _vwap(p, v)
+
+            store_ms, (rows, vwap) = _best(from_store, args.repeat)
+            entry = {'rows': rows, 'store_ms': store_ms, 'vwap': vwap}
+
+            if conn is not None:
+                def from_sqlite():
+                    cursor = conn.execute(
+                        'SELECT ts, price, volume FROM ticks WHERE market_id = ? AND ts BETWEEN ? AND ?',
+                        (MARKET, start, end))
+                    data = np.fromiter(cursor, dtype=[('ts', 'i8'), ('price', 'f8'), ('volume', 'f8')])
+                    return len(data), _vwap(data['price'], data['volume'])
+
+                sqlite_ms, (sqlite_rows, _) = _best(from_sqlite, min(args.repeat, 2))
+                entry.update(sqlite_ms=sqlite_ms, speedup=sqlite_ms / store_ms if store_ms else None)
+                assert sqlite_rows == rows
+
+            results['windows'][label] = entry
+            print(f'{label:>5}: {rows:>9,} ticks  store {store_ms:8.2f} ms'
+                  + (f'  sqlite {entry["sqlite_ms"]:9.1f} ms  ({entry["speedup"]:.0f}x)'
+                     if conn is not None else ''), file=sys.stderr)
+
+        # Barras OHLCV: construção inicial, update com um lote novo e leitura
+        bar_store = ohlc.BarStore(store)
+        started = time.perf_counter()
+        bar_store.update(MARKET)
+        results['ohlc_build_ms'] = (time.perf_counter() - started) * 1000
+        extra = int(ts[-1]) + np.cumsum(rng.integers(1000, 11000, args.batch))
+        store.append(MARKET, extra, rng.uniform(0.01, 0.99, args.batch), rng.exponential(50, args.batch))
+        started = time.perf_counter()
+        bar_store.update(MARKET)
+        results['ohlc_update_ms'] = (time.perf_counter() - started) * 1000
+        print(f'ohlc: construção {results["ohlc_build_ms"]:.0f} ms, update de {args.batch} ticks '
+              f'{results["ohlc_update_ms"]:.2f} ms', file=sys.stderr)
+
+        end = int(extra[-1])
+        for label, seconds in WINDOWS.items():
+            start = int(ts[0]) if seconds is None else end - seconds * 1000
+            resolution = ohlc.pick_resolution(start, end, 200)
+            bars_ms, bars = _best(lambda: bar_store.bars(MARKET, resolution, start, end), args.repeat)
+            results['windows'][label].update(bars_ms=bars_ms, resolution=resolution, bars=len(bars['ts']))
+            print(f'{label:>5}: {len(bars["ts"]):>5} barras de {resolution:<3} {bars_ms:6.2f} ms', file=sys.stderr)
+
+        if conn is not None:
+            conn.close()
+        bar_store.close()
+        store.close()
+
+    output = json.dumps(results, indent=2, ensure_ascii=False)
+    if args.out == '-':
+        print(output)
+    else:
+        Path(args.out).write_text(output + '\n', encoding='utf-8')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Nomes de backtest: nunca saem de BACKTEST_DIR"""
+import pytest
+
+from trading import backtest, db
+
+
+@pytest.fixture(autouse=True)
+def backtest_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(backtest, 'BACKTEST_DIR', tmp_path / 'backtests')
+    return tmp_path / 'backtests'
+
+
+def test_run_path_inside_backtest_dir(backtest_dir):
+    assert backtest.run_path('2025-01_v1.2') == (backtest_dir / '2025-01_v1.2.db').resolve()
+
+
+@pytest.mark.parametrize('name', ['', '.', '..', '../trades', 'a/b', '/etc/x', 'x\n', 'a b'])
+def test_run_path_rejects_unsafe_names(name):
+    with pytest.raises(ValueError):
+        backtest.run_path(name)
+
+
+def test_run_rejects_before_touching_files(tmp_path):
+    victim = tmp_path / 'trades.db'
+    victim.write_bytes(b'x')
+    with pytest.raises(ValueError):
+        backtest.run('../trades', markets=[], ticks_dir=tmp_path / 'ticks')
+    assert victim.exists()
+
+
+def test_symlink_out_of_dir_is_rejected(backtest_dir, tmp_path):
+    backtest_dir.mkdir()
+    (backtest_dir / 'evil.db').symlink_to(tmp_path / 'elsewhere.db')
+    with pytest.raises(ValueError):
+        backtest.run_path('evil')
+
+
+def _trades_db(path, n):
+    conn = db.connect(path)
+    db.init_schema(conn)
+    with conn:
+        conn.executemany('INSERT INTO trades (id, market_id, strategy, status) VALUES (?, ?, ?, ?)',
+                         [(f't{i}', 'm', 'Momentum', db.STATUS_OPEN) for i in range(n)])
+    return conn
+
+
+def test_swap_replaces_a_db_that_is_open(backtest_dir):
+    backtest_dir.mkdir()
+    path = backtest.run_path('again')
+    reader = _trades_db(path, 1)
+    _trades_db(backtest_dir / 'new.db', 2).close()
+    backtest.swap(backtest_dir / 'new.db', path)
+
+    # Quem já tinha a antiga aberta continua a lê-la; as ligações novas veem a nova
+    assert reader.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == 1
+    reader.close()
+    conn = db.connect(path)
+    assert conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == 2
+    assert conn.execute('PRAGMA integrity_check').fetchone()[0] == 'ok'
+    conn.close()
+
+
+def test_rerun_leaves_no_temporary_files(backtest_dir, tmp_path):
+    for _ in range(2):
+        backtest.run('again', markets=[], ticks_dir=tmp_path / 'ticks', workers=1)
+    assert sorted(p.name for p in backtest_dir.iterdir()) == ['again.db', 'again.json']
@@ -0,0 +1,30 @@
+"""Exportação do histórico: limite de linhas e CLI em streaming"""
+import csv
+
+from trading import db, history, journal
+
+
+def make_db(path, n):
+    conn = db.connect(path)
+    db.init_schema(conn)
+    journal.write_batch(conn, [('open', (f't{i:04d}', 'm1', 'Momentum', 'LONG', 0.5, 10.0, 20.0,
+                                         f'2025-01-01 00:{i // 60 % 60:02d}:{i % 60:02d}'))
+                               for i in range(n)])
+    return conn
+
+
+def test_iter_csv_limit(tmp_path):
+    conn = make_db(tmp_path / 'trades.db', 120)
+    rows = list(csv.reader(''.join(history.iter_csv(conn, chunk_size=50, limit=75)).splitlines()))
+    assert rows[0] == list(history.COLUMNS)
+    assert len(rows) == 1 + 75
+    assert sum(1 for _ in history.iter_rows(conn, chunk_size=50)) == 120
+    conn.close()
+
+
+def test_export_cli_writes_everything(tmp_path):
+    make_db(tmp_path / 'trades.db', 120).close()
+    out = tmp_path / 'trades.csv'
+    assert history.main(['export', '--db', str(tmp_path / 'trades.db'), '--out', str(out)]) == 0
+    with open(out, newline='') as f:
+        assert len(list(csv.reader(f))) == 1 + 120
@@ -0,0 +1,75 @@
+"""Journal: falhas transitórias repetem o lote, as outras param o journal"""
+import sqlite3
+
+import pytest
+
+from trading import journal
+
+
+def record(trades, i):
+    trades.record_open(f't{i}', 'm1', 'Momentum', 'LONG', 0.5, 10.0, 20.0, f'2025-01-01 00:00:{i:02d}')
+
+
+def count(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+
+
+@pytest.fixture
+def trades(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, 'RETRY_DELAY', 0.0)
+    trades = journal.TradeJournal(tmp_path / 'trades.db', name='test', background=False)
+    # Sem esperar pelo lock: a falha chega logo
+    trades.conn.execute('PRAGMA busy_timeout = 0')
+    yield trades
+    trades.close()
+
+
+def test_locked_db_keeps_batch_and_retries(trades, tmp_path):
+    for i in range(3):
+        record(trades, i)
+    locker = sqlite3.connect(tmp_path / 'trades.db', isolation_level=None)
+    locker.execute('BEGIN EXCLUSIVE')
+    assert trades.flush() == 0
+    assert trades.retries == 1 and journal.is_transient(trades.last_error)
+    assert trades.flushing_path.exists()
+    record(trades, 3)  # continua a aceitar registos
+    locker.execute('ROLLBACK')
+    locker.close()
+
+    assert trades.flush() == 3  # primeiro o lote que falhou
+    assert trades.flush() == 1
+    assert not trades.flushing_path.exists()
+    assert count(tmp_path / 'trades.db') == 4
+
+
+def test_close_leaves_unwritten_records_in_spool(tmp_path, monkeypatch):
+    monkeypatch.setattr(journal, 'CLOSE_TIMEOUT', 0.0)
+    monkeypatch.setattr(journal, 'RETRY_DELAY', 0.01)
+    trades = journal.TradeJournal(tmp_path / 'trades.db', name='test', background=False)
+    trades.conn.execute('PRAGMA busy_timeout = 0')
+    record(trades, 0)
+    locker = sqlite3.connect(tmp_path / 'trades.db', isolation_level=None)
+    locker.execute('BEGIN EXCLUSIVE')
+    trades.close()
+    locker.execute('ROLLBACK')
+    locker.close()
+    assert trades.flushing_path.exists()
+
+    # O journal seguinte repõe o lote
+    again = journal.TradeJournal(tmp_path / 'trades.db', name='test', background=False)
+    assert again.recovered == 1
+    again.close()
+    assert count(tmp_path / 'trades.db') == 1
+
+
+def test_other_errors_stop_the_journal(trades, monkeypatch):
+    def broken(conn, records):
+        raise sqlite3.IntegrityError('NOT NULL constraint failed')
+
+    monkeypatch.setattr(journal, 'write_batch', broken)
+    record(trades, 0)
+    with pytest.raises(sqlite3.IntegrityError):
+        trades.flush()
+    with pytest.raises(RuntimeError):
+        record(trades, 1)
@@ -0,0 +1,34 @@
+"""Mark-to-market: datas de entrada da DB lidas como UTC"""
+import time
+
+import numpy as np
+
+from trading import mtm
+
+
+def position(entry_time):
+    return {'id': 't1', 'market_id': 'm1', 'strategy': 'Momentum', 'direction': 'LONG',
+            'entry_price': 0.5, 'size_usd': 10.0, 'quantity': 20.0, 'entry_time': entry_time,
+            'pnl_pct': 0.0}
+
+
+def test_entry_time_is_utc(monkeypatch):
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    try:
+        book = mtm.PositionBook([position('2025-01-01 00:00:00'), position(None)])
+    finally:
+        monkeypatch.delenv('TZ')
+        time.tzset()
+    assert book.entry_ts[0] == 1735689600
+    assert np.isnan(book.entry_ts[1])
+
+
+def test_null_market_and_strategy_are_labelled():
+    rows = [position(None), dict(position(None), id='t2', market_id=None, strategy=None)]
+    book = mtm.PositionBook(rows)
+    assert book.markets == ['m1', mtm.MISSING]
+    assert book.strategies == ['Momentum', mtm.MISSING]
+    marks = mtm.mark(book, [0.6, np.nan])
+    np.testing.assert_allclose(marks['unrealized'], [2.0, 0.0])
+    np.testing.assert_allclose(marks['strategy_positions'], [1, 1])
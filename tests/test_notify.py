@@ -0,0 +1,14 @@
+"""Notifier construído a partir de uma configuração dos canais"""
+from trading import notify, settings
+
+
+def test_from_config_uses_the_given_channels(monkeypatch):
+    monkeypatch.delenv('TRADING_DISCORD_WEBHOOK', raising=False)
+    config = dict(settings.DEFAULT_NOTIFICATIONS, discord=True, email=False,
+                  discord_webhook='https://discord.invalid/api/webhooks/1/x')
+    notifier = notify.from_config(config)
+    assert notifier.channels == ['discord']
+    notifier.close(0.1)
+    assert not any(dispatcher._thread.is_alive() for dispatcher in notifier.dispatchers)
+
+    assert notify.from_config(dict(config, discord=False)).channels == []
@@ -0,0 +1,37 @@
+"""Retenção: sem VACUUM completo fora da CLI e janela em UTC"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from trading import db, retention, rollups
+
+
+def test_compact_without_vacuum_never_rewrites_the_db(tmp_path):
+    conn = db.connect(tmp_path / 'trades.db')
+    db.init_schema(conn)
+    result = retention.compact(conn)
+    assert not result['vacuum'] and not result['incremental']
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 0
+
+    result = retention.compact(conn, vacuum=True)
+    assert result['vacuum'] and result['incremental']
+    assert not retention.compact(conn)['vacuum']
+    conn.close()
+
+
+def test_cutoff_and_today_are_utc(monkeypatch, tmp_path):
+    monkeypatch.setenv('TZ', 'Pacific/Kiritimati')  # UTC+14
+    time.tzset()
+    try:
+        utc_now = datetime.now(timezone.utc).replace(tzinfo=None)
+        cutoff = datetime.fromisoformat(retention._cutoff(1))
+        conn = db.connect(tmp_path / 'trades.db')
+        db.init_schema(conn)
+        today = utc_now.strftime('%Y-%m-%d')
+        conn.execute("INSERT INTO daily_metrics (date, num_trades) VALUES (?, 7)", (today,))
+        row = rollups.read_day(conn)
+        conn.close()
+    finally:
+        monkeypatch.delenv('TZ')
+        time.tzset()
+    assert abs(cutoff - (utc_now - timedelta(days=1))) < timedelta(minutes=1)
+    assert row is not None and row['num_trades'] == 7
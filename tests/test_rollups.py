@@ -0,0 +1,129 @@
+"""Rollups incrementais contra o recálculo completo, com fechos fora de ordem"""
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from trading import analytics, db, journal, retention, rollups
+
+BANKROLL = 1000.0
+START = datetime(2025, 1, 1)
+STRATEGIES = ['Contrarian', 'MeanReversion', 'Momentum']
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = db.connect(tmp_path / 'trades.db')
+    db.init_schema(conn)
+    yield conn
+    conn.close()
+
+
+def _timestamp(minutes):
+    return (START + timedelta(minutes=minutes)).isoformat(sep=' ')
+
+
+def open_trade(conn, rng, trade_id, minutes):
+    journal.write_batch(conn, [('open', (trade_id, f'market-{trade_id}', rng.choice(STRATEGIES), 'LONG',
+                                         0.5, 10.0, 20.0, _timestamp(minutes)))])
+
+
+def close_trade(conn, rng, trade_id, minutes):
+    pnl = round(rng.uniform(-5, 6), 2)
+    journal.write_batch(conn, [('close', (0.55, _timestamp(minutes), pnl, pnl * 10, 'TAKE_PROFIT', trade_id))])
+
+
+def random_history(conn, rng, n, refresh_every):
+    """n trades abertos e fechados em ordem aleatória (exit_time fora da ordem de fecho)"""
+    opened = []
+    for i in range(n):
+        trade_id = f't{i:05d}'
+        entry = rng.randrange(0, 60 * 24 * 90)
+        open_trade(conn, rng, trade_id, entry)
+        opened.append((trade_id, entry))
+    rng.shuffle(opened)
+    for i, (trade_id, entry) in enumerate(opened):
+        close_trade(conn, rng, trade_id, entry + rng.randrange(1, 60 * 24 * 3))
+        if i % refresh_every == 0:
+            rollups.refresh(conn, BANKROLL)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_refresh_matches_full_recompute_with_late_closes(conn, seed):
+    rng = random.Random(seed)
+    random_history(conn, rng, 300, refresh_every=rng.choice([1, 7, 40]))
+    rollups.refresh(conn, BANKROLL)
+    assert rollups.verify(conn, BANKROLL) == []
+
+
+def test_late_close_is_folded(conn):
+    rng = random.Random(0)
+    for i, minutes in enumerate([100, 3000, 6000]):
+        open_trade(conn, rng, f'a{i}', minutes)
+        close_trade(conn, rng, f'a{i}', minutes + 10)
+    assert rollups.refresh(conn, BANKROLL) == 3
+    seq = rollups.sequence(conn)
+
+    # Fecha depois, com exit_time anterior ao watermark
+    open_trade(conn, rng, 'late', 50)
+    close_trade(conn, rng, 'late', 60)
+    assert rollups.sequence(conn) == seq
+    assert rollups.refresh(conn, BANKROLL) == 1
+    assert rollups.sequence(conn) > seq
+    assert sum(row['num_trades'] for row in rollups.read_strategies(conn).values()) == 4
+    assert rollups.verify(conn, BANKROLL) == []
+    assert rollups.refresh(conn, BANKROLL) == 0
+
+
+def test_late_close_after_archive(conn):
+    rng = random.Random(5)
+    random_history(conn, rng, 200, refresh_every=25)
+    rollups.refresh(conn, BANKROLL)
+    retention.archive_trades(conn, hot_days=30, now=START + timedelta(days=90))
+    assert conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0] < 200
+
+    # Trade fechado num mês já arquivado: fica na DB quente até ser incorporado
+    open_trade(conn, rng, 'late', 10)
+    close_trade(conn, rng, 'late', 20)
+    assert retention.archive_trades(conn, hot_days=30, now=START + timedelta(days=90)) == 0
+    rollups.refresh(conn, BANKROLL)
+    assert rollups.verify(conn, BANKROLL) == []
+
+    rollups.rebuild(conn, BANKROLL)
+    assert rollups.verify(conn, BANKROLL) == []
+
+
+def test_rebuild_keeps_archived_history(conn):
+    rng = random.Random(9)
+    random_history(conn, rng, 200, refresh_every=50)
+    rollups.refresh(conn, BANKROLL)
+    before = rollups.read_strategies(conn)
+    assert retention.archive_trades(conn, hot_days=30, now=START + timedelta(days=90)) > 0
+
+    rollups.rebuild(conn, BANKROLL)
+    after = rollups.read_strategies(conn)
+    assert {name: row['num_trades'] for name, row in after.items()} == \
+        {name: row['num_trades'] for name, row in before.items()}
+    assert rollups.verify(conn, BANKROLL) == []
+
+
+def test_equity_curve_orders_late_closes_after_archive(conn):
+    rng = random.Random(11)
+    random_history(conn, rng, 200, refresh_every=25)
+    rollups.refresh(conn, BANKROLL)
+    retention.archive_trades(conn, hot_days=30, now=START + timedelta(days=90))
+    open_trade(conn, rng, 'late', 10)
+    close_trade(conn, rng, 'late', 20)
+    rollups.refresh(conn, BANKROLL)
+
+    ts, equity = rollups.equity_curve(conn, BANKROLL)
+    assert len(ts) == 201
+    assert np.all(np.diff(ts) >= 0)
+    total = sum(row['pnl_sum'] for row in rollups.read_strategies(conn).values())
+    assert equity[-1] == pytest.approx(BANKROLL + total)
+
+    trades = analytics.load_closed_trades(conn)
+    bounds = [*trades['offsets'], len(trades['exit_ts'])]
+    for lo, hi in zip(bounds, bounds[1:]):
+        assert np.all(np.diff(trades['exit_ts'][lo:hi]) >= 0)
@@ -0,0 +1,23 @@
+"""Supervisor: as barras OHLCV acompanham os ticks sem leituras do dashboard"""
+import numpy as np
+
+from trading import ohlc, supervisor, ticks
+
+
+def test_update_bars_follows_ticks(tmp_path):
+    store = ticks.TickStore(tmp_path / 'ticks')
+    sup = supervisor.Supervisor(tmp_path / 'supervisor.status', ticks_dir=tmp_path / 'ticks')
+    minute = ohlc.RESOLUTIONS['1m']
+    for market in ('a', 'b'):
+        store.append(market, np.arange(0, 10 * minute, 1000), np.linspace(0.4, 0.6, 600))
+    sup._update_bars()
+    # Só as barras completas ficam escritas (a última minuto ainda está em curso)
+    files = ohlc.BarStore(store)._bars('a', '1m')
+    assert files.count() == 9
+
+    store.append('a', np.arange(10 * minute, 20 * minute, 1000), np.full(600, 0.5))
+    sup._schedule_bars(0.0)
+    sup.bars.join()
+    assert files.count() == 19
+    assert ohlc.BarStore(store)._bars('b', '1m').count() == 9
+    store.close()
@@ -0,0 +1,48 @@
+"""Armazém de ticks: descritores limitados e escritas concorrentes entre processos"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from trading import ticks
+
+
+def open_fds():
+    return len(os.listdir('/proc/self/fd'))
+
+
+def test_reads_keep_a_bounded_number_of_descriptors(tmp_path):
+    store = ticks.TickStore(tmp_path)
+    markets = [f'market-{i}' for i in range(50)]
+    for i, market in enumerate(markets):
+        store.append(market, np.arange(100) * 1000, np.full(100, i / 100))
+    before = open_fds()
+    for market in markets:
+        store.read(market)
+        store.time_range(market)
+    assert open_fds() - before <= ticks.MAX_OPEN_MAPS
+    np.testing.assert_allclose(store.last_prices(markets), np.arange(50) / 100)
+    assert store.last(markets[-1]) == (99000, 0.49)
+    store.close()
+
+
+def _append_many(root, market, worker, batches):
+    store = ticks.TickStore(root)
+    for k in range(batches):
+        # Todos com o mesmo ts: a ordem entre os dois processos não importa
+        store.append(market, [0] * 10, [worker] * 10)
+    store.close()
+
+
+def test_concurrent_appends_from_processes(tmp_path):
+    with ProcessPoolExecutor(2, mp_context=get_context('spawn')) as pool:
+        jobs = [pool.submit(_append_many, tmp_path, 'shared', worker, 300) for worker in (1, 2)]
+        for job in jobs:
+            job.result()
+    store = ticks.TickStore(tmp_path)
+    ts, price, _ = store.columns('shared')
+    assert len(ts) == 2 * 300 * 10
+    assert np.count_nonzero(price == 1) == np.count_nonzero(price == 2) == 300 * 10
+    blocks = store._market('shared')[1].column('blocks')
+    np.testing.assert_array_equal(blocks, ts[::ticks.BLOCK_SIZE])
@@ -0,0 +1 @@
+"""Camada de dados e motores de cálculo partilhados pelo dashboard e pelos bots."""
@@ -0,0 +1,165 @@
+"""Métricas por estratégia calculadas de forma vetorizada com NumPy.
+
+Os trades fechados são carregados uma vez como arrays colunares, ordenados
+por estratégia e exit_time; cada métrica é depois uma passagem agrupada
+(``np.add.reduceat`` e afins) sobre esses arrays, sem ciclos em Python por
+trade.
+"""
+import numpy as np
+
+from trading import archive, db
+
+TRADE_DTYPE = np.dtype([
+    ('pnl', 'f8'),
+    ('pnl_pct', 'f8'),
+    ('size_usd', 'f8'),
+    ('exit_ts', 'i8'),
+])
+
+
+def load_closed_trades(conn):
+    """Carrega os trades fechados como arrays agrupados por estratégia.
+
+    Retorna um dict com ``strategies`` (nomes), ``offsets`` (início de cada
+    grupo), ``codes`` (índice da estratégia por trade) e as colunas
+    ``pnl``, ``pnl_pct``, ``size_usd`` e ``exit_ts`` (epoch em segundos).
+    Inclui os trades arquivados (ver ``trading.archive``).
+    """
+    parts = {}
+    # Arquivos por mês e depois a DB quente, cada parte por exit_time
+    for table, clauses, params, _ in archive.trade_tables(conn):
+        where = ' AND '.join(['exit_time IS NOT NULL', *clauses])
+        names = [row[0] for row in conn.execute(f'SELECT DISTINCT strategy FROM {table} WHERE {where}', params)]
+        for name in names:
+            # Tuplos simples (sem sqlite3.Row) para o np.fromiter
+            cursor = conn.cursor()
+            cursor.row_factory = None
+            # Uma query por estratégia percorre idx_trades_strategy_exit já ordenado
+            cursor.execute(f'''
+                SELECT COALESCE(pnl, 0), COALESCE(pnl_pct, 0), COALESCE(size_usd, 0),
+                       CAST(strftime('%s', exit_time) AS INTEGER)
+                FROM {table}
+                WHERE strategy IS ? AND {where} AND status = ?
+                ORDER BY exit_time
+            ''', (name, *params, db.STATUS_CLOSED))
+            parts.setdefault(name, []).append(np.fromiter(cursor, dtype=TRADE_DTYPE))
+
+    # Mesma ordem que ORDER BY strategy (NULL primeiro)
+    names = sorted(parts, key=lambda name: (name is not None, name or ''))
+    chunks = [np.concatenate(parts[name]) for name in names]
+    # Os trades fechados tarde ficam na DB quente com exit_time de meses já arquivados
+    chunks = [chunk[np.argsort(chunk['exit_ts'], kind='stable')] for chunk in chunks]
+
+    counts = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+    keep = counts > 0
+    names = [name for name, k in zip(names, keep) if k]
+    counts = counts[keep]
+    data = np.concatenate(chunks) if chunks else np.empty(0, dtype=TRADE_DTYPE)
+
+    return {
+        'strategies': names,
+        'offsets': np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) if len(counts) else counts,
+        'codes': np.repeat(np.arange(len(counts)), counts),
+        'pnl': np.ascontiguousarray(data['pnl']),
+        'pnl_pct': np.ascontiguousarray(data['pnl_pct']),
+        'size_usd': np.ascontiguousarray(data['size_usd']),
+        'exit_ts': np.ascontiguousarray(data['exit_ts']),
+    }
+
+
+def _safe_div(num, den, fill=0.0):
+    out = np.full(np.broadcast(num, den).shape, fill, dtype=np.float64)
+    np.divide(num, den, out=out, where=den != 0)
+    return out
+
+
+def max_drawdown(pnl, codes, offsets, base):
+    """Drawdown máximo (%) da equity acumulada de cada grupo.
+
+    A equity de cada grupo parte de ``base``; o pico corrente é calculado
+    com um único ``np.maximum.accumulate`` somando a cada grupo um
+    deslocamento maior que a amplitude total, para que o máximo não passe
+    de um grupo para o seguinte.
+    """
+    if len(pnl) == 0:
+        return np.zeros(len(offsets))
+    cumulative = np.cumsum(pnl)
+    group_start = (cumulative[offsets] - pnl[offsets])[codes]
+    equity = base + cumulative - group_start
+
+    span = equity.max() - min(equity.min(), base) + 1.0
+    shift = codes * span
+    peak = np.maximum.accumulate(equity + shift) - shift
+    peak = np.maximum(peak, base)
+    drawdown = _safe_div(peak - equity, peak) * 100
+    return np.maximum.reduceat(drawdown, offsets)
+
+
+def strategy_metrics(trades, base=1000.0):
+    """Métricas por estratégia em passagens vetorizadas.
+
+    Retorna um dict de arrays (uma posição por estratégia) pronto para
+    ``pd.DataFrame``.
+    """
+    pnl = trades['pnl']
+    codes = trades['codes']
+    offsets = trades['offsets']
+    n_groups = len(offsets)
+    if n_groups == 0:
+        empty = np.zeros(0)
+        return {'strategy': [], 'trades': empty.astype(np.int64), 'win_rate': empty,
+                'avg_pnl': empty, 'median_pnl': empty, 'total_pnl': empty,
+                'sharpe': empty, 'sortino': empty, 'max_drawdown': empty,
+                'profit_factor': empty, 'expectancy': empty}
+
+    counts = np.diff(np.append(offsets, len(pnl)))
+    wins_mask = pnl > 0
+    losses_mask = pnl < 0
+
+    wins = np.bincount(codes, weights=wins_mask, minlength=n_groups)
+    losses = np.bincount(codes, weights=losses_mask, minlength=n_groups)
+    total = np.bincount(codes, weights=pnl, minlength=n_groups)
+    gross_profit = np.bincount(codes, weights=np.where(wins_mask, pnl, 0.0), minlength=n_groups)
+    gross_loss = -np.bincount(codes, weights=np.where(losses_mask, pnl, 0.0), minlength=n_groups)
+    mean = total / counts
+
+    # Desvio padrão amostral em duas passagens (estável numericamente)
+    deviation = pnl - mean[codes]
+    variance = _safe_div(np.bincount(codes, weights=deviation * deviation, minlength=n_groups),
+                         counts - 1)
+    std = np.sqrt(variance)
+    downside = np.sqrt(np.bincount(codes, weights=np.minimum(pnl, 0.0) ** 2, minlength=n_groups) / counts)
+
+    # Mediana: ordenar por (estratégia, pnl) e ler os elementos centrais
+    sorted_pnl = pnl[np.lexsort((pnl, codes))]
+    median = (sorted_pnl[offsets + (counts - 1) // 2] + sorted_pnl[offsets + counts // 2]) / 2
+
+    profit_factor = _safe_div(gross_profit, gross_loss, fill=np.inf)
+    profit_factor[(gross_profit == 0) & (gross_loss == 0)] = 0.0
+
+    win_rate = wins / counts
+    loss_rate = losses / counts
+    avg_win = _safe_div(gross_profit, wins)
+    avg_loss = _safe_div(gross_loss, losses)
+
+    return {
+        'strategy': list(trades['strategies']),
+        'trades': counts,
+        'win_rate': win_rate * 100,
+        'avg_pnl': mean,
+        'median_pnl': median,
+        'total_pnl': total,
+        'sharpe': _safe_div(mean, std),
+        'sortino': _safe_div(mean, downside),
+        'max_drawdown': max_drawdown(pnl, codes, offsets, base),
+        'profit_factor': profit_factor,
+        'expectancy': win_rate * avg_win - loss_rate * avg_loss,
+    }
+
+
+def describe_returns(returns):
+    """Média, melhor e pior retorno (%) de um array"""
+    returns = np.asarray(returns, dtype=np.float64)
+    if returns.size == 0:
+        return {'mean': 0.0, 'best': 0.0, 'worst': 0.0}
+    return {'mean': float(returns.mean()), 'best': float(returns.max()), 'worst': float(returns.min())}
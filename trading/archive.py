@@ -0,0 +1,151 @@
+"""Arquivo mensal dos trades antigos e leitura transparente (DB quente + arquivos).
+
+Os trades fechados há mais de alguns dias saem da DB quente para um
+ficheiro por mês de ``exit_time`` (``<db>-archive/YYYY-MM.db``, com o mesmo
+schema), escritos por ``trading.retention``. As leituras que precisam do
+histórico completo (métricas, curva de equity, páginas do histórico)
+percorrem as tabelas devolvidas por ``trade_tables``: os arquivos
+anexados em só leitura à própria ligação, por ordem de mês, e a seguir a
+tabela da DB quente. Os arquivos são anexados só quando uma leitura
+precisa deles e os mais antigos são desanexados a partir de
+``MAX_ATTACHED``.
+
+A marca de arquivo (``rollup_state``, nome ``archived``) é o exit_time a
+partir do qual os trades ainda estão na DB quente: cada lote acaba numa
+mudança de exit_time e só conta nos arquivos depois de apagado da DB
+quente, na transação que avança a marca. As linhas de um arquivo só são
+lidas abaixo da marca (``exit_time < ?``, coberto pelos índices), por isso
+um arquivo escrito sem a remoção correspondente (o processo morreu entre
+os dois commits) não duplica trades. Uma leitura feita com ``consistent``
+repete-se se a marca mudar entretanto.
+"""
+import os
+import re
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+MARK_NAME = 'archived'
+MAX_ATTACHED = 8  # o SQLite aceita 10 bases anexadas por omissão
+
+_MONTH = re.compile(r'^\d{4}-\d{2}$')
+_months = {}  # pasta -> (mtime_ns, meses)
+
+
+def archive_dir(db_path):
+    """Pasta dos arquivos de uma DB (``trading_bot.db`` -> ``trading_bot-archive``)"""
+    db_path = Path(db_path)
+    return db_path.with_name(f'{db_path.stem}-archive')
+
+
+def archive_path(directory, month):
+    return Path(directory) / f'{month}.db'
+
+
+def list_months(directory):
+    """Meses ('YYYY-MM') com arquivo, por ordem (a listagem só é refeita se a pasta mudar)"""
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    cached = _months.get(directory)
+    if cached is None or cached[0] != mtime:
+        months = sorted(path.stem for path in Path(directory).glob('*.db') if _MONTH.match(path.stem))
+        cached = _months[directory] = (mtime, months)
+    return list(cached[1])
+
+
+def month_of(timestamp):
+    """Mês ('YYYY-MM') de um TIMESTAMP da DB"""
+    return str(timestamp)[:7]
+
+
+def month_end(month):
+    """Início do mês seguinte, no formato dos TIMESTAMP da DB"""
+    year, number = int(month[:4]), int(month[5:7])
+    year, number = (year + 1, 1) if number == 12 else (year, number + 1)
+    return datetime(year, number, 1).isoformat(sep=' ')
+
+
+def main_path(conn):
+    """Ficheiro da DB principal de uma ligação (None para DBs em memória)"""
+    for _, name, path in conn.execute('PRAGMA database_list'):
+        if name == 'main':
+            return Path(path) if path else None
+    return None
+
+
+def mark(conn):
+    """exit_time a partir do qual nada está arquivado ('' se ainda não houve arquivo)"""
+    row = conn.execute('SELECT exit_time FROM rollup_state WHERE name = ?', (MARK_NAME,)).fetchone()
+    return row[0] if row else ''
+
+
+def attach(conn, directory, month):
+    """Anexa o arquivo de um mês em só leitura (se ainda não estiver); retorna o schema"""
+    schema = f'archive_{month.replace("-", "_")}'
+    attached = [name for _, name, _ in conn.execute('PRAGMA database_list') if name.startswith('archive_')]
+    if schema in attached:
+        return schema
+    # PRAGMA database_list vem pela ordem de anexação: sai o mais antigo
+    for name in attached[:max(len(attached) - MAX_ATTACHED + 1, 0)]:
+        conn.execute(f'DETACH DATABASE {name}')
+    uri = f'{archive_path(directory, month).resolve().as_uri()}?mode=ro'
+    conn.execute('ATTACH DATABASE ? AS ' + schema, (uri,))
+    # cache_size e mmap_size são por base: o arquivo usa os mesmos da principal
+    for pragma in ('cache_size', 'mmap_size'):
+        value = conn.execute(f'PRAGMA main.{pragma}').fetchone()[0]
+        conn.execute(f'PRAGMA {schema}.{pragma}={int(value)}')
+    return schema
+
+
+def open_month(directory, month):
+    """Ligação própria, só de leitura, ao arquivo de um mês.
+
+    Para ler arquivos dentro de uma transação de escrita da DB principal,
+    onde não se pode desanexar (e portanto rodar os anexos de ``attach``).
+    """
+    conn = sqlite3.connect(f'{archive_path(directory, month).resolve().as_uri()}?mode=ro', uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def trade_tables(conn, start=None, end=None, newest_first=False):
+    """Tabelas com trades entre ``start`` e ``end`` (exit_time), do mês mais antigo à DB quente.
+
+    Gera tuplos (tabela, cláusulas, parâmetros, mês): cada arquivo vem
+    anexado e com a cláusula que o limita à marca; a DB quente vem no fim
+    (mês None) sem cláusulas. Com ``newest_first`` a ordem é a inversa.
+
+    A DB quente pode ter trades abaixo da marca (fechados depois do arquivo,
+    ver ``rollups.pending_since``), por isso quem precisa da ordem global de
+    exit_time tem de reordenar o resultado. Os arquivos são anexados à
+    medida que o gerador avança, por isso cada consulta deve ser lida até
+    ao fim antes de pedir a tabela seguinte.
+    """
+    path = main_path(conn)
+    months = list_months(archive_dir(path)) if path else []
+    if start:
+        months = [m for m in months if month_end(m) > str(start)]
+    if end:
+        months = [m for m in months if m <= month_of(end)]
+    archived = mark(conn) if months else None
+    tables = [(month, False) for month in months] + [(None, True)]
+    if newest_first:
+        tables.reverse()
+    for month, hot in tables:
+        if hot:
+            yield 'main.trades', [], [], None
+        else:
+            schema = attach(conn, archive_dir(path), month)
+            yield f'{schema}.trades', ['exit_time < ?'], [archived], month
+
+
+def consistent(conn, read, attempts=5):
+    """Corre ``read()`` até a marca de arquivo não mudar durante a leitura"""
+    for _ in range(attempts):
+        before = mark(conn)
+        result = read()
+        if mark(conn) == before:
+            return result
+    return result
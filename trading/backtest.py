@@ -0,0 +1,404 @@
+"""Backtest vetorizado das estratégias sobre o histórico de preços.
+
+Cada estratégia é uma função vetorizada que transforma a série de preços
+de um mercado num sinal (+1 LONG, -1 SHORT, 0 fora). As entradas são os
+inícios de sinal e a saída de cada entrada (stop-loss, take-profit ou
+time-stop, com os limites de ``settings``) é procurada para todas as
+entradas de uma vez, em janelas 2D de preços futuros que crescem até cada
+entrada ficar resolvida. Só a escolha das entradas que não se sobrepõem
+(uma posição por estratégia e mercado) percorre os trades em Python, sem
+nunca andar tick a tick.
+
+Os mercados são distribuídos por um pool de processos; cada worker abre
+o armazém de ticks por conta própria (memmaps, nada é serializado). O
+resultado é uma base de dados com o schema ``trades`` em
+``BACKTEST_DIR/<nome>.db``, com os rollups reconstruídos, que o dashboard
+abre no modo Backtest.
+
+Uso::
+
+    python -m trading.backtest run --name teste [--start 2025-01-01] [--workers 4] [MARKET ...]
+    python -m trading.backtest list
+"""
+import argparse
+import functools
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from trading import db, ohlc, rollups, settings, ticks
+
+BACKTEST_DIR = Path(os.environ.get('TRADING_BACKTEST_DIR', db.DB_PATH.parent / 'backtests'))
+RUN_NAME = re.compile(r'[\w.-]+')
+
+# Parâmetros dos sinais; as janelas contam pontos da série (barras ou ticks)
+DEFAULT_PARAMS = settings.DEFAULT_STRATEGY_PARAMS
+
+REASONS = ['stop_loss', 'take_profit', 'time_stop']
+OPEN = -1  # código de saída: posição ainda aberta no fim da série
+
+
+# ---------- sinais ----------
+
+def _returns(price, lookback):
+    """Retorno sobre ``lookback`` pontos (0 antes de haver histórico)"""
+    out = np.zeros(len(price))
+    if lookback < len(price):
+        out[lookback:] = price[lookback:] / price[:-lookback] - 1
+    return out
+
+
+def momentum(price, lookback, threshold):
+    """Segue o movimento: LONG depois de subir mais que ``threshold``"""
+    r = _returns(price, lookback)
+    return np.where(r > threshold, 1, np.where(r < -threshold, -1, 0)).astype(np.int8)
+
+
+def contrarian(price, lookback, threshold):
+    """Aposta na inversão de movimentos grandes"""
+    return -momentum(price, lookback, threshold)
+
+
+def scalping(price, lookback, threshold):
+    """Momentum de muito curto prazo"""
+    return momentum(price, lookback, threshold)
+
+
+def mean_reversion(price, window, z):
+    """Entra contra desvios de mais de ``z`` desvios-padrão da média móvel"""
+    price = np.asarray(price, dtype=np.float64)
+    out = np.zeros(len(price), dtype=np.int8)
+    if window >= len(price):
+        return out
+    c1 = np.concatenate(([0.0], np.cumsum(price)))
+    c2 = np.concatenate(([0.0], np.cumsum(price * price)))
+    mean = (c1[window:] - c1[:-window]) / window
+    var = np.maximum((c2[window:] - c2[:-window]) / window - mean * mean, 0.0)
+    # Janela [t - window + 1, t] alinhada com o ponto t
+    score = np.zeros(len(price))
+    std = np.sqrt(var)
+    np.divide(price[window - 1:] - mean, std, out=score[window - 1:], where=std > 0)
+    out[score > z] = -1
+    out[score < -z] = 1
+    return out
+
+
+SIGNALS = {
+    'Momentum': momentum,
+    'MeanReversion': mean_reversion,
+    'Scalping': scalping,
+    'Contrarian': contrarian,
+}
+
+
+# ---------- entradas e saídas ----------
+
+def entries(signal):
+    """Índices onde o sinal passa a LONG ou SHORT"""
+    signal = np.asarray(signal)
+    previous = np.concatenate(([0], signal[:-1]))
+    return np.flatnonzero((signal != 0) & (signal != previous))
+
+
+def exits(ts, price, index, direction, stop, take, horizon_ms, chunk=64):
+    """Primeira saída de cada entrada, calculada para todas ao mesmo tempo.
+
+    Retorna (índice de saída, código do motivo em ``REASONS``); posições
+    sem saída até ao fim da série ficam com motivo ``OPEN`` e índice da
+    última observação. O preço é avaliado nos pontos seguintes à entrada;
+    no prazo do time-stop um stop ou take-profit do mesmo ponto prevalece.
+    """
+    n = len(price)
+    index = np.asarray(index, dtype=np.int64)
+    entry = price[index]
+    long_side = direction > 0
+    low = entry * np.where(long_side, 1 - stop, 1 - take)
+    high = entry * np.where(long_side, 1 + take, 1 + stop)
+    deadline = np.searchsorted(ts, ts[index] + horizon_ms, 'left')
+    last = np.minimum(deadline, n - 1)
+
+    exit_index = np.full(len(index), n - 1, dtype=np.int64)
+    reason = np.full(len(index), OPEN, dtype=np.int8)
+    timed_out = deadline < n
+    exit_index[timed_out] = deadline[timed_out]
+    reason[timed_out] = REASONS.index('time_stop')
+
+    pending = np.flatnonzero(last > index)
+    offset = 1
+    while len(pending):
+        steps = np.arange(offset, offset + chunk)
+        window = index[pending, None] + steps
+        valid = window <= last[pending, None]
+        values = price[np.minimum(window, n - 1)]
+        below = valid & (values <= low[pending, None])
+        above = valid & (values >= high[pending, None])
+        hit = below | above
+        found = hit.any(axis=1)
+        first = hit.argmax(axis=1)
+
+        done = pending[found]
+        at = first[found]
+        exit_index[done] = index[done] + steps[at]
+        went_down = below[found, at]
+        # Descer até ao nível inferior é stop de LONG e take-profit de SHORT
+        stopped = np.where(long_side[done], went_down, ~went_down)
+        reason[done] = np.where(stopped, REASONS.index('stop_loss'), REASONS.index('take_profit'))
+
+        unresolved = pending[~found]
+        pending = unresolved[index[unresolved] + offset + chunk <= last[unresolved]]
+        offset += chunk
+        chunk *= 2
+    return exit_index, reason
+
+
+def select(index, exit_index):
+    """Entradas que não se sobrepõem: cada uma começa depois da saída anterior"""
+    # Próxima entrada possível depois de cada saída; o percurso é só em ints
+    following = np.searchsorted(index, exit_index, 'right').tolist()
+    chosen = []
+    k = 0
+    while k < len(following):
+        chosen.append(k)
+        k = following[k]
+    return np.array(chosen, dtype=np.int64)
+
+
+def simulate(ts, price, strategy, params=None, limits=None, bankroll=1000.0):
+    """Trades de uma estratégia numa série de preços, como dict de colunas"""
+    limits = {**settings.DEFAULT_RISK_LIMITS, **(limits or {})}
+    params = {**DEFAULT_PARAMS[strategy], **(params or {})}
+    signal = SIGNALS[strategy](price, **params)
+    index = entries(signal)
+    direction = signal[index].astype(np.float64)
+    exit_index, reason = exits(
+        ts, price, index, direction,
+        limits['stop_loss_pct'] / 100, limits['take_profit_pct'] / 100,
+        int(limits['time_stop_days'] * 86400 * 1000))
+    chosen = select(index, exit_index)
+    index, direction = index[chosen], direction[chosen]
+    exit_index, reason = exit_index[chosen], reason[chosen]
+
+    entry_price = price[index]
+    exit_price = price[exit_index]
+    size = np.full(len(index), bankroll * limits['max_position_pct'] / 100)
+    quantity = size / entry_price
+    pnl = direction * (exit_price - entry_price) * quantity
+    return {
+        'entry_ts': ts[index],
+        'exit_ts': ts[exit_index],
+        'direction': direction,
+        'entry_price': entry_price,
+        'exit_price': exit_price,
+        'size_usd': size,
+        'quantity': quantity,
+        'pnl': pnl,
+        'pnl_pct': pnl / size * 100,
+        'reason': reason,
+    }
+
+
+# ---------- execução ----------
+
+def load_series(store, market_id, start=None, end=None, resolution='1m'):
+    """(ts, preço) do mercado: fechos de barra na ``resolution`` ou ticks (None)"""
+    if resolution is None:
+        i, j = store.locate(market_id, start, end)
+        ts, price, _ = store.columns(market_id)
+        return np.array(ts[i:j]), np.array(price[i:j])
+    bar_store = ohlc.BarStore(store)
+    try:
+        bar_store.update(market_id)
+        bars = bar_store.bars(market_id, resolution, start, end)
+    finally:
+        bar_store.close()
+    return np.array(bars['ts']), np.array(bars['close'])
+
+
+def run_market(market_id, ticks_dir, strategies, start, end, resolution, params, limits, bankroll):
+    """Worker: simula todas as estratégias num mercado"""
+    store = ticks.TickStore(ticks_dir)
+    try:
+        ts, price = load_series(store, market_id, start, end, resolution)
+    finally:
+        store.close()
+    if len(ts) < 2:
+        return market_id, {}
+    return market_id, {
+        strategy: simulate(ts, price, strategy, params.get(strategy), limits, bankroll)
+        for strategy in strategies
+    }
+
+
+def _format_ms(values):
+    """Epoch em ms -> 'YYYY-MM-DD HH:MM:SS' (UTC, como na DB dos bots)"""
+    stamps = np.asarray(values, dtype='datetime64[ms]').astype('datetime64[s]')
+    return np.char.replace(stamps.astype(str), 'T', ' ')
+
+
+def trade_rows(market_id, strategy, trades):
+    """Trades simulados como tuplos da tabela ``trades``"""
+    entry_time = _format_ms(trades['entry_ts'])
+    exit_time = _format_ms(trades['exit_ts'])
+    rows = []
+    for k in range(len(trades['pnl'])):
+        closed = trades['reason'][k] != OPEN
+        rows.append((
+            f'bt-{market_id}-{strategy}-{k:06d}',
+            market_id,
+            strategy,
+            'LONG' if trades['direction'][k] > 0 else 'SHORT',
+            float(trades['entry_price'][k]),
+            float(trades['exit_price'][k]) if closed else None,
+            float(trades['size_usd'][k]),
+            float(trades['quantity'][k]),
+            str(entry_time[k]),
+            str(exit_time[k]) if closed else None,
+            db.STATUS_CLOSED if closed else db.STATUS_OPEN,
+            float(trades['pnl'][k]) if closed else None,
+            float(trades['pnl_pct'][k]),
+            REASONS[trades['reason'][k]] if closed else None,
+        ))
+    return rows
+
+
+def run_path(name):
+    """Ficheiro de um backtest; o nome não pode sair de ``BACKTEST_DIR``"""
+    if not RUN_NAME.fullmatch(name or '') or name.strip('.') == '':
+        raise ValueError(f'nome de backtest inválido: {name!r} (só letras, números, "_", "-" e ".")')
+    root = BACKTEST_DIR.resolve()
+    path = (root / f'{name}.db').resolve()
+    if path.parent != root:
+        raise ValueError(f'o backtest {name!r} fica fora de {BACKTEST_DIR}')
+    return path
+
+
+def swap(source, path):
+    """Troca a DB ``path`` por ``source`` (fechada) sem apagar o WAL de quem a lê.
+
+    O WAL da antiga é esvaziado antes da troca, para que nunca seja aplicado
+    à nova; quem a tiver aberta continua a ler a antiga até fechar as
+    ligações (o dashboard fecha-as em ``run_backtest``).
+    """
+    if path.exists():
+        conn = db.connect(path)
+        try:
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            conn.close()
+    os.replace(source, path)
+
+
+def run(name, markets=None, strategies=None, start=None, end=None, resolution='1m',
+        params=None, limits=None, bankroll=1000.0, workers=None, ticks_dir=ticks.TICKS_DIR):
+    """Corre um backtest e grava-o em ``BACKTEST_DIR/<name>.db`` (substitui com ``swap``).
+
+    ``start``/``end`` aceitam o mesmo que ``ticks.to_millis``; ``limits``
+    por omissão são os guardados em ``settings``. Retorna um resumo.
+    """
+    path = run_path(name)
+    started = time.perf_counter()
+    store = ticks.TickStore(ticks_dir)
+    markets = list(markets or store.markets())
+    store.close()
+    strategies = list(strategies or DEFAULT_PARAMS)
+    limits = {**settings.load_risk_limits(), **(limits or {})}
+    params = params or {}
+    start, end = ticks.to_millis(start), ticks.to_millis(end)
+    worker = functools.partial(run_market, ticks_dir=ticks_dir, strategies=strategies, start=start,
+                               end=end, resolution=resolution, params=params, limits=limits,
+                               bankroll=bankroll)
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(markets) > 1:
+        # spawn: o dashboard tem threads, um fork herdaria locks em uso
+        with ProcessPoolExecutor(workers, mp_context=get_context('spawn')) as pool:
+            results = list(pool.map(worker, markets, chunksize=max(len(markets) // (workers * 4), 1)))
+    else:
+        results = [worker(market) for market in markets]
+    simulated = time.perf_counter() - started
+
+    # Constrói a DB num ficheiro temporário e só no fim a troca pela antiga
+    path.parent.mkdir(parents=True, exist_ok=True)
+    building = path.with_name(f'.{path.name}.tmp')
+    for suffix in ('', '-wal', '-shm'):
+        Path(f'{building}{suffix}').unlink(missing_ok=True)
+    conn = db.connect(building)
+    count = 0
+    try:
+        db.init_schema(conn)
+        for market_id, by_strategy in results:
+            rows = [row for strategy, trades in by_strategy.items()
+                    for row in trade_rows(market_id, strategy, trades)]
+            with conn:
+                conn.executemany(f'INSERT INTO trades ({", ".join(db.TRADE_COLUMNS)}) '
+                                 f'VALUES ({", ".join("?" * len(db.TRADE_COLUMNS))})', rows)
+            count += len(rows)
+        rollups.rebuild(conn, bankroll)
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    swap(building, path)
+
+    summary = {
+        'name': name,
+        'markets': len(markets),
+        'strategies': strategies,
+        'start': start,
+        'end': end,
+        'resolution': resolution,
+        'params': {s: {**DEFAULT_PARAMS[s], **params.get(s, {})} for s in strategies},
+        'limits': limits,
+        'bankroll': bankroll,
+        'trades': count,
+        'simulate_s': simulated,
+        'total_s': time.perf_counter() - started,
+    }
+    path.with_suffix('.json').write_text(json.dumps(summary, indent=2) + '\n', encoding='utf-8')
+    return summary
+
+
+def list_runs():
+    """Backtests gravados, do mais recente para o mais antigo"""
+    if not BACKTEST_DIR.exists():
+        return []
+    paths = sorted(BACKTEST_DIR.glob('*.db'), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [path.stem for path in paths if RUN_NAME.fullmatch(path.stem)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest vetorizado das estratégias')
+    parser.add_argument('command', choices=['run', 'list'])
+    parser.add_argument('markets', nargs='*', help='mercados (todos por omissão)')
+    parser.add_argument('--name', default=time.strftime('%Y%m%d-%H%M%S'), help='nome do backtest')
+    parser.add_argument('--strategy', action='append', choices=list(DEFAULT_PARAMS),
+                        help='estratégia a simular (repetível; todas por omissão)')
+    parser.add_argument('--start', help='início (data ou datetime UTC)')
+    parser.add_argument('--end', help='fim (data ou datetime UTC)')
+    parser.add_argument('--resolution', default='1m', choices=[*ohlc.RESOLUTIONS, 'tick'])
+    parser.add_argument('--bankroll', type=float, default=1000.0, help='capital inicial')
+    parser.add_argument('--workers', type=int, help='processos (todos os cores por omissão)')
+    parser.add_argument('--dir', default=ticks.TICKS_DIR, help='pasta do armazém de ticks')
+    args = parser.parse_intermixed_args(argv)
+
+    if args.command == 'list':
+        for name in list_runs():
+            print(name)
+        return 0
+
+    summary = run(args.name, args.markets, args.strategy, args.start, args.end,
+                  None if args.resolution == 'tick' else args.resolution,
+                  bankroll=args.bankroll, workers=args.workers, ticks_dir=args.dir)
+    print(f'{summary["trades"]} trades em {run_path(args.name)} '
+          f'({summary["simulate_s"]:.1f}s a simular, {summary["total_s"]:.1f}s no total)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,264 @@
+"""Cache de resultados partilhada pelas sessões, invalidada por alterações na DB.
+
+O ``PRAGMA data_version`` de uma ligação muda sempre que outra ligação (de
+qualquer processo) faz commit. Uma ligação dedicada, que nunca escreve,
+serve de relógio: enquanto o valor não muda os resultados guardados
+continuam válidos, por isso um rerun provocado apenas por um widget não
+volta a consultar a DB. Resultados que dependem de dados fora da DB (ticks,
+estado dos workers) levam também um ``ttl`` em segundos; os que não
+dependem da DB (``track_db=False``) só expiram pelo ``ttl`` ou pela chave.
+
+A cache é uma por processo (e por DB): todas as sessões do dashboard a
+pedir a mesma chave partilham o resultado. Quando a chave falta, só a
+primeira sessão calcula; as outras esperam por esse cálculo em vez de
+repetir as consultas (single-flight). Uma exceção do cálculo chega a todas
+as que esperavam; uma interrupção da sessão que calculava (por exemplo um
+rerun do Streamlit) não passa às outras, a próxima volta a calcular.
+
+O tamanho de cada resultado é estimado (``nbytes`` dos arrays, memória dos
+DataFrames, soma dos contentores) e as entradas menos usadas saem quando o
+total passa ``max_bytes`` ou o número passa ``max_entries``. Para cada
+função a cache conta os cálculos, as chamadas servidas e as sessões
+distintas servidas por cada cálculo.
+"""
+import functools
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from trading import db
+
+MAX_ENTRIES = 256
+MAX_BYTES = 256 * 1024 * 1024
+
+
+def sizeof(value, _seen=None):
+    """Estimativa (bytes) da memória de um resultado"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    memory_usage = getattr(value, 'memory_usage', None)
+    if callable(memory_usage):
+        try:
+            return int(memory_usage(index=True).sum())
+        except TypeError:
+            pass
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sizeof(k, _seen) + sizeof(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sizeof(item, _seen) for item in value)
+    elif hasattr(value, '__dict__') and not isinstance(value, type):
+        size += sizeof(vars(value), _seen)
+    return size
+
+
+def call_key(func, args, kwargs):
+    """Chave de uma chamada: função e argumentos"""
+    return (func.__module__, func.__qualname__, args, tuple(sorted(kwargs.items())))
+
+
+class _Entry:
+    __slots__ = ('version', 'value', 'expires', 'nbytes', 'name', 'served', 'sessions')
+
+    def __init__(self, version, value, expires, nbytes, name, served, sessions):
+        self.version = version
+        self.value = value
+        self.expires = expires
+        self.nbytes = nbytes
+        self.name = name
+        self.served = served
+        self.sessions = sessions
+
+
+class _Flight:
+    """Um cálculo em curso e as sessões à espera dele"""
+    __slots__ = ('done', 'value', 'error', 'retry', 'waiters', 'sessions')
+
+    def __init__(self, session):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        self.retry = False
+        self.waiters = 0
+        self.sessions = {session}
+
+
+class VersionedCache:
+    """Cache LRU de resultados, válida enquanto a DB não receber commits.
+
+    ``session`` é uma função sem argumentos que identifica a sessão que faz
+    o pedido (só para as contagens); ``ttl`` é a validade por omissão.
+    """
+
+    def __init__(self, db_path=db.DB_PATH, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, ttl=None,
+                 session=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.session = session or (lambda: None)
+        self._watch = db.connect(db_path)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        self._by_name = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def version(self):
+        """Valor atual do PRAGMA data_version"""
+        with self._lock:
+            return self._watch.execute('PRAGMA data_version').fetchone()[0]
+
+    def get_or_compute(self, key, compute, ttl=None, name=None, track_db=True):
+        """Retorna o valor guardado para ``key`` ou calcula-o com ``compute()``.
+
+        Com ``ttl`` (s) o valor expira também ao fim desse tempo, mesmo sem
+        commits; com ``track_db=False`` os commits não o invalidam. Pedidos
+        simultâneos da mesma chave esperam pelo mesmo cálculo.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        name = name or str(key[1] if isinstance(key, tuple) and len(key) > 1 else key)
+        session = self.session()
+        while True:
+            version = self.version() if track_db else None
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.version == version:
+                    if entry.expires is None or time.monotonic() < entry.expires:
+                        self._entries.move_to_end(key)
+                        self.hits += 1
+                        entry.served += 1
+                        entry.sessions.add(session)
+                        return entry.value
+                    self.expired += 1
+                flight = self._flights.get(key)
+                if flight is None:
+                    flight = self._flights[key] = _Flight(session)
+                    self.misses += 1
+                    break
+                # Já há um cálculo desta chave: espera por ele
+                flight.waiters += 1
+                flight.sessions.add(session)
+                self.waits += 1
+            flight.done.wait()
+            if flight.retry:
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = compute()
+        except Exception as exc:
+            flight.error = exc
+            raise
+        except BaseException:
+            flight.retry = True
+            raise
+        else:
+            flight.value = value
+            self._store(key, flight, version, ttl, name)
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+        return value
+
+    def _store(self, key, flight, version, ttl, name):
+        nbytes = sizeof(flight.value)
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            counts = self._by_name.setdefault(name, Counter())
+            counts['computations'] += 1
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._retire(old)
+            self._entries[key] = _Entry(version, flight.value, expires, nbytes, name,
+                                        1 + flight.waiters, flight.sessions)
+            self.nbytes += nbytes
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     (self.max_bytes and self.nbytes > self.max_bytes)):
+                _, evicted = self._entries.popitem(last=False)
+                self._retire(evicted)
+                self.evictions += 1
+
+    def _retire(self, entry):
+        """Passa as contagens de uma entrada que sai para o total da função"""
+        self.nbytes -= entry.nbytes
+        counts = self._by_name[entry.name]
+        counts['served'] += entry.served
+        counts['sessions'] += len(entry.sessions)
+        counts['max_sessions'] = max(counts['max_sessions'], len(entry.sessions))
+
+    def call(self, func, *args, **kwargs):
+        """Chama ``func`` ou reutiliza o resultado para os mesmos argumentos"""
+        return self.get_or_compute(call_key(func, args, kwargs), lambda: func(*args, **kwargs),
+                                   name=func.__qualname__)
+
+    def wrap(self, func=None, ttl=None, track_db=True):
+        """Decorador equivalente a ``call`` (``@cache.wrap`` ou ``@cache.wrap(ttl=5)``)"""
+        if func is None:
+            return functools.partial(self.wrap, ttl=ttl, track_db=track_db)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.get_or_compute(call_key(func, args, kwargs), lambda: func(*args, **kwargs),
+                                       ttl=ttl, name=func.__qualname__, track_db=track_db)
+        return wrapper
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                self._retire(entry)
+            self._entries.clear()
+
+    def close(self):
+        """Larga os resultados e fecha a ligação que vigia o data_version"""
+        self.clear()
+        with self._lock:
+            self._watch.close()
+
+    def stats(self):
+        """Contadores de hits, misses, esperas, evictions e memória"""
+        with self._lock:
+            total = self.hits + self.misses + self.waits
+            return {
+                'entries': len(self._entries),
+                'bytes': self.nbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'evictions': self.evictions,
+                'expired': self.expired,
+                'hit_rate': (self.hits + self.waits) / total * 100 if total else 0.0,
+            }
+
+    def computations(self):
+        """Por função: cálculos, chamadas servidas e sessões servidas por cálculo"""
+        with self._lock:
+            totals = {name: Counter(counts) for name, counts in self._by_name.items()}
+            for entry in self._entries.values():
+                counts = totals[entry.name]
+                counts['served'] += entry.served
+                counts['sessions'] += len(entry.sessions)
+                counts['max_sessions'] = max(counts['max_sessions'], len(entry.sessions))
+        return {
+            name: {
+                'computations': counts['computations'],
+                'served': counts['served'],
+                'sessions_per_computation': counts['sessions'] / counts['computations'],
+                'max_sessions': counts['max_sessions'],
+            }
+            for name, counts in sorted(totals.items(), key=lambda item: -item[1]['served'])
+        }
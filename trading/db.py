@@ -0,0 +1,323 @@
+"""Acesso à base de dados SQLite partilhada com os bots."""
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+DB_PATH = Path(os.environ.get(
+    'TRADING_BOT_DB',
+    Path(__file__).resolve().parent.parent.parent / 'bots' / 'data' / 'trading_bot.db'
+))
+
+STATUS_OPEN = 'open'
+STATUS_CLOSED = 'closed'
+
+def _add_columns(table, columns):
+    """Passo de migração que acrescenta colunas em falta a uma tabela existente"""
+    def step(conn):
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for column, column_type in columns.items():
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+    return step
+
+
+def _number_closed_trades(conn):
+    """Numera os trades já fechados por ordem de exit_time e inicia a sequência"""
+    conn.execute('''
+        UPDATE trades SET closed_seq = numbered.seq
+        FROM (SELECT rowid AS row, ROW_NUMBER() OVER (ORDER BY exit_time, id) AS seq
+              FROM trades WHERE status = 'closed' AND closed_seq IS NULL) AS numbered
+        WHERE trades.rowid = numbered.row
+    ''')
+    conn.execute('''
+        INSERT OR REPLACE INTO sequences (name, value)
+        VALUES ('closed', (SELECT COALESCE(MAX(closed_seq), 0) FROM trades))
+    ''')
+
+
+# Atribui o próximo número da sequência 'closed' ao trade NEW
+_NEXT_CLOSED_SEQ = '''
+    UPDATE sequences SET value = value + 1 WHERE name = 'closed';
+    UPDATE trades SET closed_seq = (SELECT value FROM sequences WHERE name = 'closed')
+    WHERE rowid = NEW.rowid;
+'''
+
+# Migrações por ordem; a posição N (a partir de 1) fica registada em
+# PRAGMA user_version depois de aplicada. Os passos são idempotentes porque
+# DBs criadas pelos bots antes do versionamento começam na versão 0.
+MIGRATIONS = [
+    # 1: tabelas base
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS trades (
+            id TEXT PRIMARY KEY,
+            market_id TEXT,
+            strategy TEXT,
+            direction TEXT,
+            entry_price REAL,
+            exit_price REAL,
+            size_usd REAL,
+            quantity REAL,
+            entry_time TIMESTAMP,
+            exit_time TIMESTAMP,
+            status TEXT,
+            pnl REAL,
+            pnl_pct REAL,
+            exit_reason TEXT
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS daily_metrics (
+            date TEXT PRIMARY KEY,
+            starting_bankroll REAL,
+            ending_bankroll REAL,
+            daily_pnl REAL,
+            daily_pnl_pct REAL,
+            num_trades INTEGER,
+            win_rate REAL,
+            sharpe_ratio REAL,
+            max_drawdown REAL
+        )
+        ''',
+    ],
+    # 2: índices para as queries do dashboard (posições abertas, agregados
+    # por estratégia) - evitam full scans à tabela trades
+    [
+        'CREATE INDEX IF NOT EXISTS idx_trades_status_entry ON trades(status, entry_time)',
+        'CREATE INDEX IF NOT EXISTS idx_trades_strategy_exit ON trades(strategy, exit_time, pnl)',
+    ],
+    # 3: paginação por keyset do histórico (ver trading/history.py); os
+    # índices por mercado e estratégia servem o filtro e a ordenação
+    [
+        'DROP INDEX IF EXISTS idx_trades_market',
+        'CREATE INDEX IF NOT EXISTS idx_trades_market_entry ON trades(market_id, entry_time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_trades_strategy_entry ON trades(strategy, entry_time, id)',
+        'CREATE INDEX IF NOT EXISTS idx_trades_entry ON trades(entry_time, id)',
+    ],
+    # 4: rollups incrementais (ver trading/rollups.py)
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS strategy_metrics (
+            strategy TEXT PRIMARY KEY,
+            num_trades INTEGER,
+            wins INTEGER,
+            losses INTEGER,
+            pnl_sum REAL,
+            pnl_sq_sum REAL,
+            equity REAL,
+            peak_equity REAL,
+            max_drawdown REAL,
+            last_exit_time TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            exit_time TIMESTAMP,
+            trade_id TEXT
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_trades_closed_exit ON trades(exit_time, id) WHERE status = 'closed'",
+        _add_columns('daily_metrics', {
+            'wins': 'INTEGER',
+            'pnl_sq_sum': 'REAL',
+            'peak_bankroll': 'REAL',
+        }),
+    ],
+    # 5: ordem de fecho (closed_seq) para os rollups não perderem trades
+    # fechados fora de ordem de exit_time, e o estado de cada estratégia no
+    # fim de cada dia para os voltar a incorporar a partir desse dia
+    [
+        _add_columns('trades', {'closed_seq': 'INTEGER'}),
+        _add_columns('rollup_state', {'seq': 'INTEGER'}),
+        'CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)',
+        '''
+        CREATE TABLE IF NOT EXISTS strategy_days (
+            strategy TEXT,
+            date TEXT,
+            num_trades INTEGER,
+            wins INTEGER,
+            losses INTEGER,
+            pnl_sum REAL,
+            pnl_sq_sum REAL,
+            equity REAL,
+            peak_equity REAL,
+            max_drawdown REAL,
+            last_exit_time TIMESTAMP,
+            PRIMARY KEY (strategy, date)
+        )
+        ''',
+        _number_closed_trades,
+        'CREATE INDEX IF NOT EXISTS idx_trades_closed_seq ON trades(closed_seq) WHERE closed_seq IS NOT NULL',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trades_closed_seq_insert AFTER INSERT ON trades
+        WHEN NEW.status = 'closed' AND NEW.closed_seq IS NULL
+        BEGIN {_NEXT_CLOSED_SEQ} END
+        ''',
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trades_closed_seq_update AFTER UPDATE OF status ON trades
+        WHEN NEW.status = 'closed' AND OLD.status IS NOT 'closed'
+        BEGIN {_NEXT_CLOSED_SEQ} END
+        ''',
+        # Os rollups passam a guardar também strategy_days: refazem-se na próxima atualização
+        "DELETE FROM rollup_state WHERE name = 'closed_trades'",
+    ],
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+# Colunas de um trade pela ordem da tabela (closed_seq é atribuído pela DB)
+TRADE_COLUMNS = ('id', 'market_id', 'strategy', 'direction', 'entry_price', 'exit_price', 'size_usd',
+                 'quantity', 'entry_time', 'exit_time', 'status', 'pnl', 'pnl_pct', 'exit_reason')
+
+
+def connect(db_path=DB_PATH):
+    """Abre uma ligação em modo WAL para ler enquanto os bots escrevem"""
+    conn = sqlite3.connect(db_path, timeout=5.0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-16000')
+    conn.execute('PRAGMA mmap_size=268435456')
+    return conn
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def init_schema(conn):
+    """Aplica as migrações em falta e retorna a versão do schema.
+
+    Uma DB já atualizada custa só a leitura do user_version; caso contrário
+    as migrações correm numa única transação (BEGIN IMMEDIATE), por isso
+    dois processos a arrancar ao mesmo tempo não as aplicam duas vezes.
+    """
+    version = schema_version(conn)
+    if version >= SCHEMA_VERSION:
+        return version
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        version = schema_version(conn)
+        for steps in MIGRATIONS[version:]:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return SCHEMA_VERSION
+
+
+class ConnectionPool:
+    """Pool de ligações SQLite partilhado por todas as sessões do processo"""
+
+    def __init__(self, db_path=DB_PATH, size=4):
+        self.db_path = Path(db_path)
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connection() as conn:
+            init_schema(conn)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                return connect(self.db_path)
+
+        return self._idle.get(timeout=30)
+
+    @contextmanager
+    def connection(self):
+        """Empresta uma ligação do pool"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def close(self):
+        """Fecha as ligações inativas"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+# ==================== QUERIES ====================
+
+def parse_time(value):
+    """Converte um TIMESTAMP da DB em datetime (ou None)"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def count_open_trades(conn):
+    """Número de posições abertas (servido pelo índice de status)"""
+    return conn.execute('SELECT COUNT(*) FROM trades WHERE status = ?', (STATUS_OPEN,)).fetchone()[0]
+
+
+def fetch_open_trades(conn):
+    """Trades com status aberto, mais recentes primeiro"""
+    return conn.execute('''
+        SELECT id, market_id, strategy, direction, entry_price, exit_price,
+               size_usd, quantity, entry_time, pnl, pnl_pct
+        FROM trades
+        WHERE status = ?
+        ORDER BY entry_time DESC
+    ''', (STATUS_OPEN,)).fetchall()
+
+
+def fetch_recent_trades(conn, limit=5):
+    """Últimas entradas e saídas, mais recentes primeiro.
+
+    A ação segue o lado guardado: abrir LONG ou fechar SHORT é BUY, abrir
+    SHORT ou fechar LONG é SELL.
+    """
+    # Os fechados vêm por exit_time pelo índice parcial (status literal)
+    return conn.execute(f'''
+        SELECT * FROM (
+            SELECT entry_time AS time, strategy, market_id,
+                   CASE WHEN direction = 'SHORT' THEN 'SELL' ELSE 'BUY' END AS action,
+                   entry_price AS price, NULL AS pnl_pct
+            FROM trades WHERE status = ?
+            ORDER BY entry_time DESC LIMIT ?
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT exit_time AS time, strategy, market_id,
+                   CASE WHEN direction = 'SHORT' THEN 'BUY' ELSE 'SELL' END AS action,
+                   exit_price AS price, pnl_pct
+            FROM trades INDEXED BY idx_trades_closed_exit
+            WHERE status = '{STATUS_CLOSED}'
+            ORDER BY exit_time DESC, id DESC LIMIT ?
+        )
+        ORDER BY time DESC
+        LIMIT ?
+    ''', (STATUS_OPEN, limit, limit, limit)).fetchall()
@@ -0,0 +1,188 @@
+"""Distribuições calculadas no servidor: histograma, quantis e densidade.
+
+O gráfico recebe só as contagens de cada bin e a curva de densidade numa
+grelha fixa, nunca os valores de cada trade, por isso o tamanho da figura
+não depende do número de trades.
+
+Os bins são os mesmos para todas as estratégias (as sobreposições ficam
+comparáveis): largura pela regra de Freedman-Diaconis, limitada a
+[``MIN_BINS``, ``MAX_BINS``] bins, entre os quantis ``TAIL`` e
+``1 - TAIL``. Os valores fora desse intervalo contam nos bins das pontas
+(e em ``clipped``), para um outlier não esmagar o resto do histograma.
+
+A densidade é uma KDE gaussiana (largura de banda de Silverman) calculada
+por binning: os valores são contados numa grelha de ``GRID_POINTS`` pontos
+e a grelha é convolvida com o núcleo, O(n + grelha) em vez de
+O(n × grelha).
+"""
+import numpy as np
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+MIN_BINS = 10
+MAX_BINS = 200
+TAIL = 0.001        # fração em cada ponta fora do intervalo dos bins
+GRID_POINTS = 512   # pontos da curva de densidade
+KERNEL_SPAN = 4.0   # núcleo truncado a ±4 larguras de banda
+
+
+def _finite(values):
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    return values if finite.all() else values[finite]
+
+
+def _quantiles(values, probs):
+    """Vários quantis numa só passagem (um partition para todos)"""
+    probs = sorted(set(probs))
+    return dict(zip(probs, np.quantile(values, probs).tolist()))
+
+
+def bin_edges(values, min_bins=MIN_BINS, max_bins=MAX_BINS, tail=TAIL, known=None):
+    """Limites dos bins (Freedman-Diaconis) para um array de valores.
+
+    ``known`` são quantis já calculados (dict quantil -> valor).
+    """
+    values = _finite(values)
+    if values.size == 0:
+        return np.linspace(0.0, 1.0, min_bins + 1)
+    known = known or _quantiles(values, (tail, 0.25, 0.75, 1 - tail))
+    lo, q25, q75, hi = (known[p] for p in (tail, 0.25, 0.75, 1 - tail))
+    if hi <= lo:
+        lo, hi = lo - 0.5, hi + 0.5
+    width = 2 * (q75 - q25) / np.cbrt(values.size)
+    bins = int(np.ceil((hi - lo) / width)) if width > 0 else min_bins
+    return np.linspace(lo, hi, min(max(bins, min_bins), max_bins) + 1)
+
+
+def bin_index(values, edges):
+    """Bin de cada valor em bins de largura igual (os de fora do intervalo vão para as pontas)"""
+    n_bins = len(edges) - 1
+    index = np.clip(((values - edges[0]) * (n_bins / (edges[-1] - edges[0]))).astype(np.int64),
+                    0, n_bins - 1)
+    # Arredondamentos junto aos limites, como no np.histogram
+    index -= values < edges[index]
+    index += (values >= edges[index + 1]) & (index < n_bins - 1)
+    return np.clip(index, 0, n_bins - 1)
+
+
+def histogram(values, edges, codes=None, n_groups=0):
+    """Contagens por bin: total e, com ``codes``, uma linha por grupo.
+
+    Retorna um dict com ``counts``, ``group_counts`` (n_groups × bins) e
+    ``clipped`` (valores abaixo e acima do intervalo dos bins).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    keep = np.isfinite(values)
+    if not keep.all():
+        values = values[keep]
+        codes = None if codes is None else np.asarray(codes)[keep]
+    n_bins = len(edges) - 1
+    index = bin_index(values, edges)
+    result = {
+        'counts': np.bincount(index, minlength=n_bins),
+        'clipped': (int((values < edges[0]).sum()), int((values > edges[-1]).sum())),
+    }
+    if codes is not None:
+        codes = np.asarray(codes, dtype=np.int64)
+        # Um só bincount para todos os grupos: chave = grupo × bins + bin
+        result['group_counts'] = np.bincount(codes * n_bins + index,
+                                             minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+    return result
+
+
+def quantiles(values, qs=QUANTILES):
+    """Quantis de um array (dict quantil -> valor; vazio se não houver valores)"""
+    values = _finite(values)
+    if values.size == 0:
+        return {}
+    return _quantiles(values, qs)
+
+
+def bandwidth(values, known=None):
+    """Largura de banda de Silverman (0 se os valores forem todos iguais)"""
+    values = _finite(values)
+    if values.size < 2:
+        return 0.0
+    known = known or _quantiles(values, (0.25, 0.75))
+    q25, q75 = known[0.25], known[0.75]
+    spread = min(values.std(ddof=1), (q75 - q25) / 1.34) or values.std(ddof=1)
+    return float(0.9 * spread * values.size ** -0.2)
+
+
+def kde(values, lo, hi, points=GRID_POINTS, bw=None):
+    """Densidade gaussiana de ``values`` numa grelha de ``points`` pontos entre lo e hi.
+
+    Retorna (grelha, densidade); a densidade integra a 1 sobre a reta toda
+    (a parte fora de [lo, hi] não aparece). Sem dispersão retorna zeros.
+    """
+    grid = np.linspace(lo, hi, points)
+    values = _finite(values)
+    bw = bandwidth(values) if bw is None else bw
+    if values.size == 0 or bw <= 0 or hi <= lo:
+        return grid, np.zeros(points)
+    step = grid[1] - grid[0]
+    # Grelha alargada para os valores perto das pontas contarem dentro
+    # (limitada: com a largura de banda muito maior que o intervalo o núcleo já é quase plano)
+    pad = min(int(np.ceil(KERNEL_SPAN * bw / step)), 4 * points)
+    position = np.rint((values - lo) / step).astype(np.int64) + pad
+    inside = (position >= 0) & (position < points + 2 * pad)
+    counts = np.bincount(position[inside], minlength=points + 2 * pad).astype(np.float64)
+    offsets = np.arange(-pad, pad + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bw) ** 2)
+    density = np.convolve(counts, kernel, mode='same')[pad:pad + points]
+    return grid, density / (values.size * bw * np.sqrt(2 * np.pi))
+
+
+def summarize(values, codes=None, names=(), qs=QUANTILES, points=GRID_POINTS):
+    """Tudo o que o gráfico de distribuição precisa, em arrays pequenos.
+
+    Retorna um dict com os limites e centros dos bins, as contagens (total e
+    por grupo), os quantis, a densidade total e por grupo (escalada para
+    contagens por bin, para ficar sobre as barras) e o número de valores.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_groups = len(names)
+    finite = np.isfinite(values)
+    if not finite.all():
+        values = values[finite]
+        codes = None if codes is None else np.asarray(codes)[finite]
+    probs = (*qs, TAIL, 0.25, 0.75, 1 - TAIL)
+
+    def describe(group):
+        # Quantis pedidos, dos bins e da largura de banda num só partition
+        known = _quantiles(group, probs) if group.size else {}
+        return known, {q: known[q] for q in qs} if known else {}
+
+    known, total_quantiles = describe(values)
+    edges = bin_edges(values, known=known)
+    hist = histogram(values, edges, codes if n_groups else None, n_groups)
+    width = edges[1] - edges[0]
+    grid, density = kde(values, edges[0], edges[-1], points, bw=bandwidth(values, known))
+    n = int(hist['counts'].sum())
+    result = {
+        'edges': edges,
+        'centers': (edges[:-1] + edges[1:]) / 2,
+        'width': float(width),
+        'counts': hist['counts'],
+        'clipped': hist['clipped'],
+        'quantiles': total_quantiles,
+        'n': n,
+        'kde_x': grid,
+        'kde_y': density * n * width,
+        'groups': {},
+    }
+    if n_groups:
+        codes = np.asarray(codes, dtype=np.int64)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(n_groups + 1))
+        for g, name in enumerate(names):
+            group = values[order[bounds[g]:bounds[g + 1]]]
+            group_known, group_quantiles = describe(group)
+            _, group_density = kde(group, edges[0], edges[-1], points, bw=bandwidth(group, group_known))
+            counts = hist['group_counts'][g]
+            result['groups'][name] = {
+                'counts': counts,
+                'quantiles': group_quantiles,
+                'kde_y': group_density * int(counts.sum()) * width,
+            }
+    return result
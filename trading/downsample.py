@@ -0,0 +1,77 @@
+"""Redução de séries temporais para o número de pixels do gráfico.
+
+Os dois métodos preservam picos e vales: o LTTB (Largest-Triangle-Three-
+Buckets) escolhe em cada bucket o ponto que forma o maior triângulo com os
+vizinhos; o min/max mantém o mínimo e o máximo de cada bucket.
+"""
+import numpy as np
+
+
+def lttb(x, y, n_out):
+    """Downsampling LTTB para ``n_out`` pontos (mantém o primeiro e o último)"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # Buckets de tamanho igual entre o primeiro e o último ponto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Médias de cada bucket (usadas como terceiro vértice do triângulo)
+    sums_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    avg_x = np.append(sums_x / sizes, x[-1])
+    avg_y = np.append(sums_y / sizes, y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # Área (x2) do triângulo entre o ponto anterior, cada candidato e a
+        # média do bucket seguinte
+        area = np.abs(
+            (x[a] - avg_x[i + 1]) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y[i + 1] - y[a])
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return x[selected], y[selected]
+
+
+def minmax(x, y, n_out):
+    """Downsampling min/max: até dois pontos por bucket, por ordem temporal"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    n_buckets = max(n_out // 2, 1)
+    if n <= n_out or n_buckets < 2:
+        return x, y
+
+    # Buckets com o mesmo número de pontos; o resto vai para o último
+    k = n // n_buckets
+    body = y[:k * n_buckets].reshape(n_buckets, k)
+    offsets = np.arange(n_buckets) * k
+    lows = offsets + body.argmin(axis=1)
+    highs = offsets + body.argmax(axis=1)
+    tail = y[k * n_buckets:]
+    if tail.size:
+        last = k * (n_buckets - 1)
+        lows[-1] = last + y[last:].argmin()
+        highs[-1] = last + y[last:].argmax()
+
+    selected = np.unique(np.concatenate(([0], lows, highs, [n - 1])))
+    return x[selected], y[selected]
+
+
+METHODS = {
+    'lttb': lttb,
+    'minmax': minmax,
+}
+
+
+def downsample(x, y, n_out, method='lttb'):
+    """Reduz a série com o método indicado ('lttb' ou 'minmax')"""
+    return METHODS[method](x, y, n_out)
@@ -0,0 +1,151 @@
+"""Histórico de trades com paginação por keyset e exportação em streaming.
+
+As páginas são ordenadas por (entry_time, id) descendente e cada página
+continua a partir do último par visto (``WHERE (entry_time, id) < (?, ?)``),
+por isso o custo de uma página não depende de quão fundo se está no
+histórico, ao contrário de ``OFFSET``.
+
+Os trades antigos estão nos arquivos mensais (``trading.archive``): cada
+página consulta primeiro a DB quente e depois os arquivos do mais recente
+para o mais antigo, parando quando o arquivo seguinte já não pode ter
+trades mais recentes do que os da página (o arquivo de um mês só tem
+trades com entrada antes do fim desse mês e da marca de arquivo).
+
+O dashboard só exporta até um número máximo de linhas (o download do
+Streamlit leva o ficheiro inteiro em memória); o histórico completo
+exporta-se em streaming para um ficheiro com a linha de comandos.
+
+Uso::
+
+    python -m trading.history export --out trades.csv [--db PATH] [--strategy S]
+        [--market M] [--status closed] [--start 2025-01-01] [--end 2025-02-01]
+"""
+import argparse
+import csv
+import io
+import sys
+
+from trading import archive, db
+
+COLUMNS = ('id', 'entry_time', 'exit_time', 'market_id', 'strategy', 'direction',
+           'entry_price', 'exit_price', 'size_usd', 'quantity', 'pnl', 'pnl_pct',
+           'status', 'exit_reason')
+
+
+def build_filters(strategy=None, market=None, status=None, start=None, end=None):
+    """Traduz os filtros da página numa cláusula WHERE e respetivos parâmetros.
+
+    ``start``/``end`` delimitam entry_time (``end`` exclusivo).
+    """
+    clauses, params = [], []
+    if strategy:
+        clauses.append('strategy = ?')
+        params.append(strategy)
+    if market:
+        clauses.append('market_id = ?')
+        params.append(market)
+    if status:
+        clauses.append('status = ?')
+        params.append(status)
+    if start:
+        clauses.append('entry_time >= ?')
+        params.append(str(start))
+    if end:
+        clauses.append('entry_time < ?')
+        params.append(str(end))
+    return clauses, params
+
+
+def fetch_page(conn, filters=((), ()), after=None, page_size=50):
+    """Uma página de trades a seguir ao cursor ``after`` = (entry_time, id).
+
+    Retorna (linhas, cursor da página seguinte ou None se for a última).
+    """
+    clauses, params = list(filters[0]), list(filters[1])
+    if after is not None:
+        clauses.append('(entry_time, id) < (?, ?)')
+        params.extend(after)
+
+    def read():
+        rows = []
+        archived = archive.mark(conn)
+        for table, extra, extra_params, month in archive.trade_tables(conn, newest_first=True):
+            if month is not None and len(rows) > page_size and \
+                    (rows[page_size]['entry_time'] or '') >= min(archive.month_end(month), archived):
+                break
+            where = ' AND '.join([*clauses, *extra])
+            # Pede uma linha a mais para saber se existe página seguinte
+            rows.extend(conn.execute(f'''
+                SELECT {', '.join(COLUMNS)} FROM {table}
+                {f'WHERE {where}' if where else ''}
+                ORDER BY entry_time DESC, id DESC
+                LIMIT ?
+            ''', (*params, *extra_params, page_size + 1)).fetchall())
+            if month is not None:
+                rows.sort(key=lambda row: (row['entry_time'] or '', row['id']), reverse=True)
+            del rows[page_size + 1:]
+        return rows
+
+    rows = archive.consistent(conn, read)
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, (rows[-1]['entry_time'], rows[-1]['id'])
+    return rows, None
+
+
+def iter_rows(conn, filters=((), ()), chunk_size=5000, limit=None):
+    """Percorre os trades filtrados (no máximo ``limit``), página a página"""
+    after = None
+    while limit is None or limit > 0:
+        page_size = chunk_size if limit is None else min(chunk_size, limit)
+        rows, after = fetch_page(conn, filters, after, page_size=page_size)
+        yield from rows
+        if limit is not None:
+            limit -= len(rows)
+        if after is None:
+            return
+
+
+def iter_csv(conn, filters=((), ()), chunk_size=5000, limit=None):
+    """Gera o CSV do histórico filtrado (no máximo ``limit`` linhas) em blocos de texto.
+
+    Nunca mantém mais do que ``chunk_size`` linhas em memória.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in iter_rows(conn, filters, chunk_size, limit):
+        writer.writerow(tuple(row))
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exportação do histórico de trades')
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--db', default=db.DB_PATH, help='caminho da trading_bot.db')
+    parser.add_argument('--out', default='-', help='ficheiro CSV de saída (- para stdout)')
+    for name in ('strategy', 'market', 'status', 'start', 'end'):
+        parser.add_argument(f'--{name}', default=None)
+    args = parser.parse_args(argv)
+
+    filters = build_filters(args.strategy, args.market, args.status, args.start, args.end)
+    conn = db.connect(args.db)
+    out = sys.stdout if args.out == '-' else open(args.out, 'w', newline='', encoding='utf-8')
+    try:
+        for chunk in iter_csv(conn, filters):
+            out.write(chunk)
+    finally:
+        conn.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
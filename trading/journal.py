@@ -0,0 +1,265 @@
+"""Escrita em lote dos trades dos bots (diário de trades).
+
+Os bots registam entradas (``record_open``) e saídas (``record_close``)
+numa fila em memória; cada lote é escrito com ``executemany`` numa única
+transação quando a fila chega a ``batch_size`` registos ou passam
+``flush_interval`` segundos (numa thread própria), ou com ``flush()``
+explícito. Uma transação por lote em vez de um commit por trade deixa o
+writer do SQLite livre quase sempre para as leituras do dashboard.
+
+As entradas são inseridas com ``ON CONFLICT(id) DO NOTHING`` e as saídas
+passam a linha aberta a fechada (preço e hora de saída, ``pnl``,
+``pnl_pct``, motivo); um trade já fechado (por exemplo pelo fecho de
+emergência) não é reescrito. Repetir um registo não muda o resultado.
+
+Cada registo vai também para um spool (JSON por linha, só acrescentado)
+antes de entrar na fila. Ao flush o spool passa a ``.flushing`` e abre-se
+um novo; depois do commit o ``.flushing`` é apagado. Se o processo morrer
+a meio, o journal seguinte repõe os dois ficheiros pela ordem original
+antes de aceitar registos novos (uma última linha incompleta é ignorada).
+O spool sobrevive à morte do processo; com ``fsync=True`` também a uma
+falha do sistema, ao custo de um fsync por registo.
+
+Uma falha transitória do SQLite (DB bloqueada, erro de I/O, disco cheio)
+não perde nem bloqueia o journal: o lote fica no ``.flushing`` e volta a
+ser escrito, antes dos registos seguintes, com backoff exponencial entre
+``RETRY_DELAY`` e ``MAX_RETRY_DELAY``. Só as outras falhas param o
+journal (os registos seguintes são recusados) e ficam para o próximo
+arranque.
+
+Uso::
+
+    with journal.TradeJournal(name='momentum') as trades:
+        trades.record_open(trade_id, market_id, 'Momentum', 'LONG', 0.52, 25.0, 48.1, entry_time)
+        trades.record_close(trade_id, 0.55, exit_time, 1.44, 5.77, 'take_profit')
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from trading import db
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 0.5  # s
+RETRY_DELAY = 0.5      # s, espera depois da primeira falha transitória (duplica a cada falha)
+MAX_RETRY_DELAY = 30.0  # s
+CLOSE_TIMEOUT = 10.0   # s a tentar escrever o que falta ao fechar
+# Códigos do SQLite em que vale a pena repetir o mesmo lote
+TRANSIENT_ERRORS = {sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED, sqlite3.SQLITE_IOERR,
+                    sqlite3.SQLITE_FULL, sqlite3.SQLITE_CANTOPEN, sqlite3.SQLITE_PROTOCOL}
+
+OPEN_COLUMNS = ['id', 'market_id', 'strategy', 'direction', 'entry_price', 'size_usd', 'quantity',
+                'entry_time']
+
+INSERT_OPEN = (
+    f'INSERT INTO trades ({", ".join(OPEN_COLUMNS)}, status, pnl) '
+    f'VALUES ({", ".join("?" * len(OPEN_COLUMNS))}, \'{db.STATUS_OPEN}\', 0) '
+    'ON CONFLICT(id) DO NOTHING'
+)
+UPDATE_CLOSE = (
+    'UPDATE trades SET exit_price = ?, exit_time = ?, pnl = ?, pnl_pct = ?, exit_reason = ?, '
+    f'status = \'{db.STATUS_CLOSED}\' WHERE id = ? AND status = \'{db.STATUS_OPEN}\''
+)
+
+
+def write_batch(conn, records):
+    """Escreve uma lista de registos ('open'|'close', valores) numa transação.
+
+    Entradas e saídas vão em dois ``executemany``, entradas primeiro: uma
+    saída vem sempre depois da sua entrada, por isso a ordem dentro do lote
+    não muda o resultado. Retorna o número de linhas escritas.
+    """
+    opens = [values for kind, values in records if kind == 'open']
+    closes = [values for kind, values in records if kind == 'close']
+    with conn:
+        written = conn.executemany(INSERT_OPEN, opens).rowcount if opens else 0
+        if closes:
+            written += conn.executemany(UPDATE_CLOSE, closes).rowcount
+    return written
+
+
+def is_transient(exc):
+    """Falha do SQLite que pode passar sozinha (o lote deve ser repetido)"""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, 'sqlite_errorcode', None)
+    # Sem código (versões antigas do módulo) só "locked"/"busy" contam como transitórias
+    if code is None:
+        return 'locked' in str(exc) or 'busy' in str(exc)
+    return (code & 0xff) in TRANSIENT_ERRORS
+
+
+def read_spool(path):
+    """Registos de um spool; ignora uma última linha incompleta"""
+    records = []
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    kind, values = json.loads(line)
+                except ValueError:
+                    break
+                records.append((kind, values))
+    except FileNotFoundError:
+        pass
+    return records
+
+
+class TradeJournal:
+    """Fila de registos de trades com flush em lote e spool em disco"""
+
+    def __init__(self, db_path=db.DB_PATH, name='journal', batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, spool_dir=None, fsync=False, background=True):
+        self.db_path = Path(db_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        spool_dir = Path(spool_dir) if spool_dir else self.db_path.parent
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        self.spool_path = spool_dir / f'{name}.spool'
+        self.flushing_path = spool_dir / f'{name}.spool.flushing'
+
+        self.conn = db.connect(self.db_path)
+        db.init_schema(self.conn)
+        self.pending = []
+        self.rows = 0
+        self.batches = 0
+        self.retries = 0
+        self.last_error = None  # última falha transitória
+        self.recovered = self._recover()
+
+        self._lock = threading.Lock()      # fila e spool
+        self._flush_lock = threading.Lock()  # um flush de cada vez
+        self._wake = threading.Condition(self._lock)
+        self._spool = open(self.spool_path, 'a', encoding='utf-8')
+        self._closed = False
+        self._error = None
+        self._batch = None  # lote no .flushing à espera de nova tentativa
+        self._delay = 0.0
+        self._retry_at = 0.0
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name=f'journal-{name}', daemon=True)
+            self._thread.start()
+
+    def _recover(self):
+        """Repõe os registos que ficaram nos spools de uma execução anterior"""
+        records = read_spool(self.flushing_path) + read_spool(self.spool_path)
+        if records:
+            write_batch(self.conn, records)
+        for path in (self.flushing_path, self.spool_path):
+            path.unlink(missing_ok=True)
+        return len(records)
+
+    # ---------- registo ----------
+
+    def _record(self, kind, values):
+        line = json.dumps([kind, values], separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('journal fechado')
+            if self._error is not None:
+                raise RuntimeError('falha na escrita do journal') from self._error
+            self._spool.write(line)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self.pending.append((kind, values))
+            if len(self.pending) >= self.batch_size:
+                self._wake.notify()
+
+    def record_open(self, trade_id, market_id, strategy, direction, entry_price, size_usd, quantity,
+                    entry_time):
+        """Regista a entrada de um trade (fica aberto)"""
+        self._record('open', [trade_id, market_id, strategy, direction, entry_price, size_usd,
+                              quantity, entry_time])
+
+    def record_close(self, trade_id, exit_price, exit_time, pnl, pnl_pct, exit_reason):
+        """Regista a saída de um trade (passa a fechado)"""
+        self._record('close', [exit_price, exit_time, pnl, pnl_pct, exit_reason, trade_id])
+
+    # ---------- escrita ----------
+
+    def flush(self):
+        """Escreve os registos pendentes numa transação; retorna o número de registos.
+
+        Um lote que falhou por uma causa transitória é repetido primeiro
+        (e só depois de passado o backoff); até lá retorna 0.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._error is not None:
+                    raise RuntimeError('falha na escrita do journal') from self._error
+                if self._batch is None:
+                    if not self.pending:
+                        return 0
+                    self._batch, self.pending = self.pending, []
+                    # Registos novos vão para um spool novo enquanto este lote é escrito
+                    self._spool.close()
+                    os.replace(self.spool_path, self.flushing_path)
+                    self._spool = open(self.spool_path, 'a', encoding='utf-8')
+                elif time.monotonic() < self._retry_at:
+                    return 0
+                records = self._batch
+            try:
+                self.rows += write_batch(self.conn, records)
+            except Exception as exc:
+                if not is_transient(exc):
+                    # O lote fica no spool .flushing; o próximo arranque repõe-no
+                    with self._lock:
+                        self._error = exc
+                    raise
+                self.retries += 1
+                self.last_error = exc
+                self._delay = min(self._delay * 2 or RETRY_DELAY, MAX_RETRY_DELAY)
+                self._retry_at = time.monotonic() + self._delay
+                return 0
+            self._batch = None
+            self._delay = 0.0
+            self.batches += 1
+            self.flushing_path.unlink()
+            return len(records)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and len(self.pending) < self.batch_size:
+                    self._wake.wait(self.flush_interval)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                return
+            if closed:
+                return
+
+    def close(self):
+        """Escreve o que falta e fecha o journal"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wake.notify()
+        if self._thread is not None:
+            self._thread.join()
+        deadline = time.monotonic() + CLOSE_TIMEOUT
+        while self._error is None and (self._batch is not None or self.pending):
+            self.flush()
+            if self._batch is not None:
+                if time.monotonic() + self._delay > deadline:
+                    break
+                time.sleep(max(self._retry_at - time.monotonic(), 0.0))
+        self._spool.close()
+        # O que não foi escrito fica nos spools para o próximo arranque
+        if self._error is None and self._batch is None and not self.pending:
+            self.spool_path.unlink(missing_ok=True)
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
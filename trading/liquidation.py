@@ -0,0 +1,225 @@
+"""Fecho de emergência de todas as posições abertas.
+
+As ordens de fecho são submetidas todas ao mesmo tempo (um pool de threads
+sobre uma ``requests.Session`` com ligações reutilizadas), cada uma com
+timeout próprio, retries com backoff e uma chave de idempotência fixa por
+posição (``close-<id>``): um retry, ou um segundo clique no botão, nunca
+fecha a mesma posição duas vezes na exchange. ``close_all`` é um gerador
+que produz cada resultado quando a ordem termina, para o dashboard mostrar
+o progresso; no fim ``write_closes`` escreve todos os fills na tabela
+``trades`` numa única transação.
+
+Em Paper Trading as ordens são preenchidas ao último preço do armazém de
+ticks (``PaperExchange``), sem rede.
+
+API da exchange (``POST {url}/orders``, cabeçalho ``Idempotency-Key``)::
+
+    {"client_order_id": "close-<id>", "market_id": ..., "side": "SELL"|"BUY",
+     "quantity": ..., "type": "market", "reduce_only": true}
+    -> {"order_id": ..., "client_order_id": ..., "status": "filled",
+        "price": ..., "filled_at": <ms>}
+
+Uso::
+
+    python -m trading.liquidation close-all --url http://127.0.0.1:8080 [--workers 64]
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from trading import db, ticks
+
+EXIT_REASON = 'emergency'
+
+# Exchange do modo Live (sem URL o fecho usa os preços do armazém de ticks)
+EXCHANGE_URL = os.environ.get('TRADING_EXCHANGE_URL')
+
+# Timeout (s) de cada pedido (ligação, leitura), retries e orçamento total
+ORDER_TIMEOUT = (1.0, 2.0)
+RETRIES = 3
+BACKOFF = 0.05
+BUDGET = 10.0
+WORKERS = 64
+
+Fill = namedtuple('Fill', 'position_id price ts attempts latency error')
+
+
+def idempotency_key(position_id):
+    return f'close-{position_id}'
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _format_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ExchangeError(Exception):
+    """Ordem recusada pela exchange ou sem resposta depois dos retries"""
+
+
+class ExchangeClient:
+    """Cliente HTTP da exchange com um pool de ligações do tamanho do executor"""
+
+    def __init__(self, url, timeout=ORDER_TIMEOUT, retries=RETRIES, backoff=BACKOFF,
+                 pool_size=WORKERS):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def close(self, position, deadline=None):
+        """Fecha uma posição a mercado; retorna (preço, ts em ms, tentativas)"""
+        key = idempotency_key(position['id'])
+        order = {
+            'client_order_id': key,
+            'market_id': position['market_id'],
+            'side': 'SELL' if position['direction'] == 'LONG' else 'BUY',
+            'quantity': position['quantity'] or position['size_usd'] / position['entry_price'],
+            'type': 'market',
+            'reduce_only': True,
+        }
+        error = None
+        for attempt in range(1, self.retries + 2):
+            try:
+                response = self.session.post(f'{self.url}/orders', json=order, timeout=self.timeout,
+                                             headers={'Idempotency-Key': key})
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = f'{type(exc).__name__}: {exc}'
+            else:
+                if response.status_code < 400:
+                    fill = response.json()
+                    return float(fill['price']), int(fill['filled_at']), attempt
+                error = f'HTTP {response.status_code}: {response.text[:200]}'
+                # 4xx (exceto 429) não melhora com retries
+                if response.status_code < 500 and response.status_code != 429:
+                    break
+            wait = self.backoff * 2 ** (attempt - 1)
+            if attempt > self.retries or (deadline is not None and time.monotonic() + wait > deadline):
+                break
+            time.sleep(wait)
+        raise ExchangeError(error)
+
+    def close_session(self):
+        self.session.close()
+
+
+class PaperExchange:
+    """Preenche as ordens ao último preço do armazém de ticks (Paper Trading)"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def close(self, position, deadline=None):
+        price = self.store.columns(position['market_id'])[1]
+        return (float(price[-1]) if len(price) else position['entry_price']), _now_ms(), 1
+
+
+def close_all(client, positions, workers=WORKERS, budget=BUDGET):
+    """Submete os fechos todos em paralelo; gera um ``Fill`` por posição à medida que terminam.
+
+    Posições sem resposta dentro do orçamento ``budget`` (s) saem com erro
+    (a ordem pode ainda ser executada; um novo fecho reutiliza a mesma
+    chave de idempotência).
+    """
+    positions = list(positions)
+    if not positions:
+        return
+    deadline = time.monotonic() + budget
+    executor = ThreadPoolExecutor(min(workers, len(positions)), thread_name_prefix='close')
+
+    def submit(position):
+        started = time.perf_counter()
+        try:
+            price, ts, attempts = client.close(position, deadline)
+        except Exception as exc:
+            return Fill(position['id'], None, None, None, time.perf_counter() - started, str(exc))
+        return Fill(position['id'], price, ts, attempts, time.perf_counter() - started, None)
+
+    futures = {executor.submit(submit, position): position['id'] for position in positions}
+    try:
+        for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+            yield future.result()
+    except FuturesTimeout:
+        for future, position_id in futures.items():
+            if not future.done():
+                yield Fill(position_id, None, None, None, budget, 'sem resposta dentro do orçamento')
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def write_closes(conn, positions, fills, reason=EXIT_REASON):
+    """Escreve os fills numa única transação; retorna o número de trades fechados"""
+    positions = {position['id']: position for position in positions}
+    rows = []
+    for fill in fills:
+        if fill.error is not None:
+            continue
+        position = positions[fill.position_id]
+        sign = 1.0 if position['direction'] == 'LONG' else -1.0
+        quantity = position['quantity'] or position['size_usd'] / position['entry_price']
+        pnl = sign * (fill.price - position['entry_price']) * quantity
+        size = position['entry_price'] * quantity
+        rows.append((fill.price, _format_ms(fill.ts), db.STATUS_CLOSED, pnl,
+                     pnl / size * 100 if size else 0.0, reason, fill.position_id, db.STATUS_OPEN))
+    with conn:
+        cursor = conn.executemany(
+            'UPDATE trades SET exit_price = ?, exit_time = ?, status = ?, pnl = ?, pnl_pct = ?, '
+            'exit_reason = ? WHERE id = ? AND status = ?', rows)
+    return cursor.rowcount
+
+
+def flatten(conn, client, workers=WORKERS, budget=BUDGET, on_fill=None):
+    """Fecha todas as posições abertas da DB; retorna a lista de fills"""
+    positions = [dict(row) for row in db.fetch_open_trades(conn)]
+    fills = []
+    for fill in close_all(client, positions, workers, budget):
+        fills.append(fill)
+        if on_fill is not None:
+            on_fill(fill, len(fills), len(positions))
+    write_closes(conn, positions, fills)
+    return fills
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fecho de emergência das posições abertas')
+    sub = parser.add_subparsers(dest='command', required=True)
+    close = sub.add_parser('close-all', help='fecha todas as posições abertas')
+    close.add_argument('--url', default=EXCHANGE_URL,
+                       help='URL da exchange (sem URL: preços do armazém de ticks)')
+    close.add_argument('--workers', type=int, default=WORKERS)
+    close.add_argument('--budget', type=float, default=BUDGET, help='orçamento total (s)')
+    close.add_argument('--db', default=db.DB_PATH)
+    args = parser.parse_args(argv)
+
+    client = ExchangeClient(args.url, pool_size=args.workers) if args.url else PaperExchange(ticks.TickStore())
+    conn = db.connect(args.db)
+    started = time.perf_counter()
+
+    def progress(fill, done, total):
+        status = f'{fill.price:.4f} ({fill.attempts}x)' if fill.error is None else f'ERRO {fill.error}'
+        print(f'[{done}/{total}] {fill.position_id}: {status}', file=sys.stderr)
+
+    fills = flatten(conn, client, args.workers, args.budget, progress)
+    failed = sum(fill.error is not None for fill in fills)
+    print(f'{len(fills) - failed}/{len(fills)} posições fechadas em '
+          f'{time.perf_counter() - started:.2f}s', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
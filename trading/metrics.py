@@ -0,0 +1,239 @@
+"""Instrumentação do dashboard: spans de tempo agregados em histogramas.
+
+Cada span mede um troço (query, getter, construção de um gráfico, página) e
+regista a duração num histograma com buckets fixos, juntamente com o número
+de linhas que processou. Os agregados podem ser lidos como tabela (painel de
+debug) ou exportados no formato de texto do Prometheus.
+
+Com a instrumentação desligada ``span()`` devolve um objeto partilhado que
+não faz nada e ``timed`` chama a função diretamente, por isso o custo fica
+reduzido a um teste de atributo por chamada.
+
+Variáveis de ambiente: ``TRADING_METRICS=1`` liga a instrumentação ao
+arrancar; ``TRADING_METRICS_FILE`` indica o ficheiro .prom a escrever (por
+exemplo para o textfile collector do node_exporter).
+"""
+import functools
+import os
+import threading
+import time
+from collections.abc import Sized
+from pathlib import Path
+
+# Limites superiores dos buckets, em segundos (como nos clientes Prometheus)
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRIC_PREFIX = 'trading_dashboard'
+
+
+class Histogram:
+    """Histograma cumulativo de durações de um span"""
+
+    __slots__ = ('counts', 'count', 'total', 'max', 'last', 'rows')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+        self.rows = 0
+
+    def observe(self, seconds, rows=None):
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.last = seconds
+        if rows:
+            self.rows += rows
+
+    def quantile(self, q):
+        """Quantil estimado por interpolação linear dentro do bucket"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(BUCKETS):
+            if seen + self.counts[i] >= target:
+                fraction = (target - seen) / self.counts[i]
+                return min(lower + (bound - lower) * fraction, self.max)
+            seen += self.counts[i]
+            lower = bound
+        return self.max
+
+
+class _Span:
+    __slots__ = ('registry', 'name', 'rows', 'started')
+
+    def __init__(self, registry, name, rows=None):
+        self.registry = registry
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.started, self.rows)
+        return False
+
+
+class _NoopSpan:
+    """Span usado com a instrumentação desligada; ignora tudo"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    @property
+    def rows(self):
+        return None
+
+    @rows.setter
+    def rows(self, value):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Registry:
+    """Conjunto de histogramas por nome de span"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def span(self, name, rows=None):
+        """Context manager que mede o bloco; atribuir ``.rows`` regista as linhas"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return _Span(self, name, rows)
+
+    def observe(self, name, seconds, rows=None):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds, rows)
+
+    def timed(self, name, rows=None):
+        """Decorador: mede cada chamada e conta as linhas do resultado.
+
+        ``rows`` é uma função aplicada ao resultado (por omissão ``count_rows``).
+        """
+        count = rows or count_rows
+
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                started = time.perf_counter()
+                result = func(*args, **kwargs)
+                self.observe(name, time.perf_counter() - started, count(result))
+                return result
+            return wrapper
+        return decorator
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+    def summary(self):
+        """Uma linha por span (tempos em ms), ordenadas pelo tempo total"""
+        with self._lock:
+            items = list(self._histograms.items())
+        rows = [
+            {
+                'span': name,
+                'count': h.count,
+                'total_ms': h.total * 1000,
+                'mean_ms': h.total / h.count * 1000,
+                'p50_ms': h.quantile(0.5) * 1000,
+                'p95_ms': h.quantile(0.95) * 1000,
+                'max_ms': h.max * 1000,
+                'last_ms': h.last * 1000,
+                'rows': h.rows,
+            }
+            for name, h in items if h.count
+        ]
+        return sorted(rows, key=lambda row: row['total_ms'], reverse=True)
+
+    def to_prometheus(self):
+        """Histogramas no formato de texto do Prometheus (versão 0.0.4)"""
+        duration = f'{METRIC_PREFIX}_span_duration_seconds'
+        rows_total = f'{METRIC_PREFIX}_span_rows_total'
+        with self._lock:
+            items = sorted(self._histograms.items())
+            lines = [
+                f'# HELP {duration} Duração dos spans instrumentados.',
+                f'# TYPE {duration} histogram',
+            ]
+            for name, h in items:
+                label = _escape(name)
+                cumulative = 0
+                for bound, n in zip(BUCKETS, h.counts):
+                    cumulative += n
+                    lines.append(f'{duration}_bucket{{span="{label}",le="{bound}"}} {cumulative}')
+                lines.append(f'{duration}_bucket{{span="{label}",le="+Inf"}} {h.count}')
+                lines.append(f'{duration}_sum{{span="{label}"}} {h.total!r}')
+                lines.append(f'{duration}_count{{span="{label}"}} {h.count}')
+            lines += [
+                f'# HELP {rows_total} Linhas processadas pelos spans instrumentados.',
+                f'# TYPE {rows_total} counter',
+            ]
+            lines += [f'{rows_total}{{span="{_escape(name)}"}} {h.rows}' for name, h in items]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Escreve o ficheiro .prom de forma atómica (escreve e renomeia)"""
+        path = Path(path)
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_text(self.to_prometheus(), encoding='utf-8')
+        os.replace(tmp, path)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def count_rows(result):
+    """Número de linhas de um resultado típico de getter.
+
+    Listas, DataFrames e arrays contam pelo comprimento; tuplos
+    (linhas, cursor) pelo primeiro elemento; dicts de colunas pelo
+    comprimento das colunas e os restantes dicts pelo número de chaves;
+    outros objetos não contam linhas.
+    """
+    if result is None:
+        return 0
+    if isinstance(result, tuple):
+        return count_rows(result[0]) if result else 0
+    if isinstance(result, dict):
+        for value in result.values():
+            if isinstance(value, Sized) and not isinstance(value, (str, dict)):
+                return len(value)
+        return len(result)
+    if isinstance(result, Sized) and not isinstance(result, str):
+        return len(result)
+    return 0
+
+
+REGISTRY = Registry(enabled=os.environ.get('TRADING_METRICS', '') not in ('', '0'))
+EXPORT_PATH = os.environ.get('TRADING_METRICS_FILE')
+
+span = REGISTRY.span
+timed = REGISTRY.timed
@@ -0,0 +1,91 @@
+"""Mark-to-market vetorizado das posições abertas.
+
+As posições ficam num ``PositionBook`` em forma de struct-of-arrays (preço
+de entrada, tamanho, quantidade, direção e índices de mercado e
+estratégia). Reavaliar o livro inteiro com um vetor de preços, um por
+mercado, é uma única passagem NumPy: P&L não realizado por posição,
+exposição por estratégia e por mercado e utilização do limite de perda
+diária.
+"""
+import numpy as np
+
+from trading import ticks
+
+MISSING = '—'  # rótulo das posições sem market_id ou estratégia (colunas NULL)
+
+
+class PositionBook:
+    """Posições abertas como arrays alinhados (uma posição por índice)"""
+
+    def __init__(self, rows):
+        rows = list(rows)
+        self.ids = [row['id'] for row in rows]
+        markets = [MISSING if row['market_id'] is None else row['market_id'] for row in rows]
+        strategies = [MISSING if row['strategy'] is None else row['strategy'] for row in rows]
+        self.markets = sorted(set(markets))
+        self.strategies = sorted(set(strategies))
+        market_index = {market: i for i, market in enumerate(self.markets)}
+        strategy_index = {strategy: i for i, strategy in enumerate(self.strategies)}
+
+        self.market = np.array([market_index[market] for market in markets], dtype=np.int64)
+        self.strategy = np.array([strategy_index[strategy] for strategy in strategies], dtype=np.int64)
+        self.direction = np.array([1.0 if row['direction'] == 'LONG' else -1.0 for row in rows])
+        self.entry_price = np.array([row['entry_price'] or 0.0 for row in rows], dtype=np.float64)
+        self.size = np.array([row['size_usd'] or 0.0 for row in rows], dtype=np.float64)
+        quantity = np.array([row['quantity'] or 0.0 for row in rows], dtype=np.float64)
+        # Sem quantidade na DB assume-se size_usd / entry_price
+        derived = np.divide(self.size, self.entry_price, out=np.zeros_like(self.size),
+                            where=self.entry_price > 0)
+        self.quantity = np.where(quantity > 0, quantity, derived)
+        # Epoch em segundos; as datas da DB são UTC sem fuso (ver ticks.to_millis)
+        self.entry_ts = np.array([
+            ticks.to_millis(row['entry_time']) / 1000 if row['entry_time'] else np.nan
+            for row in rows
+        ])
+        # Preço implícito no pnl_pct da DB, usado quando o mercado não tem preço
+        pnl_pct = np.array([row['pnl_pct'] or 0.0 for row in rows], dtype=np.float64)
+        self.fallback_price = self.entry_price * (1 + self.direction * pnl_pct / 100)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def mark(book, prices, daily_realized=0.0, daily_loss_limit=0.0):
+    """Reavalia todas as posições com ``prices`` (um preço por ``book.markets``).
+
+    Preços NaN usam o preço implícito da DB. Retorna um dict com arrays por
+    posição (``price``, ``unrealized``, ``pnl_pct``, ``value``), agregados por
+    estratégia e mercado e os totais, incluindo a perda diária (realizada +
+    não realizada) e a sua utilização face a ``daily_loss_limit``.
+    """
+    n_markets = len(book.markets)
+    n_strategies = len(book.strategies)
+    prices = np.asarray(prices, dtype=np.float64)
+    if prices.shape != (n_markets,):
+        raise ValueError(f'esperados {n_markets} preços, recebidos {prices.shape}')
+
+    price = prices[book.market]
+    price = np.where(np.isnan(price), book.fallback_price, price)
+    unrealized = book.direction * (price - book.entry_price) * book.quantity
+    pnl_pct = np.divide(unrealized, book.size, out=np.zeros_like(unrealized),
+                        where=book.size > 0) * 100
+    value = price * book.quantity
+
+    total_unrealized = float(unrealized.sum())
+    daily_loss = max(0.0, -(daily_realized + total_unrealized))
+    return {
+        'price': price,
+        'unrealized': unrealized,
+        'pnl_pct': pnl_pct,
+        'value': value,
+        'strategy_exposure': np.bincount(book.strategy, weights=value, minlength=n_strategies),
+        'strategy_unrealized': np.bincount(book.strategy, weights=unrealized, minlength=n_strategies),
+        'strategy_positions': np.bincount(book.strategy, minlength=n_strategies),
+        'market_exposure': np.bincount(book.market, weights=value, minlength=n_markets),
+        'market_unrealized': np.bincount(book.market, weights=unrealized, minlength=n_markets),
+        'unrealized_total': total_unrealized,
+        'exposure_total': float(value.sum()),
+        'daily_loss': daily_loss,
+        'daily_loss_limit': daily_loss_limit,
+        'daily_loss_used': daily_loss / daily_loss_limit if daily_loss_limit > 0 else 0.0,
+    }
@@ -0,0 +1,315 @@
+"""Notificações assíncronas (Discord e email) com agregação e backpressure.
+
+``Notifier.notify`` só acrescenta o alerta à fila de cada canal e retorna
+logo: nunca faz I/O nem espera pela rede, por isso pode ser chamado do
+ciclo de trading ou de um run do dashboard. Cada canal (``DiscordSink``,
+``EmailSink``) tem a sua fila limitada e a sua thread de envio
+(``Dispatcher``); um canal lento ou em rate limit não atrasa os outros.
+
+A thread de envio junta os alertas que chegam numa janela de
+``BATCH_WINDOW`` segundos numa só mensagem (os mais graves primeiro, até
+``MAX_BATCH``; com mais alertas em espera a janela é dispensada). Com a
+fila cheia, um alerta novo toma o lugar do mais antigo de prioridade
+inferior ou, se não houver nenhum, é descartado; os INFO em espera que não
+cabem na mensagem também saem da fila. Os alertas que saem assim entram
+numa linha de resumo da mensagem seguinte (contagem por título).
+
+O Discord limita os webhooks: um 429 traz ``retry_after`` e os cabeçalhos
+``X-RateLimit-Remaining``/``X-RateLimit-Reset-After`` dizem quanto esperar
+até ao próximo envio. O dispatcher respeita os dois (os alertas entretanto
+recebidos juntam-se na mensagem seguinte) e, noutras falhas, repete com
+backoff exponencial até ``RETRIES`` vezes.
+
+O email usa SMTP configurado por variáveis de ambiente
+(``TRADING_SMTP_HOST``, ``TRADING_SMTP_PORT``, ``TRADING_SMTP_USER``,
+``TRADING_SMTP_PASSWORD``, ``TRADING_ALERT_EMAIL``).
+"""
+import os
+import threading
+import time
+from collections import Counter, deque, namedtuple
+
+from trading import settings
+
+INFO, WARNING, CRITICAL = 0, 1, 2
+LEVEL_ICONS = {INFO: '🔵', WARNING: '🟠', CRITICAL: '🔴'}
+
+Alert = namedtuple('Alert', 'ts level title message')
+
+QUEUE_SIZE = 1000     # alertas em espera por canal
+BATCH_WINDOW = 1.0    # s de agregação depois do primeiro alerta
+MAX_BATCH = 20        # alertas por mensagem
+SUMMARY_TITLES = 100  # títulos distintos contados no resumo (os restantes vão para "outros")
+RETRIES = 5
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+DISCORD_LIMIT = 2000  # caracteres por mensagem
+
+
+class RateLimited(Exception):
+    """O canal pediu para esperar ``retry_after`` segundos"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'rate limit: {retry_after:.2f}s')
+        self.retry_after = retry_after
+
+
+def format_batch(alerts, notes=(), limit=None):
+    """Texto de uma mensagem: uma linha por alerta e as notas de resumo/descartes"""
+    lines = [f'{LEVEL_ICONS[alert.level]} **{alert.title}**' + (f' — {alert.message}' if alert.message else '')
+             for alert in alerts]
+    text = '\n'.join([*lines, *notes])
+    if limit and len(text) > limit:
+        text = text[:limit - 1] + '…'
+    return text
+
+
+class DiscordSink:
+    """Webhook do Discord"""
+
+    name = 'discord'
+
+    def __init__(self, url, timeout=5.0, username='Polymarket Bot'):
+        self.url = url
+        self.timeout = timeout
+        self.username = username
+        # requests só é importado quando há um webhook configurado
+        import requests
+        self.session = requests.Session()
+
+    def send(self, alerts, notes=()):
+        """Envia uma mensagem; retorna os segundos a esperar até ao próximo envio.
+
+        Qualquer resposta 2xx conta como entregue (o webhook responde 204 sem
+        corpo); um 429 levanta ``RateLimited`` e os outros erros HTTP
+        levantam ``requests.HTTPError``.
+        """
+        response = self.session.post(self.url, timeout=self.timeout, json={
+            'content': format_batch(alerts, notes, DISCORD_LIMIT),
+            'username': self.username,
+        })
+        if response.status_code == 429:
+            try:
+                retry_after = float(response.json()['retry_after'])
+            except (ValueError, KeyError):
+                retry_after = float(response.headers.get('Retry-After', 1.0))
+            raise RateLimited(retry_after)
+        response.raise_for_status()
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            return float(response.headers.get('X-RateLimit-Reset-After', 0.0))
+        return 0.0
+
+
+class EmailSink:
+    """Email por SMTP (STARTTLS quando há utilizador)"""
+
+    name = 'email'
+
+    def __init__(self, host, port, recipients, user=None, password=None, sender=None, timeout=10.0):
+        self.host = host
+        self.port = port
+        self.recipients = recipients
+        self.user = user
+        self.password = password
+        self.sender = sender or user or 'polymarket-bot@localhost'
+        self.timeout = timeout
+
+    @classmethod
+    def from_env(cls):
+        host = os.environ.get('TRADING_SMTP_HOST')
+        recipients = [r.strip() for r in os.environ.get('TRADING_ALERT_EMAIL', '').split(',') if r.strip()]
+        if not host or not recipients:
+            return None
+        return cls(host, int(os.environ.get('TRADING_SMTP_PORT', 587)), recipients,
+                   os.environ.get('TRADING_SMTP_USER'), os.environ.get('TRADING_SMTP_PASSWORD'),
+                   os.environ.get('TRADING_SMTP_FROM'))
+
+    def send(self, alerts, notes=()):
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        first = max(alerts, key=lambda alert: alert.level).title if alerts else 'Resumo'
+        message['Subject'] = f'[Polymarket Bot] {first}' + (f' (+{len(alerts) - 1})' if len(alerts) > 1 else '')
+        message['From'] = self.sender
+        message['To'] = ', '.join(self.recipients)
+        message.set_content(format_batch(alerts, notes).replace('**', ''))
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.user:
+                smtp.starttls()
+                smtp.login(self.user, self.password or '')
+            smtp.send_message(message)
+        return 0.0
+
+
+class Dispatcher:
+    """Fila limitada e thread de envio de um canal"""
+
+    def __init__(self, sink, maxsize=QUEUE_SIZE, window=BATCH_WINDOW, max_batch=MAX_BATCH,
+                 retries=RETRIES, backoff=BACKOFF):
+        self.sink = sink
+        self.maxsize = maxsize
+        self.window = window
+        self.max_batch = max_batch
+        self.retries = retries
+        self.backoff = backoff
+        # Uma fila por nível: o descarte e o resumo são O(1) por alerta
+        self.queues = {level: deque() for level in LEVEL_ICONS}
+        self.size = 0
+        self.overflow = Counter()
+        self.stats = Counter()
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopping = threading.Event()
+        self._deadline = None
+        self._thread = threading.Thread(target=self._run, name=f'notify-{sink.name}', daemon=True)
+        self._thread.start()
+
+    def put(self, alert):
+        """Enfileira um alerta sem bloquear; retorna False se foi descartado"""
+        with self._lock:
+            if self.size >= self.maxsize:
+                self.stats['dropped'] += 1
+                lower = next((self.queues[level] for level in sorted(self.queues)
+                              if level < alert.level and self.queues[level]), None)
+                if lower is None:
+                    self._summarize(alert)
+                    return False
+                self._summarize(lower.popleft())
+                self.size -= 1
+            self.queues[alert.level].append(alert)
+            self.size += 1
+            self.stats['queued'] += 1
+            self._wake.notify()
+        return True
+
+    def _summarize(self, alert):
+        """Conta um alerta que sai da fila sem ser enviado; chamado com o lock"""
+        if alert.title in self.overflow or len(self.overflow) < SUMMARY_TITLES:
+            self.overflow[alert.title] += 1
+        else:
+            self.overflow['outros'] += 1
+
+    def _take(self):
+        """Próxima mensagem: (alertas, notas); chamado com o lock"""
+        alerts = []
+        for level in sorted(self.queues, reverse=True):
+            queue = self.queues[level]
+            while queue and len(alerts) < self.max_batch:
+                alerts.append(queue.popleft())
+        # Backpressure: os INFO que não couberam vão para o resumo
+        infos = self.queues[INFO]
+        self.stats['summarized'] += len(infos)
+        while infos:
+            self._summarize(infos.popleft())
+        notes = []
+        if self.overflow:
+            top = ', '.join(f'{title} ×{count}' for title, count in self.overflow.most_common(5))
+            notes.append(f'ℹ️ +{sum(self.overflow.values())} alertas resumidos: {top}')
+            self.overflow.clear()
+        self.size = sum(len(queue) for queue in self.queues.values())
+        alerts.sort(key=lambda alert: alert.ts)
+        return alerts, notes
+
+    def _wait(self, seconds):
+        """Espera interrompível pelo fecho (depois do fecho só até ao prazo)"""
+        if self._stopping.is_set():
+            seconds = min(seconds, max(self._deadline - time.monotonic(), 0.0))
+            time.sleep(seconds)
+        else:
+            self._stopping.wait(seconds)
+
+    def _send(self, alerts, notes):
+        """Envia com retries; retorna o instante (monotonic) do próximo envio permitido"""
+        attempt = 0
+        while True:
+            try:
+                wait = self.sink.send(alerts, notes)
+            except RateLimited as exc:
+                # 429 não gasta retries: a mensagem espera o tempo pedido
+                self.stats['rate_limited'] += 1
+                delay = exc.retry_after
+            except Exception as exc:
+                self.stats['errors'] += 1
+                self.last_error = f'{type(exc).__name__}: {exc}'
+                if attempt >= self.retries:
+                    self.stats['failed'] += len(alerts)
+                    return time.monotonic()
+                delay = min(self.backoff * 2 ** attempt, MAX_BACKOFF)
+                attempt += 1
+            else:
+                self.stats['messages'] += 1
+                self.stats['sent'] += len(alerts)
+                return time.monotonic() + wait
+            if self._stopping.is_set() and time.monotonic() + delay > self._deadline:
+                self.stats['failed'] += len(alerts)
+                return time.monotonic()
+            self._wait(delay)
+
+    def _run(self):
+        next_send = 0.0
+        while True:
+            with self._lock:
+                while not self.size and not self.overflow and not self._stopping.is_set():
+                    self._wake.wait()
+                if not self.size and not self.overflow:
+                    return
+                # Janela de agregação só quando ainda não há uma mensagem cheia
+                window = self.window if self.size < self.max_batch else 0.0
+            self._wait(max(window, next_send - time.monotonic()))
+            with self._lock:
+                alerts, notes = self._take()
+            next_send = self._send(alerts, notes)
+
+    def close(self, timeout=5.0):
+        """Envia o que está em espera (até ``timeout`` s) e pára a thread"""
+        self._deadline = time.monotonic() + timeout
+        self._stopping.set()
+        with self._lock:
+            self._wake.notify()
+        self._thread.join(timeout)
+
+
+class Notifier:
+    """Distribui cada alerta pelos canais ativos"""
+
+    def __init__(self, sinks=(), **options):
+        self.dispatchers = [Dispatcher(sink, **options) for sink in sinks]
+
+    @property
+    def channels(self):
+        return [dispatcher.sink.name for dispatcher in self.dispatchers]
+
+    def notify(self, title, message='', level=INFO):
+        """Enfileira um alerta em todos os canais (nunca bloqueia)"""
+        alert = Alert(time.time(), level, title, message)
+        for dispatcher in self.dispatchers:
+            dispatcher.put(alert)
+
+    def stats(self):
+        return {dispatcher.sink.name: dict(dispatcher.stats, error=dispatcher.last_error)
+                for dispatcher in self.dispatchers}
+
+    def close(self, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        for dispatcher in self.dispatchers:
+            dispatcher.close(max(deadline - time.monotonic(), 0.0))
+
+
+def from_settings(path=settings.SETTINGS_PATH, **options):
+    """Notifier com os canais ativos nas configurações (nenhum canal = alertas ignorados)"""
+    return from_config(settings.load_notifications(path), **options)
+
+
+def from_config(config, **options):
+    """Notifier para um dict de ``settings.load_notifications``"""
+    sinks = []
+    webhook = os.environ.get('TRADING_DISCORD_WEBHOOK') or config['discord_webhook']
+    if config['discord'] and webhook:
+        sinks.append(DiscordSink(webhook))
+    if config['email']:
+        email = EmailSink.from_env()
+        if email is not None:
+            sinks.append(email)
+    return Notifier(sinks, **options)
@@ -0,0 +1,195 @@
+"""Barras OHLCV em várias resoluções, mantidas incrementalmente a partir dos ticks.
+
+Para cada mercado e resolução (1m, 5m, 1h, 1d) as barras completas ficam
+em colunas memory-mapped dentro da pasta do mercado no armazém de ticks
+(``bars/<resolução>/``), no mesmo formato append-only dos ticks. Uma barra
+só é escrita quando chega um tick de um intervalo posterior; a barra em
+curso é calculada na leitura a partir dos ticks desde o seu início.
+
+O progresso não precisa de estado próprio: os ticks já agregados são os
+anteriores ao fim da última barra escrita, por isso ``update`` retoma
+sempre no sítio certo, mesmo depois de uma escrita interrompida. O
+supervisor chama ``update`` para todos os mercados a cada
+``supervisor.BARS_INTERVAL`` segundos; o dashboard volta a chamá-lo antes
+de ler, o que só custa os ticks chegados entretanto.
+
+Uso::
+
+    python -m trading.ohlc update [--dir PATH] [MARKET ...]
+    python -m trading.ohlc rebuild [--dir PATH] [MARKET ...]
+"""
+import argparse
+import shutil
+import sys
+from contextlib import contextmanager
+
+import numpy as np
+
+from trading import ticks
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+# Largura de cada resolução em milissegundos, da mais fina para a mais grossa
+RESOLUTIONS = {
+    '1m': 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+BAR_COLUMNS = {
+    'ts': np.dtype('<i8'),
+    'open': np.dtype('<f8'),
+    'high': np.dtype('<f8'),
+    'low': np.dtype('<f8'),
+    'close': np.dtype('<f8'),
+    'volume': np.dtype('<f8'),
+    'ticks': np.dtype('<i8'),
+}
+
+
+def aggregate(ts, price, volume, width):
+    """Agrega ticks ordenados em barras de ``width`` ms (só intervalos com ticks)"""
+    if not len(ts):
+        return {name: np.zeros(0, dtype=dtype) for name, dtype in BAR_COLUMNS.items()}
+    buckets = np.asarray(ts) // width
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(ts)) - 1
+    price = np.asarray(price)
+    return {
+        'ts': buckets[starts] * width,
+        'open': price[starts],
+        'high': np.maximum.reduceat(price, starts),
+        'low': np.minimum.reduceat(price, starts),
+        'close': price[ends],
+        'volume': np.add.reduceat(np.asarray(volume), starts),
+        'ticks': np.diff(np.append(starts, len(ts))),
+    }
+
+
+class BarStore:
+    """Barras OHLCV dos mercados de um ``ticks.TickStore``"""
+
+    def __init__(self, store):
+        self.store = store
+        self._files = {}
+
+    def _bars(self, market_id, resolution):
+        key = (market_id, resolution)
+        files = self._files.get(key)
+        if files is None:
+            directory = self.store.market_dir(market_id) / 'bars' / resolution
+            files = self._files[key] = ticks.ColumnFiles(directory, BAR_COLUMNS)
+        return files
+
+    @contextmanager
+    def _locked(self, market_id):
+        """Lock exclusivo por mercado entre processos (bots e dashboard)"""
+        directory = self.store.market_dir(market_id) / 'bars'
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _consumed(self, market_id, resolution, files):
+        """Índice do primeiro tick ainda não incluído numa barra completa"""
+        n = files.repair()
+        if not n:
+            return 0
+        end = int(files.column('ts')[n - 1]) + RESOLUTIONS[resolution]
+        return self.store.locate(market_id, start=end)[0]
+
+    def update(self, market_id):
+        """Escreve as barras completadas pelos ticks novos; retorna quantas"""
+        written = 0
+        with self._locked(market_id):
+            ts, price, volume = self.store.columns(market_id)
+            if not len(ts):
+                return 0
+            for resolution, width in RESOLUTIONS.items():
+                files = self._bars(market_id, resolution)
+                first = self._consumed(market_id, resolution, files)
+                # A barra do último tick continua aberta
+                open_start = (int(ts[-1]) // width) * width
+                last = self.store.locate(market_id, start=open_start)[0]
+                if last <= first:
+                    continue
+                bars = aggregate(ts[first:last], price[first:last], volume[first:last], width)
+                files.append(bars)
+                written += len(bars['ts'])
+        return written
+
+    def rebuild(self, market_id):
+        """Apaga e volta a calcular todas as barras do mercado"""
+        with self._locked(market_id):
+            for resolution in RESOLUTIONS:
+                self._bars(market_id, resolution).close()
+                shutil.rmtree(self.store.market_dir(market_id) / 'bars' / resolution,
+                              ignore_errors=True)
+        return self.update(market_id)
+
+    def bars(self, market_id, resolution, start=None, end=None):
+        """Barras com início entre ``start`` e ``end`` (ms), incluindo a barra em curso.
+
+        Retorna um dict de colunas; as barras completas são lidas dos
+        memmaps e só a barra em curso é agregada a partir dos ticks.
+        """
+        width = RESOLUTIONS[resolution]
+        files = self._bars(market_id, resolution)
+        columns = files.columns()
+        stored = columns['ts']
+        i = 0 if start is None else int(np.searchsorted(stored, (start // width) * width, 'left'))
+        j = len(stored) if end is None else int(np.searchsorted(stored, end, 'right'))
+        result = {name: column[i:j] for name, column in columns.items()}
+
+        # Ticks posteriores à última barra escrita: a barra em curso (ou mais,
+        # se ninguém correu update desde então)
+        bounds = [int(stored[-1]) + width] if len(stored) else []
+        if start is not None:
+            bounds.append((start // width) * width)
+        tail_start = max(bounds) if bounds else None
+        if end is None or tail_start is None or tail_start <= end:
+            lo, hi = self.store.locate(market_id, tail_start, end)
+            t, p, v = (column[lo:hi] for column in self.store.columns(market_id))
+            tail = aggregate(t, p, v, width)
+            if len(tail['ts']):
+                result = {name: np.concatenate((result[name], tail[name])) for name in BAR_COLUMNS}
+        return result
+
+    def close(self):
+        for files in self._files.values():
+            files.close()
+        self._files.clear()
+
+
+def pick_resolution(start, end, min_bars):
+    """Resolução mais grossa que ainda dá pelo menos ``min_bars`` barras em [start, end]"""
+    span = max(end - start, 0)
+    for resolution, width in reversed(RESOLUTIONS.items()):
+        if span // width >= min_bars:
+            return resolution
+    return next(iter(RESOLUTIONS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Barras OHLCV a partir do armazém de ticks')
+    parser.add_argument('command', choices=['update', 'rebuild'])
+    parser.add_argument('markets', nargs='*', help='mercados (todos por omissão)')
+    parser.add_argument('--dir', default=ticks.TICKS_DIR, help='pasta do armazém de ticks')
+    args = parser.parse_intermixed_args(argv)
+
+    bar_store = BarStore(ticks.TickStore(args.dir))
+    for market in args.markets or bar_store.store.markets():
+        if args.command == 'update':
+            written = bar_store.update(market)
+        else:
+            written = bar_store.rebuild(market)
+        print(f'{market}: {written} barras escritas')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,161 @@
+"""Paper trading de uma estratégia sobre o armazém de ticks.
+
+Cada ciclo (``step``) olha para o último tick de cada mercado: o motor de
+risco (``risk.RiskEngine``) recebe o preço e devolve as posições a fechar
+(stop-loss, take-profit, time-stop, perda diária) e o sinal da estratégia
+(os mesmos de ``backtest``) sobre os últimos pontos decide as entradas.
+As entradas que o motor recusa (tamanho, posições em simultâneo, perda
+diária) não chegam à DB. Os trades são escritos na tabela ``trades`` como
+os dos bots, com a hora de relógio, através de um ``journal.TradeJournal``
+escrito numa transação no fim de cada ciclo. Entradas, saídas e a
+paragem por perda diária geram alertas no ``notifier`` (que nunca bloqueia).
+"""
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from trading import backtest, db, journal, notify, risk, settings, ticks
+
+# Intervalo (s) entre releituras da lista de mercados e dos limites
+REFRESH_INTERVAL = 30.0
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _format_ms(ms):
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+class PaperTrader:
+    """Estado de uma estratégia em paper trading (um por processo worker)"""
+
+    def __init__(self, strategy, db_path=db.DB_PATH, ticks_dir=ticks.TICKS_DIR, bankroll=1000.0,
+                 settings_path=settings.SETTINGS_PATH, notifier=None):
+        self.strategy = strategy
+        self.notifier = notifier or notify.Notifier()
+        self.params = backtest.DEFAULT_PARAMS[strategy]
+        self.signal = backtest.SIGNALS[strategy]
+        # Pontos suficientes para o sinal do último ponto e do anterior
+        self.window = max(int(v) for v in self.params.values()) + 2
+        self.settings_path = settings_path
+        self.conn = db.connect(db_path)
+        db.init_schema(self.conn)
+        # Repõe o spool de um worker que morreu antes de ler as posições abertas
+        self.journal = journal.TradeJournal(db_path, name=f'paper-{strategy}', background=False)
+        self.store = ticks.TickStore(ticks_dir)
+        self.engine = risk.RiskEngine(settings.load_risk_limits(settings_path), bankroll)
+        self.markets = []
+        self.last_seen = {}
+        self.last_signal = {}
+        self._refreshed = 0.0
+        self._load_open()
+
+    def _load_open(self):
+        """Posições abertas desta estratégia (depois de um restart) entram no motor"""
+        rows = self.conn.execute(
+            'SELECT id, market_id, direction, entry_price, size_usd, quantity, entry_time '
+            'FROM trades WHERE status = ? AND strategy = ? ORDER BY entry_time',
+            (db.STATUS_OPEN, self.strategy)).fetchall()
+        for row in rows:
+            quantity = row['quantity'] or row['size_usd'] / row['entry_price']
+            self.engine.on_open(ticks.to_millis(row['entry_time']), row['id'], row['market_id'],
+                                self.strategy, row['direction'], row['entry_price'], quantity)
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now - self._refreshed < REFRESH_INTERVAL:
+            return
+        self._refreshed = now
+        self.markets = self.store.markets()
+        self.engine.set_limits(settings.load_risk_limits(self.settings_path))
+        self._sync_closed()
+
+    def _sync_closed(self):
+        """Posições fechadas fora do worker (ex.: fecho de emergência) saem do motor"""
+        open_ids = {row[0] for row in self.conn.execute(
+            'SELECT id FROM trades WHERE status = ? AND strategy = ?', (db.STATUS_OPEN, self.strategy))}
+        for position_id in [p for p in self.engine.positions if p not in open_ids]:
+            row = self.conn.execute('SELECT exit_price FROM trades WHERE id = ?', (position_id,)).fetchone()
+            position = self.engine.positions[position_id]
+            price = row[0] if row and row[0] is not None else self.engine.markets[position.market].price
+            self.engine.on_close(_now_ms(), position_id, price)
+
+    def step(self):
+        """Um ciclo sobre todos os mercados; retorna o número de trades abertos ou fechados"""
+        self._refresh()
+        changed = 0
+        now = _now_ms()
+        halted = self.engine.halted
+        for market_id in self.markets:
+            ts, price, _ = self.store.columns(market_id)
+            if not len(ts) or self.last_seen.get(market_id) == ts[-1]:
+                continue
+            self.last_seen[market_id] = ts[-1]
+            current = float(price[-1])
+            for instruction in self.engine.on_price(now, market_id, current):
+                changed += self._close(instruction)
+            if len(price) < self.window:
+                continue
+            signal = self.signal(np.asarray(price[-self.window:], dtype=np.float64), **self.params)
+            # Entra no início de um sinal, mesmo que tenham chegado vários ticks desde o
+            # último ciclo; no primeiro ciclo um sinal já ligado não conta como início
+            previous = self.last_signal.get(market_id, signal[-2])
+            self.last_signal[market_id] = signal[-1]
+            if signal[-1] != 0 and signal[-1] != previous and not self._holding(market_id):
+                changed += self._open(now, market_id, int(signal[-1]), current)
+        # Time-stops vencem mesmo sem ticks novos
+        for instruction in self.engine.on_clock(now):
+            changed += self._close(instruction)
+        self.journal.flush()
+        if self.engine.halted and not halted:
+            self.notifier.notify(f'{self.strategy}: perda diária atingida',
+                                 f'${self.engine.daily_loss:,.2f} de ${self.engine.daily_loss_limit:,.2f}; '
+                                 'entradas suspensas até amanhã', notify.CRITICAL)
+        return changed
+
+    def _holding(self, market_id):
+        return any(p.market == market_id for p in self.engine.positions.values())
+
+    def _open(self, now, market_id, direction, price):
+        position_id = f'{self.strategy}-{market_id}-{now}'
+        size = self.engine.bankroll * self.engine.limits['max_position_pct'] / 100
+        side = 'LONG' if direction > 0 else 'SHORT'
+        changed = 0
+        rejected = False
+        for instruction in self.engine.on_open(now, position_id, market_id, self.strategy, side,
+                                               price, size / price):
+            if instruction.position_id == position_id:
+                rejected = True
+            else:
+                changed += self._close(instruction)
+        if rejected:
+            # Recusada pelos limites: sai do motor sem nunca chegar à DB
+            self.engine.on_close(now, position_id, price)
+            return changed
+        self.journal.record_open(position_id, market_id, self.strategy, side, price, size,
+                                 size / price, _format_ms(now))
+        self.notifier.notify(f'{self.strategy} abriu {side} em {market_id}', f'{price:.4f} · ${size:,.2f}')
+        return changed + 1
+
+    def _close(self, instruction):
+        position = self.engine.positions.get(instruction.position_id)
+        if position is None:
+            return 0
+        price = instruction.price
+        pnl = position.sign * (price - position.entry) * position.quantity
+        size = position.entry * position.quantity
+        self.journal.record_close(position.id, price, _format_ms(instruction.ts), pnl,
+                                  pnl / size * 100 if size else 0.0, instruction.reason)
+        level = notify.WARNING if instruction.reason in ('stop_loss', 'daily_loss') else notify.INFO
+        self.notifier.notify(f'{self.strategy} fechou {position.market} ({instruction.reason})',
+                             f'{price:.4f} · P&L ${pnl:+,.2f}', level)
+        self.engine.on_close(instruction.ts, position.id, price)
+        return 1
+
+    def close(self):
+        self.journal.close()
+        self.store.close()
+        self.conn.close()
@@ -0,0 +1,223 @@
+"""Retenção da DB dos bots: arquivo mensal, compactação e estatísticas.
+
+A DB quente fica só com as posições abertas e os trades fechados nos
+últimos ``hot_days`` dias (``settings.load_retention``); os restantes vão
+para os arquivos mensais de ``trading.archive``, que as leituras do
+histórico anexam quando precisam. Assim a DB quente mantém poucos MB e
+fica inteira na page cache do sistema.
+
+Cada lote (fechado numa mudança de exit_time) é primeiro copiado para o
+arquivo do mês (``INSERT OR IGNORE``, um commit por ficheiro) e só depois
+apagado da DB quente, na mesma transação que avança a marca de arquivo;
+repetir um lote interrompido não duplica nada. Só saem trades já
+incorporados nos rollups (antes do watermark), para que ``daily_metrics``
+e ``strategy_metrics`` continuem a cobrir o histórico todo.
+
+Depois do arquivo a DB quente é compactada: as páginas livres voltam ao
+sistema com ``PRAGMA incremental_vacuum`` em passos curtos (o lock de
+escrita é largado entre passos), seguido de ``ANALYZE`` e de um checkpoint
+que trunca o WAL. Se a DB continuar acima de ``max_hot_mb`` a janela é
+encurtada para metade até caber (mínimo um dia).
+
+O vacuum incremental precisa de ``auto_vacuum = INCREMENTAL``, que numa DB
+existente só se liga com um ``VACUUM`` completo: reescreve a DB inteira
+com o lock de escrita, por isso só corre quando pedido na CLI
+(``run --vacuum``), nunca a partir do supervisor. Até lá a manutenção
+arquiva e atualiza as estatísticas, mas o ficheiro não encolhe.
+
+O supervisor corre ``maintain`` a cada ``interval_minutes`` (a primeira
+vez só ``supervisor.FIRST_MAINTENANCE_DELAY`` depois de arrancar); também
+há CLI::
+
+    python -m trading.retention run [--db PATH] [--days 30] [--max-mb 64] [--vacuum]
+    python -m trading.retention status [--db PATH]
+"""
+import argparse
+import itertools
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from trading import archive, db, rollups, settings
+
+BATCH_SIZE = 5000
+VACUUM_STEP = 256  # páginas por passo do incremental_vacuum
+AUTO_VACUUM_INCREMENTAL = 2
+
+COLUMNS = db.TRADE_COLUMNS
+
+
+def _cutoff(hot_days, now=None):
+    # As datas da DB são UTC sem fuso
+    now = now or datetime.now(timezone.utc).replace(tzinfo=None)
+    return (now - timedelta(days=hot_days)).isoformat(sep=' ', timespec='seconds')
+
+
+def write_archive(directory, month, rows):
+    """Acrescenta linhas ao arquivo de um mês; retorna as linhas novas"""
+    directory.mkdir(parents=True, exist_ok=True)
+    # Journal clássico: o arquivo é um ficheiro só, anexável em só leitura
+    conn = sqlite3.connect(archive.archive_path(directory, month), timeout=30.0)
+    try:
+        conn.execute('PRAGMA journal_mode=DELETE')
+        db.init_schema(conn)
+        with conn:
+            written = conn.executemany(
+                f'INSERT OR IGNORE INTO trades ({", ".join(COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(COLUMNS))})', rows).rowcount
+        conn.execute('PRAGMA optimize')
+    finally:
+        conn.close()
+    return written
+
+
+def archive_trades(conn, hot_days, now=None, batch_size=BATCH_SIZE):
+    """Move para os arquivos os trades fechados antes da janela quente; retorna quantos"""
+    directory = archive.archive_dir(archive.main_path(conn))
+    # Abaixo do watermark e do primeiro trade ainda por incorporar (fechado
+    # fora de ordem) está tudo nos rollups
+    pending = rollups.pending_since(conn)
+    limit = min(_cutoff(hot_days, now), rollups.watermark(conn)[0] or '', *([pending] if pending else []))
+    closed = f"FROM trades INDEXED BY idx_trades_closed_exit WHERE status = '{db.STATUS_CLOSED}'"
+    moved = 0
+    while True:
+        # O lote acaba no primeiro exit_time a seguir a batch_size trades
+        first = conn.execute(f'SELECT MIN(exit_time) {closed} AND exit_time < ?', (limit,)).fetchone()[0]
+        if first is None:
+            return moved
+        boundary = conn.execute(f'''
+            SELECT exit_time {closed} AND exit_time < ? AND exit_time > ?
+            ORDER BY exit_time LIMIT 1 OFFSET ?
+        ''', (limit, first, batch_size - 1)).fetchone()
+        upper = boundary[0] if boundary else limit
+        rows = conn.execute(f'''
+            SELECT {", ".join(COLUMNS)} {closed} AND exit_time < ?
+            ORDER BY exit_time, id
+        ''', (upper,)).fetchall()
+        for month, group in itertools.groupby(rows, key=lambda row: archive.month_of(row['exit_time'])):
+            write_archive(directory, month, [tuple(row) for row in group])
+        with conn:
+            conn.executemany('DELETE FROM trades WHERE id = ?', [(row['id'],) for row in rows])
+            conn.execute('INSERT OR REPLACE INTO rollup_state (name, exit_time, trade_id) VALUES (?, ?, ?)',
+                         (archive.MARK_NAME, max(archive.mark(conn), upper), ''))
+        moved += len(rows)
+
+
+def size(conn):
+    """(bytes ocupados, bytes em páginas livres) da DB principal"""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    pages = conn.execute('PRAGMA page_count').fetchone()[0]
+    free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return pages * page_size, free * page_size
+
+
+def compact(conn, step=VACUUM_STEP, vacuum=False):
+    """Devolve as páginas livres ao sistema e atualiza as estatísticas do planner.
+
+    Com ``vacuum`` faz o VACUUM completo que liga o auto_vacuum incremental
+    (se ainda não estiver ligado). Retorna um dict com o tamanho antes e
+    depois, se houve VACUUM completo e se o vacuum incremental está ligado.
+    """
+    before, _ = size(conn)
+    incremental = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+    full = vacuum and not incremental
+    if full:
+        conn.execute(f'PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}')
+        conn.execute('VACUUM')
+        incremental = True
+    while incremental and conn.execute('PRAGMA freelist_count').fetchone()[0]:
+        # Pelo execute() o pragma liberta uma página por chamada; o
+        # executescript corre-o até ao fim (cada passo é uma transação)
+        conn.executescript(f'PRAGMA incremental_vacuum({step});')
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    after, _ = size(conn)
+    return {'before': before, 'after': after, 'vacuum': full, 'incremental': incremental}
+
+
+def maintain(db_path=db.DB_PATH, retention=None, bankroll=1000.0, now=None, vacuum=False):
+    """Uma manutenção completa: rollups, arquivo, compactação e limite de tamanho.
+
+    ``vacuum`` permite o VACUUM completo (ver ``compact``); sem vacuum
+    incremental a janela não é encurtada, porque o ficheiro não encolheria.
+    """
+    retention = retention or settings.load_retention()
+    started = time.perf_counter()
+    conn = db.connect(db_path)
+    try:
+        db.init_schema(conn)
+        # Os trades só saem depois de incorporados nos rollups
+        rollups.refresh(conn, bankroll)
+        days = retention['hot_days']
+        moved = archive_trades(conn, days, now)
+        result = compact(conn, vacuum=vacuum)
+        budget = retention['max_hot_mb'] * 1024 * 1024
+        while result['incremental'] and result['after'] > budget and days > 1:
+            days = max(days // 2, 1)
+            moved += archive_trades(conn, days, now)
+            result = compact(conn)
+    finally:
+        conn.close()
+    return {**result, 'moved': moved, 'hot_days': days, 'seconds': time.perf_counter() - started}
+
+
+def status(conn):
+    """Tamanho da DB quente, trades por estado e arquivos existentes"""
+    used, free = size(conn)
+    counts = dict(conn.execute('SELECT status, COUNT(*) FROM trades GROUP BY status').fetchall())
+    directory = archive.archive_dir(archive.main_path(conn))
+    months = archive.list_months(directory)
+    return {
+        'hot_bytes': used,
+        'free_bytes': free,
+        'open': counts.get(db.STATUS_OPEN, 0),
+        'closed': counts.get(db.STATUS_CLOSED, 0),
+        'archived_until': archive.mark(conn) or None,
+        'incremental': conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL,
+        'archives': {month: archive.archive_path(directory, month).stat().st_size for month in months},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Retenção, arquivo e compactação da DB dos bots')
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--db', default=db.DB_PATH, help='caminho da trading_bot.db')
+    parser.add_argument('--days', type=int, help='dias na DB quente (por omissão os das configurações)')
+    parser.add_argument('--max-mb', type=float, help='tamanho máximo da DB quente (MB)')
+    parser.add_argument('--bankroll', type=float, default=1000.0, help='capital inicial (rollups)')
+    parser.add_argument('--vacuum', action='store_true',
+                        help='VACUUM completo para ligar o auto_vacuum incremental (bloqueia a DB)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        retention = settings.load_retention()
+        if args.days is not None:
+            retention['hot_days'] = args.days
+        if args.max_mb is not None:
+            retention['max_hot_mb'] = args.max_mb
+        result = maintain(args.db, retention, args.bankroll, vacuum=args.vacuum)
+        print(f'{result["moved"]} trades arquivados (janela de {result["hot_days"]} dias); '
+              f'DB quente {result["before"] / 2**20:.1f} MB -> {result["after"] / 2**20:.1f} MB'
+              f'{" (VACUUM completo)" if result["vacuum"] else ""} em {result["seconds"]:.1f}s')
+        if not result['incremental']:
+            print('auto_vacuum incremental desligado: o ficheiro não encolhe até correr com --vacuum')
+        return 0
+
+    conn = db.connect(args.db)
+    try:
+        db.init_schema(conn)
+        info = status(conn)
+    finally:
+        conn.close()
+    print(f'DB quente: {info["hot_bytes"] / 2**20:.1f} MB ({info["free_bytes"] / 2**20:.1f} MB livres), '
+          f'{info["open"]} abertos, {info["closed"]} fechados')
+    print(f'arquivado até {info["archived_until"] or "-"}')
+    for month, nbytes in info['archives'].items():
+        print(f'  {month}  {nbytes / 2**20:8.1f} MB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
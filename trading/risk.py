@@ -0,0 +1,332 @@
+"""Motor de limites de risco orientado a eventos.
+
+Consome um fluxo de eventos de fills e de preços e aplica os limites de
+``settings.DEFAULT_RISK_LIMITS``: tamanho máximo por posição, trades em
+simultâneo, perda diária, stop-loss, take-profit e time-stop. As violações
+saem como instruções de fecho (``CloseInstruction``); o fecho efetivo chega
+depois como um evento ``close``.
+
+Cada evento custa O(1) (mais O(log n) por posição disparada):
+
+* por mercado guarda-se a quantidade líquida ``A = Σ sinal·q`` e o custo
+  ``B = Σ sinal·q·entrada``, por isso o P&L não realizado do mercado é
+  ``preço·A - B`` e um tick atualiza o total da carteira com
+  ``(novo - antigo)·A``;
+* os níveis de stop-loss/take-profit ficam em dois heaps por mercado:
+  ``down`` (dispara quando o preço desce até ao nível: stop de LONG,
+  take-profit de SHORT) e ``up`` (o inverso). Um tick só olha para o topo
+  de cada heap;
+* os time-stops ficam num heap global ordenado pelo prazo.
+
+As entradas de posições já fechadas ou a fechar ficam nos heaps e são
+descartadas quando chegam ao topo.
+
+Eventos (tuplos, ts em ms)::
+
+    ('open', ts, position_id, market_id, strategy, direction, price, quantity)
+    ('close', ts, position_id, price)
+    ('price', ts, market_id, price)
+
+Uso::
+
+    python -m trading.risk replay EVENTS.jsonl [--bankroll 1000]
+"""
+import argparse
+import heapq
+import json
+import sys
+import time
+from collections import namedtuple
+
+from trading import settings
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+CloseInstruction = namedtuple('CloseInstruction', 'ts position_id market_id reason price')
+
+
+class _Position:
+    __slots__ = ('id', 'market', 'strategy', 'sign', 'entry', 'quantity', 'opened', 'closing')
+
+    def __init__(self, position_id, market, strategy, sign, entry, quantity, opened):
+        self.id = position_id
+        self.market = market
+        self.strategy = strategy
+        self.sign = sign
+        self.entry = entry
+        self.quantity = quantity
+        self.opened = opened
+        self.closing = False
+
+
+class _Market:
+    __slots__ = ('id', 'price', 'net_quantity', 'net_cost', 'down', 'up')
+
+    def __init__(self, market_id):
+        self.id = market_id
+        self.price = None
+        self.net_quantity = 0.0  # Σ sinal·q
+        self.net_cost = 0.0      # Σ sinal·q·entrada
+        self.down = []           # (-nível, id, motivo): dispara com preço <= nível
+        self.up = []             # (nível, id, motivo): dispara com preço >= nível
+
+
+class RiskEngine:
+    """Contadores de risco mantidos incrementalmente a partir de eventos"""
+
+    def __init__(self, limits=None, bankroll=1000.0):
+        self.limits = dict(settings.DEFAULT_RISK_LIMITS)
+        self.bankroll = bankroll
+        self.positions = {}
+        self.markets = {}
+        self.unrealized = 0.0
+        self.realized_today = 0.0
+        self.day = None
+        self.day_start_bankroll = bankroll
+        self.halted = False
+        self.open_count = 0
+        self.events = 0
+        self._deadlines = []  # (prazo ms, id)
+        self.set_limits(limits or {})
+
+    # ---------- limites ----------
+
+    def set_limits(self, limits):
+        """Atualiza os limites; reconstrói os heaps das posições abertas (O(n))"""
+        self.limits.update(limits)
+        self._stop = self.limits['stop_loss_pct'] / 100
+        self._take = self.limits['take_profit_pct'] / 100
+        self._time_stop = self.limits['time_stop_days'] * DAY_MS
+        for market in self.markets.values():
+            market.down.clear()
+            market.up.clear()
+        self._deadlines.clear()
+        for position in self.positions.values():
+            if not position.closing:
+                self._arm(position)
+
+    @property
+    def daily_loss(self):
+        return max(0.0, -(self.realized_today + self.unrealized))
+
+    @property
+    def daily_loss_limit(self):
+        return self.limits['max_daily_loss_pct'] / 100 * self.day_start_bankroll
+
+    def _arm(self, position):
+        """Coloca os níveis de stop/take-profit e o prazo da posição nos heaps"""
+        market = self.markets[position.market]
+        entry = position.entry
+        if position.sign > 0:
+            heapq.heappush(market.down, (-entry * (1 - self._stop), position.id, 'stop_loss'))
+            heapq.heappush(market.up, (entry * (1 + self._take), position.id, 'take_profit'))
+        else:
+            heapq.heappush(market.up, (entry * (1 + self._stop), position.id, 'stop_loss'))
+            heapq.heappush(market.down, (-entry * (1 - self._take), position.id, 'take_profit'))
+        heapq.heappush(self._deadlines, (position.opened + self._time_stop, position.id))
+
+    # ---------- eventos ----------
+
+    def process(self, event):
+        """Aplica um evento; retorna a lista de instruções de fecho"""
+        kind = event[0]
+        if kind == 'price':
+            return self.on_price(*event[1:])
+        if kind == 'open':
+            return self.on_open(*event[1:])
+        if kind == 'close':
+            return self.on_close(*event[1:])
+        raise ValueError(f'evento desconhecido: {kind!r}')
+
+    def on_price(self, ts, market_id, price):
+        self.events += 1
+        out = []
+        if self.day != ts // DAY_MS:
+            self._new_day(ts)
+        market = self.markets.get(market_id)
+        if market is None:
+            market = self.markets[market_id] = _Market(market_id)
+        if market.price is not None:
+            self.unrealized += (price - market.price) * market.net_quantity
+        market.price = price
+
+        down = market.down
+        while down and price <= -down[0][0]:
+            _, position_id, reason = heapq.heappop(down)
+            self._emit(out, ts, position_id, reason, price)
+        up = market.up
+        while up and price >= up[0][0]:
+            _, position_id, reason = heapq.heappop(up)
+            self._emit(out, ts, position_id, reason, price)
+
+        if self._deadlines and self._deadlines[0][0] <= ts:
+            self._expire(out, ts)
+        if not self.halted and self.daily_loss >= self.daily_loss_limit:
+            self._halt(out, ts)
+        return out
+
+    def on_open(self, ts, position_id, market_id, strategy, direction, price, quantity):
+        self.events += 1
+        out = []
+        if self.day != ts // DAY_MS:
+            self._new_day(ts)
+        market = self.markets.get(market_id)
+        if market is None:
+            market = self.markets[market_id] = _Market(market_id)
+        if market.price is None:
+            market.price = price
+
+        sign = 1.0 if direction == 'LONG' else -1.0
+        position = _Position(position_id, market_id, strategy, sign, price, quantity, ts)
+        self.positions[position_id] = position
+        self.open_count += 1
+        market.net_quantity += sign * quantity
+        market.net_cost += sign * quantity * price
+        self.unrealized += sign * quantity * (market.price - price)
+
+        # Limites verificados na entrada: a posição existe até chegar o fecho
+        if self.halted:
+            self._emit(out, ts, position_id, 'daily_loss', market.price)
+        elif price * quantity > self.limits['max_position_pct'] / 100 * self.bankroll:
+            self._emit(out, ts, position_id, 'max_position', market.price)
+        elif self.open_count > self.limits['max_concurrent_trades']:
+            self._emit(out, ts, position_id, 'max_concurrent', market.price)
+        else:
+            self._arm(position)
+
+        if self._deadlines and self._deadlines[0][0] <= ts:
+            self._expire(out, ts)
+        if not self.halted and self.daily_loss >= self.daily_loss_limit:
+            self._halt(out, ts)
+        return out
+
+    def on_close(self, ts, position_id, price):
+        self.events += 1
+        if self.day != ts // DAY_MS:
+            self._new_day(ts)
+        position = self.positions.pop(position_id, None)
+        if position is None:
+            return []
+        market = self.markets[position.market]
+        signed = position.sign * position.quantity
+        market.net_quantity -= signed
+        market.net_cost -= signed * position.entry
+        self.unrealized -= signed * (market.price - position.entry)
+        pnl = signed * (price - position.entry)
+        self.realized_today += pnl
+        self.bankroll += pnl
+        self.open_count -= 1
+        return []
+
+    def on_clock(self, ts):
+        """Avança o relógio sem preço novo (time-stops de mercados parados)"""
+        out = []
+        if self.day != ts // DAY_MS:
+            self._new_day(ts)
+        if self._deadlines and self._deadlines[0][0] <= ts:
+            self._expire(out, ts)
+        return out
+
+    # ---------- auxiliares ----------
+
+    def _emit(self, out, ts, position_id, reason, price):
+        position = self.positions.get(position_id)
+        if position is None or position.closing:
+            return  # entrada obsoleta de um heap
+        position.closing = True
+        out.append(CloseInstruction(ts, position_id, position.market, reason, price))
+
+    def _expire(self, out, ts):
+        deadlines = self._deadlines
+        while deadlines and deadlines[0][0] <= ts:
+            _, position_id = heapq.heappop(deadlines)
+            position = self.positions.get(position_id)
+            if position is not None:
+                self._emit(out, ts, position_id, 'time_stop', self.markets[position.market].price)
+
+    def _halt(self, out, ts):
+        """Perda diária atingida: fecha tudo e recusa entradas até ao dia seguinte"""
+        self.halted = True
+        for position in list(self.positions.values()):
+            self._emit(out, ts, position.id, 'daily_loss', self.markets[position.market].price)
+
+    def _new_day(self, ts):
+        self.day = ts // DAY_MS
+        self.realized_today = 0.0
+        self.day_start_bankroll = self.bankroll
+        self.halted = False
+
+    def recompute_unrealized(self):
+        """Recalcula o P&L não realizado a partir dos agregados (corrige deriva de arredondamento)"""
+        self.unrealized = sum(m.price * m.net_quantity - m.net_cost
+                              for m in self.markets.values() if m.price is not None)
+        return self.unrealized
+
+    def snapshot(self):
+        """Estado atual dos contadores"""
+        return {
+            'events': self.events,
+            'bankroll': self.bankroll,
+            'open_positions': self.open_count,
+            'unrealized': self.unrealized,
+            'realized_today': self.realized_today,
+            'daily_loss': self.daily_loss,
+            'daily_loss_limit': self.daily_loss_limit,
+            'halted': self.halted,
+        }
+
+
+# ---------- registo de eventos ----------
+
+def write_log(path, events):
+    """Grava eventos como JSON lines (um array por linha)"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event, separators=(',', ':')))
+            f.write('\n')
+
+
+def read_log(path):
+    """Lê um registo gravado com ``write_log`` como lista de tuplos"""
+    with open(path, encoding='utf-8') as f:
+        return [tuple(json.loads(line)) for line in f if line.strip()]
+
+
+def replay(engine, events):
+    """Processa os eventos por ordem; retorna todas as instruções de fecho"""
+    instructions = []
+    process = engine.process
+    for event in events:
+        result = process(event)
+        if result:
+            instructions.extend(result)
+    return instructions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Motor de limites de risco')
+    parser.add_argument('command', choices=['replay'])
+    parser.add_argument('log', help='registo de eventos (JSON lines)')
+    parser.add_argument('--bankroll', type=float, default=1000.0, help='capital inicial')
+    parser.add_argument('--settings', default=settings.SETTINGS_PATH, help='ficheiro de limites')
+    args = parser.parse_args(argv)
+
+    events = read_log(args.log)
+    engine = RiskEngine(settings.load_risk_limits(args.settings), args.bankroll)
+    started = time.perf_counter()
+    instructions = replay(engine, events)
+    elapsed = time.perf_counter() - started
+
+    reasons = {}
+    for instruction in instructions:
+        reasons[instruction.reason] = reasons.get(instruction.reason, 0) + 1
+    print(f'{len(events)} eventos em {elapsed:.2f}s ({len(events) / elapsed:,.0f} eventos/s)')
+    for reason, count in sorted(reasons.items()):
+        print(f'  {reason}: {count}')
+    for key, value in engine.snapshot().items():
+        print(f'  {key} = {value}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
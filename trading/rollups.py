@@ -0,0 +1,524 @@
+"""Rollups incrementais de trades fechados em daily_metrics e strategy_metrics.
+
+Cada trade fechado é incorporado uma única vez (por ordem de exit_time) no
+estado acumulado do seu dia e da sua estratégia: contagem, wins, soma e soma
+dos quadrados do P&L (para o Sharpe), equity, pico e drawdown máximo. O
+dashboard lê apenas essas linhas, sem voltar a percorrer a tabela trades.
+
+Os trades novos são encontrados pela ordem de fecho (``closed_seq``,
+atribuído pela DB quando o trade passa a fechado), não pelo exit_time: um
+bot pode gravar um fecho com exit_time anterior a trades já incorporados.
+Nesse caso os rollups são refeitos a partir do dia desse trade, com cada
+estratégia retomada do seu estado no fim do dia anterior (strategy_days).
+``trading.retention`` só arquiva trades que já estão nos rollups; as
+leituras de trades fechados (curva de equity, recálculo) incluem os
+arquivos de ``trading.archive``.
+
+Uso:
+    python -m trading.rollups rebuild [--db PATH] [--bankroll 1000]
+    python -m trading.rollups verify  [--db PATH] [--bankroll 1000]
+"""
+import argparse
+import math
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from trading import archive, db
+
+STATE_NAME = 'closed_trades'
+
+DAY_FIELDS = ('starting_bankroll', 'ending_bankroll', 'daily_pnl', 'num_trades',
+              'wins', 'pnl_sq_sum', 'peak_bankroll', 'max_drawdown')
+STRATEGY_FIELDS = ('num_trades', 'wins', 'losses', 'pnl_sum', 'pnl_sq_sum',
+                   'equity', 'peak_equity', 'max_drawdown', 'last_exit_time')
+
+
+def sharpe(n, pnl_sum, pnl_sq_sum):
+    """Sharpe por trade (média / desvio padrão amostral) a partir das somas"""
+    if n < 2:
+        return 0.0
+    mean = pnl_sum / n
+    variance = (pnl_sq_sum - n * mean * mean) / (n - 1)
+    if variance <= 1e-12:
+        return 0.0
+    return mean / math.sqrt(variance)
+
+
+def drawdown_pct(peak, equity):
+    """Drawdown em % do pico"""
+    return (peak - equity) / peak * 100 if peak > 0 else 0.0
+
+
+# ==================== ESTADO ====================
+
+def new_day(starting_bankroll):
+    return {
+        'starting_bankroll': starting_bankroll,
+        'ending_bankroll': starting_bankroll,
+        'daily_pnl': 0.0,
+        'num_trades': 0,
+        'wins': 0,
+        'pnl_sq_sum': 0.0,
+        'peak_bankroll': starting_bankroll,
+        'max_drawdown': 0.0,
+    }
+
+
+def new_strategy(initial_bankroll):
+    return {
+        'num_trades': 0,
+        'wins': 0,
+        'losses': 0,
+        'pnl_sum': 0.0,
+        'pnl_sq_sum': 0.0,
+        'equity': initial_bankroll,
+        'peak_equity': initial_bankroll,
+        'max_drawdown': 0.0,
+        'last_exit_time': None,
+    }
+
+
+def fold_day(day, pnl):
+    """Incorpora um trade no estado do dia"""
+    day['num_trades'] += 1
+    day['wins'] += pnl > 0
+    day['daily_pnl'] += pnl
+    day['pnl_sq_sum'] += pnl * pnl
+    day['ending_bankroll'] += pnl
+    day['peak_bankroll'] = max(day['peak_bankroll'], day['ending_bankroll'])
+    day['max_drawdown'] = max(day['max_drawdown'],
+                              drawdown_pct(day['peak_bankroll'], day['ending_bankroll']))
+
+
+def fold_strategy(strat, pnl, exit_time):
+    """Incorpora um trade no estado da estratégia"""
+    strat['num_trades'] += 1
+    strat['wins'] += pnl > 0
+    strat['losses'] += pnl < 0
+    strat['pnl_sum'] += pnl
+    strat['pnl_sq_sum'] += pnl * pnl
+    strat['equity'] += pnl
+    strat['peak_equity'] = max(strat['peak_equity'], strat['equity'])
+    strat['max_drawdown'] = max(strat['max_drawdown'],
+                                drawdown_pct(strat['peak_equity'], strat['equity']))
+    strat['last_exit_time'] = exit_time
+
+
+# ==================== PERSISTÊNCIA ====================
+
+def _load_day(conn, date, initial_bankroll):
+    row = conn.execute(f'SELECT {", ".join(DAY_FIELDS)} FROM daily_metrics WHERE date = ?',
+                       (date,)).fetchone()
+    if row is not None:
+        return {field: row[field] or 0 for field in DAY_FIELDS}
+
+    previous = conn.execute('''
+        SELECT ending_bankroll FROM daily_metrics
+        WHERE date < ? ORDER BY date DESC LIMIT 1
+    ''', (date,)).fetchone()
+    return new_day(previous[0] if previous else initial_bankroll)
+
+
+def _load_strategy(conn, strategy, initial_bankroll, before=None):
+    """Estado atual da estratégia ou, com ``before``, o do fim do último dia anterior"""
+    if before is None:
+        row = conn.execute(f'SELECT {", ".join(STRATEGY_FIELDS)} FROM strategy_metrics WHERE strategy = ?',
+                           (strategy,)).fetchone()
+    else:
+        row = conn.execute(f'''
+            SELECT {", ".join(STRATEGY_FIELDS)} FROM strategy_days
+            WHERE strategy = ? AND date < ? ORDER BY date DESC LIMIT 1
+        ''', (strategy, before)).fetchone()
+    if row is None:
+        return new_strategy(initial_bankroll)
+    return {field: row[field] for field in STRATEGY_FIELDS}
+
+
+def _save_day(conn, date, day):
+    n = day['num_trades']
+    conn.execute('''
+        INSERT OR REPLACE INTO daily_metrics
+            (date, starting_bankroll, ending_bankroll, daily_pnl, daily_pnl_pct,
+             num_trades, win_rate, sharpe_ratio, max_drawdown,
+             wins, pnl_sq_sum, peak_bankroll)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        date, day['starting_bankroll'], day['ending_bankroll'], day['daily_pnl'],
+        day['daily_pnl'] / day['starting_bankroll'] * 100 if day['starting_bankroll'] else 0.0,
+        n, day['wins'] / n * 100 if n else 0.0,
+        sharpe(n, day['daily_pnl'], day['pnl_sq_sum']), day['max_drawdown'],
+        day['wins'], day['pnl_sq_sum'], day['peak_bankroll']
+    ))
+
+
+def _save_strategy(conn, strategy, strat, date=None):
+    """Grava o estado em strategy_metrics ou, com ``date``, em strategy_days"""
+    table, keys = ('strategy_metrics', ('strategy',)) if date is None else ('strategy_days', ('strategy', 'date'))
+    conn.execute(f'''
+        INSERT OR REPLACE INTO {table} ({", ".join(keys + STRATEGY_FIELDS)})
+        VALUES ({", ".join("?" * (len(keys) + len(STRATEGY_FIELDS)))})
+    ''', (strategy, *([] if date is None else [date]), *(strat[field] for field in STRATEGY_FIELDS)))
+
+
+def _state(conn):
+    """(exit_time, id, closed_seq) do estado guardado, ou None se ainda não houver"""
+    row = conn.execute('SELECT exit_time, trade_id, seq FROM rollup_state WHERE name = ?',
+                       (STATE_NAME,)).fetchone()
+    return (row[0] or '', row[1] or '', row[2] or 0) if row else None
+
+
+def watermark(conn):
+    """(exit_time, id) do trade incorporado com o maior exit_time"""
+    state = _state(conn)
+    return state[:2] if state else ('', '')
+
+
+def sequence(conn):
+    """closed_seq do último trade incorporado - muda sempre que há trades novos,
+    mesmo os que fecham com exit_time anterior ao watermark"""
+    state = _state(conn)
+    return state[2] if state else 0
+
+
+def _new_trades(conn, seq, limit=None):
+    """Trades fechados depois de ``seq``, por ordem de fecho"""
+    query = f'''
+        SELECT id, strategy, exit_time, COALESCE(pnl, 0) AS pnl, closed_seq
+        FROM trades INDEXED BY idx_trades_closed_seq
+        WHERE closed_seq > ? AND status = '{db.STATUS_CLOSED}'
+        ORDER BY closed_seq
+    '''
+    params = (seq,)
+    if limit is not None:
+        query += ' LIMIT ?'
+        params += (limit,)
+    return conn.execute(query, params)
+
+
+def pending_since(conn):
+    """Menor exit_time dos trades fechados ainda não incorporados (None se não houver)"""
+    return conn.execute(f'''
+        SELECT MIN(exit_time) FROM trades INDEXED BY idx_trades_closed_seq
+        WHERE closed_seq > ? AND status = '{db.STATUS_CLOSED}'
+    ''', (sequence(conn),)).fetchone()[0]
+
+
+def _closed_since(conn, start):
+    """Trades fechados com exit_time >= start (arquivos e DB quente), por (exit_time, id).
+
+    Corre dentro da transação de escrita do refresh: os arquivos são lidos
+    por ligações próprias em vez de anexados (ver ``archive.open_month``).
+    """
+    path = archive.main_path(conn)
+    directory = archive.archive_dir(path) if path else None
+    months = [m for m in archive.list_months(directory) if archive.month_end(m) > start] if path else []
+    mark = archive.mark(conn) if months else None
+    rows = []
+    for month in [*months, None]:
+        source = conn if month is None else archive.open_month(directory, month)
+        try:
+            # O índice parcial só é elegível com o status literal na query
+            where = f"status = '{db.STATUS_CLOSED}' AND exit_time >= ?" + ('' if month is None else ' AND exit_time < ?')
+            rows.extend(source.execute(f'''
+                SELECT id, strategy, exit_time, COALESCE(pnl, 0) AS pnl
+                FROM trades INDEXED BY idx_trades_closed_exit
+                WHERE {where}
+            ''', (start,) if month is None else (start, mark)).fetchall())
+        finally:
+            if source is not conn:
+                source.close()
+    # Um trade fechado tarde pode estar na DB quente com exit_time de um mês arquivado
+    rows.sort(key=lambda row: (row['exit_time'], row['id']))
+    return rows
+
+
+def _fold(conn, rows, initial_bankroll, start=None):
+    """Incorpora ``rows`` (por ordem de exit_time) e grava dias e estratégias.
+
+    Sem ``start`` continua do estado atual; com ``start`` as estratégias
+    partem do fim do último dia antes de ``start`` (os dias a partir de
+    ``start`` já foram apagados).
+    """
+    days, strategies, checkpoints = {}, {}, {}
+    for row in rows:
+        date = str(row['exit_time'])[:10]
+        day = days.get(date)
+        if day is None:
+            day = days[date] = _load_day(conn, date, initial_bankroll)
+            # Dias novos partem do fecho do dia anterior já neste lote
+            if day['num_trades'] == 0 and days:
+                previous = [d for d in days if d < date]
+                if previous:
+                    day.update(new_day(days[max(previous)]['ending_bankroll']))
+        fold_day(day, row['pnl'])
+
+        strat = strategies.get(row['strategy'])
+        if strat is None:
+            strat = strategies[row['strategy']] = _load_strategy(conn, row['strategy'], initial_bankroll, start)
+        fold_strategy(strat, row['pnl'], row['exit_time'])
+        # Estado da estratégia no fim do dia (o último trade do dia fica)
+        checkpoints[row['strategy'], date] = dict(strat)
+
+    for date, day in days.items():
+        _save_day(conn, date, day)
+    for strategy, strat in strategies.items():
+        _save_strategy(conn, strategy, strat)
+    for (strategy, date), strat in checkpoints.items():
+        _save_strategy(conn, strategy, strat, date)
+
+
+# ==================== API ====================
+
+def refresh(conn, initial_bankroll):
+    """Incorpora os trades fechados desde a última execução.
+
+    Retorna o número de trades novos. Os trades são lidos por ordem de fecho
+    (``closed_seq``), por isso um trade que fecha com exit_time anterior a
+    outro já incorporado não se perde: nesse caso os dias e as estratégias
+    são refeitos a partir do dia desse trade, com as estratégias retomadas
+    de strategy_days. Quando não há nada novo custa apenas uma procura no
+    índice idx_trades_closed_seq.
+    """
+    state = _state(conn)
+    if state is not None and _new_trades(conn, state[2], limit=1).fetchone() is None:
+        return 0
+
+    # BEGIN IMMEDIATE serializa sessões concorrentes: o estado é relido
+    # dentro da transação para que nenhum trade seja contado duas vezes
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        state = _state(conn)
+        new = _new_trades(conn, state[2] if state else 0).fetchall()
+        closed = [row for row in new if row['exit_time'] is not None]
+        mark = state[:2] if state else ('', '')
+        late = [row['exit_time'] for row in closed if (row['exit_time'], row['id']) <= mark]
+        if state is None or late:
+            # Sem estado (DB nova ou migrada) refaz tudo; com trades atrasados, a partir do dia deles
+            start = min(late)[:10] if state else ''
+            conn.execute('DELETE FROM daily_metrics WHERE date >= ?', (start,))
+            conn.execute('DELETE FROM strategy_days WHERE date >= ?', (start,))
+            if not start:
+                conn.execute('DELETE FROM strategy_metrics')
+            rows = _closed_since(conn, start)
+            _fold(conn, rows, initial_bankroll, start)
+        else:
+            rows = sorted(closed, key=lambda row: (row['exit_time'], row['id']))
+            _fold(conn, rows, initial_bankroll)
+        if rows:
+            mark = max(mark, (rows[-1]['exit_time'], rows[-1]['id']))
+        seq = new[-1]['closed_seq'] if new else (state[2] if state else 0)
+        conn.execute('INSERT OR REPLACE INTO rollup_state (name, exit_time, trade_id, seq) VALUES (?, ?, ?, ?)',
+                     (STATE_NAME, *mark, seq))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return len(new)
+
+
+def rebuild(conn, initial_bankroll):
+    """Apaga os rollups e volta a incorporar todos os trades fechados.
+
+    Sem estado o refresh refaz tudo a partir de ``_closed_since``, que lê
+    também os arquivos: o histórico arquivado continua nos rollups.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM daily_metrics')
+        conn.execute('DELETE FROM strategy_metrics')
+        conn.execute('DELETE FROM strategy_days')
+        conn.execute('DELETE FROM rollup_state WHERE name = ?', (STATE_NAME,))
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return refresh(conn, initial_bankroll)
+
+
+def read_strategies(conn):
+    """Linhas de strategy_metrics com win rate, média e Sharpe derivados"""
+    strategies = {}
+    for row in conn.execute('SELECT * FROM strategy_metrics ORDER BY strategy'):
+        n = row['num_trades']
+        strategies[row['strategy']] = {
+            **dict(row),
+            'win_rate': row['wins'] / n * 100 if n else 0.0,
+            'avg_pnl': row['pnl_sum'] / n if n else 0.0,
+            'sharpe': sharpe(n, row['pnl_sum'], row['pnl_sq_sum']),
+        }
+    return strategies
+
+
+def read_day(conn, date=None):
+    """Linha de daily_metrics de um dia (hoje em UTC por omissão, como as datas da DB)"""
+    date = date or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    row = conn.execute('SELECT * FROM daily_metrics WHERE date = ?', (date,)).fetchone()
+    return dict(row) if row else None
+
+
+def _edge(conn, newest):
+    """exit_time do primeiro (ou último) trade fechado, incluindo os arquivos"""
+    order = 'DESC' if newest else 'ASC'
+    closed = f"status = '{db.STATUS_CLOSED}'"
+
+    def read(table, clauses=(), params=()):
+        row = conn.execute(f'''
+            SELECT exit_time FROM {table} INDEXED BY idx_trades_closed_exit
+            WHERE {' AND '.join([closed, *clauses])} ORDER BY exit_time {order} LIMIT 1
+        ''', params).fetchone()
+        return row[0] if row is not None else None
+
+    # A DB quente conta sempre: pode ter trades fechados tarde abaixo da
+    # marca de arquivo; dos arquivos basta o primeiro mês com trades
+    edges = [read('main.trades')]
+    for table, clauses, params, month in archive.trade_tables(conn, newest_first=newest):
+        if month is not None:
+            edge = read(table, clauses, params)
+            if edge is not None:
+                edges.append(edge)
+                break
+    edges = [edge for edge in edges if edge is not None]
+    if not edges:
+        return None
+    return max(edges) if newest else min(edges)
+
+
+def closed_range(conn):
+    """(primeiro, último) exit_time de trades fechados, via índice parcial"""
+    first = _edge(conn, newest=False)
+    return (first, _edge(conn, newest=True)) if first else (None, None)
+
+
+def equity_before(conn, start, initial_bankroll):
+    """Capital imediatamente antes de ``start``.
+
+    Usa o fecho do dia anterior em daily_metrics e soma apenas os trades do
+    próprio dia, sem percorrer o histórico completo.
+    """
+    date = start[:10]
+    previous = conn.execute('''
+        SELECT ending_bankroll FROM daily_metrics
+        WHERE date < ? ORDER BY date DESC LIMIT 1
+    ''', (date,)).fetchone()
+    intraday = 0.0
+    for table, clauses, params, _ in archive.trade_tables(conn, date, start):
+        where = ' AND '.join([f"status = '{db.STATUS_CLOSED}'", 'exit_time >= ? AND exit_time < ?', *clauses])
+        intraday += conn.execute(f'''
+            SELECT COALESCE(SUM(pnl), 0) FROM {table} INDEXED BY idx_trades_closed_exit
+            WHERE {where}
+        ''', (date, start, *params)).fetchone()[0]
+    return (previous[0] if previous else initial_bankroll) + intraday
+
+
+def equity_curve(conn, initial_bankroll, start=None, end=None):
+    """Série de equity (epoch em segundos, capital) entre ``start`` e ``end``.
+
+    Cada trade fechado é um ponto; só a janela pedida é lida da DB (e só
+    os arquivos dos meses dessa janela).
+    """
+    first, last = closed_range(conn)
+    if first is None:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    start = start or first
+    end = end or last
+
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    chunks = []
+    for table, clauses, params, _ in archive.trade_tables(conn, start, end):
+        where = ' AND '.join([f"status = '{db.STATUS_CLOSED}'", 'exit_time >= ? AND exit_time <= ?', *clauses])
+        cursor.execute(f'''
+            SELECT CAST(strftime('%s', exit_time) AS INTEGER), COALESCE(pnl, 0)
+            FROM {table} INDEXED BY idx_trades_closed_exit
+            WHERE {where}
+            ORDER BY exit_time, id
+        ''', (start, end, *params))
+        chunks.append(np.fromiter(cursor, dtype=[('ts', 'i8'), ('pnl', 'f8')]))
+    data = np.concatenate(chunks)
+    # Um trade fechado tarde (exit_time abaixo da marca de arquivo) vem da
+    # DB quente depois dos arquivos: a série tem de voltar à ordem de exit_time
+    data = data[np.argsort(data['ts'], kind='stable')]
+    equity = equity_before(conn, start, initial_bankroll) + np.cumsum(data['pnl'])
+    return data['ts'], equity
+
+
+# ==================== VERIFICAÇÃO ====================
+
+def full_recompute(conn, initial_bankroll):
+    """Recalcula dias e estratégias do zero a partir da tabela trades (e dos arquivos)"""
+    days, strategies = {}, {}
+    bankroll = initial_bankroll
+    for row in _closed_since(conn, ''):
+        date = str(row['exit_time'])[:10]
+        if date not in days:
+            days[date] = new_day(bankroll)
+        fold_day(days[date], row['pnl'])
+        bankroll = days[date]['ending_bankroll']
+
+        strat = strategies.setdefault(row['strategy'], new_strategy(initial_bankroll))
+        fold_strategy(strat, row['pnl'], row['exit_time'])
+    return days, strategies
+
+
+def verify(conn, initial_bankroll, tolerance=1e-6):
+    """Compara os rollups persistidos com um recálculo completo.
+
+    Retorna a lista de diferenças encontradas (vazia se coincidirem).
+    """
+    expected_days, expected_strategies = full_recompute(conn, initial_bankroll)
+    mismatches = []
+
+    def compare(kind, key, expected, actual, fields):
+        if actual is None:
+            mismatches.append(f'{kind} {key}: em falta')
+            return
+        for field in fields:
+            a, e = actual[field], expected[field]
+            if isinstance(e, float) or isinstance(a, float):
+                if not math.isclose(a or 0.0, e, rel_tol=tolerance, abs_tol=tolerance):
+                    mismatches.append(f'{kind} {key}.{field}: {a} != {e}')
+            elif a != e:
+                mismatches.append(f'{kind} {key}.{field}: {a} != {e}')
+
+    stored_days = {row['date']: dict(row) for row in conn.execute('SELECT * FROM daily_metrics')}
+    for date, expected in expected_days.items():
+        compare('dia', date, expected, stored_days.pop(date, None), DAY_FIELDS)
+    mismatches.extend(f'dia {date}: a mais' for date in stored_days)
+
+    stored_strategies = read_strategies(conn)
+    for strategy, expected in expected_strategies.items():
+        compare('estratégia', strategy, expected, stored_strategies.pop(strategy, None), STRATEGY_FIELDS)
+    mismatches.extend(f'estratégia {name}: a mais' for name in stored_strategies)
+    return mismatches
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Rollups de daily_metrics e strategy_metrics')
+    parser.add_argument('command', choices=['refresh', 'rebuild', 'verify'])
+    parser.add_argument('--db', default=db.DB_PATH, help='caminho da trading_bot.db')
+    parser.add_argument('--bankroll', type=float, default=1000.0, help='capital inicial')
+    args = parser.parse_args(argv)
+
+    conn = db.connect(args.db)
+    db.init_schema(conn)
+    try:
+        if args.command == 'refresh':
+            print(f'{refresh(conn, args.bankroll)} trades incorporados')
+        elif args.command == 'rebuild':
+            print(f'{rebuild(conn, args.bankroll)} trades incorporados')
+        else:
+            refresh(conn, args.bankroll)
+            mismatches = verify(conn, args.bankroll)
+            for line in mismatches:
+                print(line)
+            print('OK' if not mismatches else f'{len(mismatches)} diferenças')
+            return 1 if mismatches else 0
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
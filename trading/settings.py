@@ -0,0 +1,98 @@
+"""Configurações partilhadas entre o dashboard e os bots.
+
+Os valores ficam num ficheiro JSON ao lado da base de dados, uma secção
+por assunto (``risk``, ``notifications``, ``retention``); chaves em falta
+(ou o ficheiro inteiro) usam os valores ``DEFAULT_*`` da secção.
+"""
+import json
+import os
+from pathlib import Path
+
+from trading import db
+
+SETTINGS_PATH = Path(os.environ.get('TRADING_SETTINGS', db.DB_PATH.parent / 'settings.json'))
+
+DEFAULT_RISK_LIMITS = {
+    'max_position_pct': 5,        # % do capital por posição
+    'max_daily_loss_pct': 10,     # % do capital de início do dia
+    'stop_loss_pct': 20,
+    'take_profit_pct': 8,
+    'max_concurrent_trades': 5,
+    'time_stop_days': 3,
+}
+
+
+DEFAULT_NOTIFICATIONS = {
+    'discord': True,
+    'email': False,
+    'sound': False,
+    'discord_webhook': '',
+}
+
+
+# Parâmetros dos sinais de cada estratégia (ver trading.backtest); as
+# janelas contam pontos da série (barras ou ticks)
+DEFAULT_STRATEGY_PARAMS = {
+    'Momentum': {'lookback': 60, 'threshold': 0.03},
+    'MeanReversion': {'window': 120, 'z': 2.0},
+    'Scalping': {'lookback': 5, 'threshold': 0.01},
+    'Contrarian': {'lookback': 240, 'threshold': 0.05},
+}
+
+
+DEFAULT_RETENTION = {
+    'hot_days': 30,           # dias de trades fechados mantidos na DB quente
+    'max_hot_mb': 64,         # tamanho máximo da DB quente (encurta a janela se passar)
+    'interval_minutes': 60,   # intervalo entre manutenções (arquivo, vacuum, ANALYZE)
+}
+
+
+def _load(path):
+    try:
+        return json.loads(Path(path).read_text(encoding='utf-8'))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save(section, values, path):
+    """Grava uma secção (escreve e renomeia, para os bots nunca lerem meio ficheiro)"""
+    path = Path(path)
+    data = _load(path)
+    data[section] = values
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(json.dumps(data, indent=2) + '\n', encoding='utf-8')
+    os.replace(tmp, path)
+
+
+def load_risk_limits(path=SETTINGS_PATH):
+    """Limites de risco guardados, completados com os valores por omissão"""
+    saved = _load(path).get('risk', {})
+    return {key: saved.get(key, default) for key, default in DEFAULT_RISK_LIMITS.items()}
+
+
+def save_risk_limits(limits, path=SETTINGS_PATH):
+    """Grava os limites de risco"""
+    _save('risk', {key: limits[key] for key in DEFAULT_RISK_LIMITS}, path)
+
+
+def load_notifications(path=SETTINGS_PATH):
+    """Canais de notificação guardados, completados com os valores por omissão"""
+    saved = _load(path).get('notifications', {})
+    return {key: saved.get(key, default) for key, default in DEFAULT_NOTIFICATIONS.items()}
+
+
+def save_notifications(notifications, path=SETTINGS_PATH):
+    """Grava os canais de notificação"""
+    _save('notifications', {key: notifications[key] for key in DEFAULT_NOTIFICATIONS}, path)
+
+
+def load_retention(path=SETTINGS_PATH):
+    """Retenção da DB quente, completada com os valores por omissão"""
+    saved = _load(path).get('retention', {})
+    return {key: saved.get(key, default) for key, default in DEFAULT_RETENTION.items()}
+
+
+def save_retention(retention, path=SETTINGS_PATH):
+    """Grava a retenção da DB quente"""
+    _save('retention', {key: retention[key] for key in DEFAULT_RETENTION}, path)
@@ -0,0 +1,447 @@
+"""Supervisor dos workers de estratégia.
+
+Cada estratégia corre num processo próprio (``paper.PaperTrader`` em ciclo)
+e o supervisor (outro processo, ``python -m trading.supervisor run``)
+arranca-os, pausa-os e pára-os. O estado vive num bloco de estado: um
+ficheiro de tamanho fixo mapeado em memória pelo supervisor, pelos workers
+e pelo dashboard, com o registo 0 para o supervisor e um registo por
+estratégia. Cada campo tem um único escritor:
+
+* ``command`` - o dashboard ou a CLI (estado pretendido: STOP, RUN, PAUSE);
+* ``state``, ``pid``, ``restarts`` - o supervisor;
+* ``started``, ``heartbeat``, ``last_trade``, ``loops``, ``loop_ms``,
+  ``loop_ms_avg``, ``trades``, ``error`` - o worker.
+
+O dashboard lê o bloco diretamente, sem pedidos ao supervisor, e escreve
+os comandos no mesmo sítio; o supervisor aplica-os a cada volta. Um worker
+que rebenta não afeta os outros: fica CRASHED e volta a arrancar com
+backoff. Um worker sem heartbeat há ``STALL_TIMEOUT`` segundos (preso num
+ciclo lento) é morto e arrancado de novo. Os workers saem sozinhos se o
+supervisor morrer.
+
+O supervisor corre também a manutenção da DB (``retention.maintain``:
+arquivo dos trades antigos e compactação) a cada ``interval_minutes`` das
+configurações de retenção, numa thread própria para não atrasar a
+vigilância dos workers, e atualiza a cada ``BARS_INTERVAL`` segundos as
+barras OHLCV de todos os mercados do armazém de ticks (``ohlc.BarStore``),
+também numa thread, para que as barras acompanhem os ticks que chegam
+mesmo sem ninguém a ler os gráficos.
+
+Uso::
+
+    python -m trading.supervisor run [--interval 1]
+    python -m trading.supervisor status
+    python -m trading.supervisor start|pause|stop [ESTRATÉGIA ...]
+"""
+import argparse
+import fcntl
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from trading import db, notify, settings, ticks
+
+STATUS_PATH = Path(os.environ.get('TRADING_SUPERVISOR_STATUS', db.DB_PATH.parent / 'supervisor.status'))
+
+SUPERVISOR = 'supervisor'
+STRATEGIES = list(settings.DEFAULT_STRATEGY_PARAMS)
+
+# Comandos (estado pretendido) e estados
+STOP, RUN, PAUSE = 0, 1, 2
+STOPPED, RUNNING, PAUSED, CRASHED, STARTING = 0, 1, 2, 3, 4
+COMMANDS = {'stop': STOP, 'start': RUN, 'pause': PAUSE}
+STATES = {STOPPED: 'stopped', RUNNING: 'running', PAUSED: 'paused', CRASHED: 'crashed',
+          STARTING: 'starting'}
+
+STATUS_DTYPE = np.dtype([
+    ('name', 'S32'),
+    ('command', '<i4'),
+    ('state', '<i4'),
+    ('pid', '<i4'),
+    ('restarts', '<i4'),
+    ('started', '<f8'),
+    ('heartbeat', '<f8'),
+    ('last_trade', '<f8'),
+    ('loop_ms', '<f8'),
+    ('loop_ms_avg', '<f8'),
+    ('loops', '<i8'),
+    ('trades', '<i8'),
+    ('error', 'S120'),
+], align=True)
+
+POLL_INTERVAL = 0.5    # s entre voltas do supervisor
+STALL_TIMEOUT = 60.0   # s sem heartbeat até matar o worker
+STOP_TIMEOUT = 10.0    # s para um worker sair sozinho depois de STOP
+BACKOFF = 1.0          # s até ao primeiro restart; duplica a cada falha seguida
+MAX_BACKOFF = 60.0
+FIRST_MAINTENANCE_DELAY = 15 * 60.0  # s depois do arranque até à primeira manutenção da DB
+BARS_INTERVAL = 60.0   # s entre atualizações das barras OHLCV (a resolução mais fina é 1m)
+
+
+class StatusBlock:
+    """Bloco de estado partilhado (np.memmap de registos ``STATUS_DTYPE``)"""
+
+    def __init__(self, path=STATUS_PATH, names=STRATEGIES):
+        self.path = Path(path)
+        names = [SUPERVISOR, *names]
+        if not self._valid(names):
+            self._create(names)
+        self.records = np.memmap(self.path, dtype=STATUS_DTYPE, mode='r+')
+        self.index = {name.decode(): i for i, name in enumerate(self.records['name'])}
+
+    def _valid(self, names):
+        try:
+            if self.path.stat().st_size != len(names) * STATUS_DTYPE.itemsize:
+                return False
+        except FileNotFoundError:
+            return False
+        current = np.fromfile(self.path, dtype=STATUS_DTYPE)['name']
+        return [name.decode() for name in current] == names
+
+    def _create(self, names):
+        records = np.zeros(len(names), dtype=STATUS_DTYPE)
+        records['name'] = [name.encode() for name in names]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f'{self.path.name}.{os.getpid()}.tmp')
+        records.tofile(tmp)
+        os.replace(tmp, self.path)
+
+    @property
+    def names(self):
+        return list(self.index)[1:]
+
+    def get(self, name, field):
+        value = self.records[field][self.index[name]]
+        return value.decode(errors='replace') if field in ('name', 'error') else value.item()
+
+    def set(self, name, **fields):
+        i = self.index[name]
+        for field, value in fields.items():
+            if field == 'error':
+                value = value.encode()[:STATUS_DTYPE['error'].itemsize]
+            self.records[field][i] = value
+
+    def command(self, names, command):
+        """Escreve o estado pretendido (o supervisor aplica-o na volta seguinte)"""
+        for name in names:
+            self.set(name, command=command)
+
+    def snapshot(self):
+        """Cópia do bloco como dict de arrays (uma entrada por registo)"""
+        records = np.array(self.records)
+        columns = {field: records[field] for field in STATUS_DTYPE.names}
+        columns['name'] = [name.decode() for name in records['name']]
+        columns['error'] = [error.decode(errors='replace') for error in records['error']]
+        return columns
+
+    def supervisor_alive(self, now=None):
+        """Há um supervisor vivo com heartbeat recente?"""
+        pid = self.get(SUPERVISOR, 'pid')
+        heartbeat = self.get(SUPERVISOR, 'heartbeat')
+        if not pid or (now or time.time()) - heartbeat > STALL_TIMEOUT:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def close(self):
+        self.records._mmap.close()
+
+
+def worker_main(name, status_path, interval, db_path, ticks_dir):
+    """Ciclo de um worker: ``PaperTrader.step`` a cada ``interval`` segundos"""
+    # Só os workers precisam do trader (o dashboard importa este módulo)
+    from trading import paper
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    parent = os.getppid()
+    block = StatusBlock(status_path)
+    notifier = notify.from_settings()
+    trader = None
+    try:
+        trader = paper.PaperTrader(name, db_path, ticks_dir, notifier=notifier)
+        now = time.time()
+        block.set(name, started=now, heartbeat=now, loops=0, trades=0, loop_ms=0.0,
+                  loop_ms_avg=0.0, error='')
+        loops = trades = 0
+        average = None
+        while True:
+            command = block.get(name, 'command')
+            if command == STOP or os.getppid() != parent:
+                break
+            started = time.perf_counter()
+            if command == RUN:
+                changed = trader.step()
+                elapsed = time.perf_counter() - started
+                if changed:
+                    trades += changed
+                    block.set(name, last_trade=time.time(), trades=trades)
+                # Média exponencial da latência por ciclo
+                ms = elapsed * 1000
+                average = ms if average is None else 0.9 * average + 0.1 * ms
+                block.set(name, loop_ms=ms, loop_ms_avg=average)
+            else:
+                elapsed = 0.0
+            loops += 1
+            block.set(name, heartbeat=time.time(), loops=loops)
+            time.sleep(max(interval - elapsed, 0.0))
+    except Exception as exc:
+        block.set(name, error=f'{type(exc).__name__}: {exc}')
+        raise
+    finally:
+        if trader is not None:
+            trader.close()
+        notifier.close(timeout=2.0)
+        block.close()
+
+
+class Supervisor:
+    """Arranca, pausa e pára os workers conforme os comandos do bloco"""
+
+    def __init__(self, status_path=STATUS_PATH, interval=1.0, db_path=db.DB_PATH,
+                 ticks_dir=ticks.TICKS_DIR):
+        self.status_path = Path(status_path)
+        self.block = StatusBlock(status_path)
+        self.interval = interval
+        self.db_path = db_path
+        self.ticks_dir = ticks_dir
+        self.context = get_context('spawn')
+        self.notifier = notify.from_settings()
+        self.processes = {}
+        self.spawned = {}
+        self.stopping = {}
+        self.failures = {}
+        self.retry_at = {}
+        self.maintenance = None
+        # Não logo no arranque: os workers e o dashboard começam sem a DB ocupada
+        self.maintenance_at = time.time() + FIRST_MAINTENANCE_DELAY
+        self.bars = None
+        self.bars_at = 0.0
+        self.running = True
+
+    def _start(self, name):
+        process = self.context.Process(
+            target=worker_main, name=f'worker-{name}', daemon=True,
+            args=(name, self.status_path, self.interval, self.db_path, self.ticks_dir))
+        process.start()
+        self.processes[name] = process
+        self.spawned[name] = time.time()
+        self.block.set(name, pid=process.pid, state=STARTING)
+
+    def _reap(self, name, process, command, now):
+        """Worker terminado: saída pedida ou falha (restart com backoff)"""
+        process.join()
+        del self.processes[name]
+        self.stopping.pop(name, None)
+        if command == STOP or process.exitcode == 0:
+            self.block.set(name, state=STOPPED, pid=0)
+            return
+        failures = self.failures[name] = self.failures.get(name, 0) + 1
+        self.retry_at[name] = now + min(BACKOFF * 2 ** (failures - 1), MAX_BACKOFF)
+        if not self.block.get(name, 'error'):
+            self.block.set(name, error=f'exit code {process.exitcode}')
+        self.block.set(name, state=CRASHED, pid=0,
+                       restarts=self.block.get(name, 'restarts') + 1)
+        self.notifier.notify(f'Worker {name} falhou', f'{self.block.get(name, "error")}; '
+                             f'novo arranque em {self.retry_at[name] - now:.0f}s', notify.CRITICAL)
+
+    def _maintain(self, config):
+        from trading import retention
+        try:
+            result = retention.maintain(self.db_path, config)
+        except Exception as exc:
+            self.notifier.notify('Manutenção da DB falhou', f'{type(exc).__name__}: {exc}', notify.WARNING)
+            return
+        if not result['incremental'] and result['after'] > config['max_hot_mb'] * 2**20:
+            self.notifier.notify('DB quente acima do limite',
+                                 f'{result["after"] / 2**20:.1f} MB; o ficheiro só encolhe depois de '
+                                 '`python -m trading.retention run --vacuum`', notify.WARNING)
+        if result['hot_days'] < config['hot_days']:
+            self.notifier.notify('DB quente acima do limite',
+                                 f'{result["after"] / 2**20:.1f} MB; janela reduzida para '
+                                 f'{result["hot_days"]} dias', notify.WARNING)
+
+    def _schedule_maintenance(self, now):
+        """Lança a manutenção da DB quando chega a hora (uma de cada vez)"""
+        if now < self.maintenance_at or (self.maintenance is not None and self.maintenance.is_alive()):
+            return
+        config = settings.load_retention()
+        self.maintenance_at = now + config['interval_minutes'] * 60
+        self.maintenance = threading.Thread(target=self._maintain, args=(config,),
+                                            name='maintenance', daemon=True)
+        self.maintenance.start()
+
+    def _update_bars(self):
+        from trading import ohlc
+        store = ticks.TickStore(self.ticks_dir)
+        bars = ohlc.BarStore(store)
+        try:
+            for market in store.markets():
+                bars.update(market)
+        except Exception as exc:
+            self.notifier.notify('Atualização das barras falhou', f'{type(exc).__name__}: {exc}',
+                                 notify.WARNING)
+        finally:
+            bars.close()
+            store.close()
+
+    def _schedule_bars(self, now):
+        """Lança a atualização das barras OHLCV a cada BARS_INTERVAL (uma de cada vez)"""
+        if now < self.bars_at or (self.bars is not None and self.bars.is_alive()):
+            return
+        self.bars_at = now + BARS_INTERVAL
+        self.bars = threading.Thread(target=self._update_bars, name='bars', daemon=True)
+        self.bars.start()
+
+    def tick(self):
+        """Uma volta: aplica os comandos, vigia os workers e agenda a manutenção e as barras"""
+        now = time.time()
+        block = self.block
+        block.set(SUPERVISOR, heartbeat=now)
+        self._schedule_maintenance(now)
+        self._schedule_bars(now)
+        for name in block.names:
+            command = block.get(name, 'command')
+            process = self.processes.get(name)
+            if process is not None and not process.is_alive():
+                self._reap(name, process, command, now)
+                process = None
+
+            if command == STOP:
+                if process is None:
+                    if block.get(name, 'state') != STOPPED:
+                        block.set(name, state=STOPPED, pid=0)
+                    self.failures.pop(name, None)
+                    self.retry_at.pop(name, None)
+                elif now - self.stopping.setdefault(name, now) > STOP_TIMEOUT:
+                    process.terminate()
+                continue
+
+            if process is None:
+                if now >= self.retry_at.get(name, 0.0):
+                    self._start(name)
+                continue
+
+            heartbeat = block.get(name, 'heartbeat')
+            if max(heartbeat, self.spawned[name]) < now - STALL_TIMEOUT:
+                block.set(name, error=f'sem heartbeat há {now - heartbeat:.0f}s')
+                self.notifier.notify(f'Worker {name} parado', block.get(name, 'error'), notify.WARNING)
+                process.kill()
+            elif heartbeat >= self.spawned[name]:
+                block.set(name, state=RUNNING if command == RUN else PAUSED)
+                # Um worker saudável há algum tempo esquece as falhas anteriores
+                if now - block.get(name, 'started') > MAX_BACKOFF:
+                    self.failures.pop(name, None)
+
+    def shutdown(self):
+        """Pára todos os workers (os comandos ficam para o próximo supervisor)"""
+        for process in self.processes.values():
+            process.terminate()
+        for name, process in self.processes.items():
+            process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            self.block.set(name, state=STOPPED, pid=0)
+        self.processes.clear()
+        for thread in (self.maintenance, self.bars):
+            if thread is not None:
+                thread.join()
+        self.block.set(SUPERVISOR, state=STOPPED, pid=0)
+        self.notifier.close()
+
+    def run(self):
+        now = time.time()
+        self.block.set(SUPERVISOR, pid=os.getpid(), state=RUNNING, started=now, heartbeat=now)
+
+        def stop(signum, frame):
+            self.running = False
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        try:
+            while self.running:
+                self.tick()
+                time.sleep(POLL_INTERVAL)
+        finally:
+            self.shutdown()
+
+
+def ensure_running(status_path=STATUS_PATH, block=None):
+    """Lança o supervisor em segundo plano se não houver um vivo; retorna True se lançou"""
+    block = block or StatusBlock(status_path)
+    if block.supervisor_alive():
+        return False
+    status_path = Path(status_path)
+    log = open(status_path.with_suffix('.log'), 'ab')
+    subprocess.Popen(
+        [sys.executable, '-m', 'trading.supervisor', '--status', str(status_path), 'run'],
+        cwd=Path(__file__).resolve().parent.parent, stdin=subprocess.DEVNULL, stdout=log,
+        stderr=subprocess.STDOUT, start_new_session=True)
+    log.close()
+    return True
+
+
+def _format_age(seconds):
+    return '-' if seconds is None else f'{seconds:.0f}s'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Supervisor dos workers de estratégia')
+    parser.add_argument('--status', default=STATUS_PATH, help='ficheiro do bloco de estado')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run = sub.add_parser('run', help='corre o supervisor em primeiro plano')
+    run.add_argument('--interval', type=float, default=1.0, help='s entre ciclos de cada worker')
+
+    sub.add_parser('status', help='mostra o bloco de estado')
+    for command in COMMANDS:
+        control = sub.add_parser(command, help=f'{command} das estratégias (todas por omissão)')
+        control.add_argument('strategies', nargs='*')
+
+    args = parser.parse_args(argv)
+    block = StatusBlock(args.status)
+
+    if args.command == 'run':
+        # Um só supervisor por bloco de estado
+        lock = open(Path(args.status).with_suffix('.lock'), 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            print(f'já há um supervisor a correr (pid {block.get(SUPERVISOR, "pid")})', file=sys.stderr)
+            return 1
+        Supervisor(args.status, args.interval).run()
+        return 0
+
+    if args.command in COMMANDS:
+        unknown = set(args.strategies) - set(block.names)
+        if unknown:
+            parser.error(f'estratégias desconhecidas: {", ".join(sorted(unknown))}')
+        block.command(args.strategies or block.names, COMMANDS[args.command])
+        if args.command != 'stop' and ensure_running(args.status, block):
+            print('supervisor lançado', file=sys.stderr)
+        return 0
+
+    now = time.time()
+    status = block.snapshot()
+    for i, name in enumerate(status['name']):
+        heartbeat = status['heartbeat'][i]
+        print(f'{name:<14} {STATES[status["state"][i]]:<9} pid {status["pid"][i]:<7} '
+              f'heartbeat {_format_age(now - heartbeat if heartbeat else None):>6}  '
+              f'ciclo {status["loop_ms_avg"][i]:7.1f}ms  trades {status["trades"][i]:<5} '
+              f'restarts {status["restarts"][i]:<3} {status["error"][i]}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+"""Varrimento multi-core dos limites de risco (stop-loss, take-profit, tamanho).
+
+Avalia uma grelha (ou uma amostra aleatória da grelha) de combinações de
+``stop_loss_pct``, ``take_profit_pct`` e ``max_position_pct`` por
+estratégia, com os sinais de ``backtest``. Três observações tornam isto
+barato:
+
+* as entradas não dependem dos limites, por isso o sinal é calculado uma
+  vez por estratégia e mercado;
+* o tamanho da posição só escala o P&L, por isso só os pares (stop,
+  take-profit) exigem simular saídas;
+* para cada entrada, o máximo e o mínimo corridos dos preços até ao prazo
+  do time-stop dão a primeira passagem por qualquer nível com uma só
+  comparação, por isso todos os níveis saem da mesma matriz.
+
+Os preços de todos os mercados ficam em memória partilhada
+(``multiprocessing.shared_memory``); os workers do pool ligam-se a ela no
+arranque e cada tarefa (estratégia, fatia de mercados) devolve apenas
+somas por par e o P&L diário por par, que se somam no fim. Sharpe (por
+trade), drawdown (sobre a equity diária) e P&L de cada combinação saem
+dessas somas.
+
+Uso::
+
+    python -m trading.sweep run --name grelha [--samples 200] [--workers 8]
+    python -m trading.sweep list
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+from trading import backtest, settings, ticks
+
+SWEEP_DIR = backtest.BACKTEST_DIR / 'sweeps'
+
+# Os mesmos intervalos dos sliders da página de controlo
+GRID = {
+    'stop_loss_pct': list(range(5, 55, 5)),
+    'take_profit_pct': list(range(5, 55, 5)),
+    'max_position_pct': list(range(1, 11)),
+}
+DAY_MS = 24 * 60 * 60 * 1000
+# Elementos por matriz de janelas (entradas x pontos até ao prazo)
+MAX_WINDOW = 2_000_000
+
+# Estado de cada worker (preenchido por _attach)
+_SHARED = []
+_SERIES = None
+_CONFIG = None
+
+
+def combinations(grid=None, samples=None, seed=42):
+    """Combinações (stop, take-profit, tamanho) da grelha ou uma amostra dela"""
+    grid = grid or GRID
+    mesh = np.stack(np.meshgrid(grid['stop_loss_pct'], grid['take_profit_pct'],
+                                grid['max_position_pct'], indexing='ij'), axis=-1)
+    combos = mesh.reshape(-1, 3).astype(np.float64)
+    if samples and samples < len(combos):
+        rng = np.random.default_rng(seed)
+        combos = combos[np.sort(rng.choice(len(combos), samples, replace=False))]
+    return combos
+
+
+def passages(price, index, last, levels, up):
+    """Primeira passagem de cada entrada por cada nível relativo.
+
+    Para ``up`` o nível é atingido quando ``preço >= entrada·(1+nível)``;
+    para baixo quando ``preço <= entrada·(1-nível)``, sempre nos pontos
+    ``(índice, last]``. Retorna uma matriz (entradas x níveis) com o índice
+    da passagem ou -1.
+    """
+    result = np.full((len(index), len(levels)), -1, dtype=np.int64)
+    if not len(index):
+        return result
+    span = last - index
+    height = int(span.max())
+    if height <= 0:
+        return result
+    n = len(price)
+    steps = np.arange(1, height + 1)
+    batch = max(MAX_WINDOW // height, 1)
+    levels = np.asarray(levels, dtype=np.float64)
+    for lo in range(0, len(index), batch):
+        i = index[lo:lo + batch]
+        window = i[:, None] + steps
+        values = price[np.minimum(window, n - 1)]
+        valid = window <= last[lo:lo + batch, None]
+        entry = price[i][:, None]
+        # Posições depois do prazo não podem disparar: o acumulado só as
+        # arrasta para a frente
+        if up:
+            running = np.maximum.accumulate(np.where(valid, values, -np.inf), axis=1)
+        else:
+            running = np.minimum.accumulate(np.where(valid, values, np.inf), axis=1)
+        for k, level in enumerate(levels):
+            if up:
+                before = (running < entry * (1 + level)).sum(axis=1)
+            else:
+                before = (running > entry * (1 - level)).sum(axis=1)
+            hit = before < span[lo:lo + batch]
+            result[lo:lo + batch, k] = np.where(hit, i + before + 1, -1)
+    return result
+
+
+def _first(a, b):
+    """Mínimo de dois índices de passagem, ignorando -1"""
+    big = np.iinfo(np.int64).max
+    return np.minimum(np.where(a < 0, big, a), np.where(b < 0, big, b))
+
+
+def evaluate_market(ts, price, strategy, pairs, levels, horizon, t0, days, totals):
+    """Soma em ``totals`` os trades de uma estratégia num mercado, por par (stop, take)"""
+    params = {**backtest.DEFAULT_PARAMS[strategy], **_CONFIG['params'].get(strategy, {})}
+    signal = backtest.SIGNALS[strategy](price, **params)
+    index = backtest.entries(signal)
+    if not len(index):
+        return
+    n = len(price)
+    long_side = signal[index] > 0
+    direction = np.where(long_side, 1.0, -1.0)
+    deadline = np.searchsorted(ts, ts[index] + horizon, 'left')
+    last = np.minimum(deadline, n - 1)
+    up = passages(price, index, last, levels, up=True)
+    down = passages(price, index, last, levels, up=False)
+    big = np.iinfo(np.int64).max
+
+    for p, (stop, take) in enumerate(pairs):
+        # LONG: take-profit acima, stop abaixo; SHORT: o inverso
+        upper = np.where(long_side, up[:, take], up[:, stop])
+        lower = np.where(long_side, down[:, stop], down[:, take])
+        first = _first(upper, lower)
+        closed = (first != big) | (deadline < n)
+        exit_index = np.where(first != big, first, np.minimum(deadline, n - 1))
+
+        chosen = backtest.select(index, exit_index)
+        chosen = chosen[closed[chosen]]
+        if not len(chosen):
+            continue
+        i, j = index[chosen], exit_index[chosen]
+        ret = direction[chosen] * (price[j] / price[i] - 1)
+        totals['count'][p] += len(ret)
+        totals['wins'][p] += int((ret > 0).sum())
+        totals['sum'][p] += ret.sum()
+        totals['sum_sq'][p] += (ret * ret).sum()
+        day = np.clip((ts[j] - t0) // DAY_MS, 0, days - 1)
+        totals['daily'][p] += np.bincount(day, weights=ret, minlength=days)
+
+
+def _attach(specs, config):
+    """Initializer dos workers: liga-se aos arrays em memória partilhada"""
+    global _SERIES, _CONFIG
+    arrays = []
+    for name, dtype, shape in specs:
+        # Os workers (spawn) partilham o resource tracker do processo pai,
+        # que apaga os blocos no fim
+        shm = shared_memory.SharedMemory(name=name)
+        _SHARED.append(shm)
+        arrays.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+    _SERIES = tuple(arrays)
+    _CONFIG = config
+
+
+def _attach_local(ts, price, offsets, config):
+    """Equivalente a ``_attach`` quando as tarefas correm no próprio processo"""
+    global _SERIES, _CONFIG
+    _SERIES = (ts, price, offsets)
+    _CONFIG = config
+
+
+def _task(strategy, first, last):
+    """Tarefa do pool: uma estratégia nos mercados [first, last)"""
+    ts, price, offsets = _SERIES
+    pairs, days = _CONFIG['pairs'], _CONFIG['days']
+    totals = {
+        'count': np.zeros(len(pairs), dtype=np.int64),
+        'wins': np.zeros(len(pairs), dtype=np.int64),
+        'sum': np.zeros(len(pairs)),
+        'sum_sq': np.zeros(len(pairs)),
+        'daily': np.zeros((len(pairs), days)),
+    }
+    for m in range(first, last):
+        a, b = offsets[m], offsets[m + 1]
+        if b - a >= 2:
+            evaluate_market(ts[a:b], price[a:b], strategy, pairs, _CONFIG['levels'],
+                            _CONFIG['horizon'], _CONFIG['t0'], days, totals)
+    return strategy, totals
+
+
+def load_prices(markets, ticks_dir, start=None, end=None, resolution='1m'):
+    """Séries de todos os mercados concatenadas: (ts, preço, offsets)"""
+    store = ticks.TickStore(ticks_dir)
+    try:
+        series = [backtest.load_series(store, market, start, end, resolution) for market in markets]
+    finally:
+        store.close()
+    offsets = np.concatenate(([0], np.cumsum([len(ts) for ts, _ in series]))).astype(np.int64)
+    ts = np.concatenate([ts for ts, _ in series]).astype(np.int64) if series else np.zeros(0, np.int64)
+    price = np.concatenate([p for _, p in series]).astype(np.float64) if series else np.zeros(0)
+    return ts, price, offsets
+
+
+def metrics(combos, totals, bankroll):
+    """Métricas de cada combinação a partir das somas do seu par (stop, take)"""
+    count = totals['count'].astype(np.float64)
+    mean = np.divide(totals['sum'], count, out=np.zeros_like(count), where=count > 0)
+    variance = np.divide(totals['sum_sq'] - count * mean * mean, count - 1,
+                         out=np.zeros_like(count), where=count > 1)
+    std = np.sqrt(np.maximum(variance, 0.0))
+    sharpe = np.divide(mean, std, out=np.zeros_like(mean), where=std > 1e-12)
+
+    size = bankroll * combos[:, 2] / 100
+    pair = totals['pair']
+    equity = bankroll + np.cumsum(totals['daily'][pair] * size[:, None], axis=1)
+    peak = np.maximum(np.maximum.accumulate(equity, axis=1), bankroll)
+    drawdown = ((peak - equity) / peak).max(axis=1, initial=0.0) * 100
+    pnl = totals['sum'][pair] * size
+    return {
+        'stop_loss_pct': combos[:, 0],
+        'take_profit_pct': combos[:, 1],
+        'max_position_pct': combos[:, 2],
+        'trades': totals['count'][pair],
+        'win_rate': np.divide(totals['wins'][pair], count[pair], out=np.zeros(len(pair)),
+                              where=count[pair] > 0) * 100,
+        'pnl': pnl,
+        'pnl_pct': pnl / bankroll * 100,
+        'sharpe': sharpe[pair],
+        'max_drawdown': drawdown,
+    }
+
+
+def run(name, strategies=None, grid=None, samples=None, seed=42, markets=None, start=None,
+        end=None, resolution='1m', bankroll=1000.0, workers=None, ticks_dir=ticks.TICKS_DIR):
+    """Corre o varrimento e grava-o em ``SWEEP_DIR/<name>.json``; retorna o resultado"""
+    started = time.perf_counter()
+    strategies = list(strategies or backtest.DEFAULT_PARAMS)
+    combos = combinations(grid, samples, seed)
+    # Pares (stop, take) distintos e os níveis que usam
+    pair_values, pair_of = np.unique(combos[:, :2], axis=0, return_inverse=True)
+    levels = np.unique(pair_values)
+    pairs = [(int(np.searchsorted(levels, s)), int(np.searchsorted(levels, t)))
+             for s, t in pair_values]
+
+    if markets is None:
+        store = ticks.TickStore(ticks_dir)
+        markets = store.markets()
+        store.close()
+    markets = list(markets)
+    ts, price, offsets = load_prices(markets, ticks_dir, ticks.to_millis(start),
+                                     ticks.to_millis(end), resolution)
+    loaded = time.perf_counter() - started
+    t0 = int(ts.min()) // DAY_MS * DAY_MS if len(ts) else 0
+    days = int((ts.max() - t0) // DAY_MS) + 1 if len(ts) else 1
+    limits = settings.load_risk_limits()
+    config = {
+        'params': {},
+        'pairs': pairs,
+        'levels': levels / 100,
+        'horizon': int(limits['time_stop_days'] * DAY_MS),
+        't0': t0,
+        'days': days,
+    }
+
+    workers = workers or os.cpu_count() or 1
+    # ~4 tarefas por processo, para equilibrar mercados com mais ou menos entradas
+    per_strategy = max(-(-workers * 4 // len(strategies)), 1) if workers > 1 else 1
+    chunk = max(-(-len(markets) // per_strategy), 1)
+    tasks = [(strategy, first, min(first + chunk, len(markets)))
+             for strategy in strategies for first in range(0, len(markets), chunk)]
+    results = {strategy: None for strategy in strategies}
+
+    def merge(strategy, totals):
+        if results[strategy] is None:
+            results[strategy] = totals
+        else:
+            for key, value in totals.items():
+                results[strategy][key] += value
+
+    blocks = []
+    try:
+        specs = []
+        for array in (ts, price, offsets):
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+            specs.append((shm.name, array.dtype.str, array.shape))
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(workers, mp_context=get_context('spawn'),
+                                     initializer=_attach, initargs=(specs, config)) as pool:
+                for strategy, totals in pool.map(_task, *zip(*tasks)):
+                    merge(strategy, totals)
+        else:
+            _attach_local(ts, price, offsets, config)
+            for task in tasks:
+                merge(*_task(*task))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+    rows = {}
+    for strategy in strategies:
+        totals = dict(results[strategy], pair=pair_of.ravel())
+        for key, values in metrics(combos, totals, bankroll).items():
+            rows.setdefault(key, []).extend(np.asarray(values).tolist())
+        rows.setdefault('strategy', []).extend([strategy] * len(combos))
+
+    result = {
+        'name': name,
+        'strategies': strategies,
+        'combinations': len(combos),
+        'pairs': len(pairs),
+        'markets': len(markets),
+        'points': len(ts),
+        'resolution': resolution,
+        'bankroll': bankroll,
+        'time_stop_days': limits['time_stop_days'],
+        'workers': workers,
+        'load_s': loaded,
+        'total_s': time.perf_counter() - started,
+        'results': rows,
+    }
+    SWEEP_DIR.mkdir(parents=True, exist_ok=True)
+    (SWEEP_DIR / f'{name}.json').write_text(json.dumps(result) + '\n', encoding='utf-8')
+    return result
+
+
+def load(name):
+    """Resultado de um varrimento gravado"""
+    return json.loads((SWEEP_DIR / f'{name}.json').read_text(encoding='utf-8'))
+
+
+def list_sweeps():
+    """Varrimentos gravados, do mais recente para o mais antigo"""
+    if not SWEEP_DIR.exists():
+        return []
+    paths = sorted(SWEEP_DIR.glob('*.json'), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [path.stem for path in paths]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Varrimento dos limites de risco por estratégia')
+    parser.add_argument('command', choices=['run', 'list'])
+    parser.add_argument('markets', nargs='*', help='mercados (todos por omissão)')
+    parser.add_argument('--name', default=time.strftime('%Y%m%d-%H%M%S'), help='nome do varrimento')
+    parser.add_argument('--strategy', action='append', choices=list(backtest.DEFAULT_PARAMS),
+                        help='estratégia (repetível; todas por omissão)')
+    parser.add_argument('--samples', type=int, help='amostra aleatória da grelha (grelha toda por omissão)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--start', help='início (data ou datetime UTC)')
+    parser.add_argument('--end', help='fim (data ou datetime UTC)')
+    parser.add_argument('--resolution', default='1m', choices=[*backtest.ohlc.RESOLUTIONS, 'tick'])
+    parser.add_argument('--bankroll', type=float, default=1000.0, help='capital inicial')
+    parser.add_argument('--workers', type=int, help='processos (todos os cores por omissão)')
+    parser.add_argument('--dir', default=ticks.TICKS_DIR, help='pasta do armazém de ticks')
+    args = parser.parse_intermixed_args(argv)
+
+    if args.command == 'list':
+        for name in list_sweeps():
+            print(name)
+        return 0
+
+    result = run(args.name, args.strategy, samples=args.samples, seed=args.seed,
+                 markets=args.markets or None, start=args.start, end=args.end,
+                 resolution=None if args.resolution == 'tick' else args.resolution,
+                 bankroll=args.bankroll, workers=args.workers, ticks_dir=args.dir)
+    total = result['combinations'] * len(result['strategies'])
+    print(f'{total} combinações ({result["pairs"]} pares stop/take) em {result["markets"]} mercados: '
+          f'{result["total_s"]:.1f}s com {result["workers"]} processos')
+    rows = result['results']
+    best = sorted(range(len(rows['sharpe'])), key=lambda k: rows['sharpe'][k], reverse=True)[:5]
+    for k in best:
+        print(f'  {rows["strategy"][k]:<14} SL {rows["stop_loss_pct"][k]:>4.0f}% '
+              f'TP {rows["take_profit_pct"][k]:>4.0f}% pos {rows["max_position_pct"][k]:>4.0f}%  '
+              f'sharpe {rows["sharpe"][k]:+.3f}  P&L ${rows["pnl"][k]:+,.2f}  '
+              f'DD {rows["max_drawdown"][k]:.1f}%')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
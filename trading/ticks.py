@@ -0,0 +1,328 @@
+"""Armazém colunar de ticks de preço por mercado em ficheiros memory-mapped.
+
+Cada mercado tem uma pasta com uma coluna por ficheiro, sem cabeçalho:
+``ts.i8`` (epoch em milissegundos), ``price.f8`` e ``volume.f8``. Os ticks
+são só acrescentados ao fim, por ordem de tempo, sem reescrever o que já
+existe; ``blocks.i8`` guarda o timestamp do primeiro tick de cada bloco de
+``BLOCK_SIZE`` ticks e serve de índice de intervalos de tempo.
+
+As leituras devolvem fatias de ``np.memmap``: não copiam dados e só as
+páginas realmente acedidas são lidas do disco. Localizar uma janela de
+tempo consulta o índice de blocos e depois um único bloco da coluna ts.
+
+O número de ticks de um mercado é o da coluna mais curta, por isso uma
+escrita interrompida a meio nunca expõe linhas incompletas; o escritor
+corta o excesso na escrita seguinte. As escritas de um mercado são
+serializadas entre processos por um ``flock`` em ``<mercado>/.lock``.
+
+Cada memmap mantém um descritor aberto: o processo guarda no máximo
+``MAX_OPEN_MAPS`` (os usados há mais tempo são largados) e o último preço
+de cada mercado é lido com ``pread``, sem memmap.
+
+Uso::
+
+    python -m trading.ticks info [--dir PATH] [MARKET ...]
+"""
+import argparse
+import os
+import shutil
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timezone
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from trading import db
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos
+    fcntl = None
+
+TICKS_DIR = Path(os.environ.get('TRADING_TICKS_DIR', db.DB_PATH.parent / 'ticks'))
+
+COLUMNS = {
+    'ts': np.dtype('<i8'),
+    'price': np.dtype('<f8'),
+    'volume': np.dtype('<f8'),
+}
+BLOCK_SIZE = 4096
+# Índice de blocos: ts do primeiro tick de cada bloco
+BLOCKS = {'blocks': np.dtype('<i8')}
+
+MAX_OPEN_MAPS = 64  # memmaps (um descritor cada) abertos no processo
+_maps = OrderedDict()  # ficheiro -> (comprimento, memmap), do mais antigo ao mais recente
+_maps_lock = threading.Lock()
+
+
+def to_millis(value):
+    """datetime, string ISO ou epoch em segundos -> epoch em milissegundos"""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value) * 1000
+    if isinstance(value, (float, np.floating)):
+        return int(value * 1000)
+    moment = db.parse_time(value)
+    if moment.tzinfo is None:
+        # As datas da DB são UTC sem fuso (como o strftime('%s') do SQLite)
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+class ColumnFiles:
+    """Colunas de largura fixa, só acrescentadas, numa pasta (um ficheiro cada).
+
+    O comprimento do conjunto é o da coluna mais curta; ``repair`` corta as
+    restantes depois de uma escrita interrompida.
+    """
+
+    def __init__(self, directory, dtypes):
+        self.directory = Path(directory)
+        self.dtypes = dtypes
+
+    def path(self, name):
+        """Ficheiro de uma coluna, p.ex. ``ts.i8`` ou ``price.f8``"""
+        dtype = self.dtypes[name]
+        return self.directory / f'{name}.{dtype.kind}{dtype.itemsize}'
+
+    def length(self, name):
+        try:
+            return self.path(name).stat().st_size // self.dtypes[name].itemsize
+        except FileNotFoundError:
+            return 0
+
+    def count(self):
+        return min(self.length(name) for name in self.dtypes)
+
+    def column(self, name):
+        """memmap só de leitura da coluna (reaberto quando o ficheiro cresce)"""
+        dtype = self.dtypes[name]
+        length = self.length(name)
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        path = self.path(name)
+        with _maps_lock:
+            cached = _maps.get(path)
+            if cached is None or cached[0] != length:
+                cached = _maps[path] = (length, np.memmap(path, dtype=dtype, mode='r', shape=(length,)))
+            _maps.move_to_end(path)
+            # O descritor fecha quando ninguém mais usar o memmap largado
+            while len(_maps) > MAX_OPEN_MAPS:
+                _maps.popitem(last=False)
+        return cached[1]
+
+    def value(self, name, index):
+        """Um valor da coluna lido com pread (sem memmap nem descritor que fique aberto)"""
+        dtype = self.dtypes[name]
+        fd = os.open(self.path(name), os.O_RDONLY)
+        try:
+            data = os.pread(fd, dtype.itemsize, index * dtype.itemsize)
+        finally:
+            os.close(fd)
+        return np.frombuffer(data, dtype=dtype)[0]
+
+    def columns(self):
+        """Todas as colunas cortadas ao comprimento comum (sem cópia)"""
+        n = self.count()
+        return {name: self.column(name)[:n] for name in self.dtypes}
+
+    def append(self, values):
+        """Acrescenta ``values`` (dict coluna -> array) ao fim de cada ficheiro"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, dtype in self.dtypes.items():
+            with open(self.path(name), 'ab') as f:
+                f.write(np.ascontiguousarray(values[name], dtype=dtype).tobytes())
+
+    def repair(self):
+        """Corta todas as colunas ao comprimento comum; retorna-o"""
+        n = self.count()
+        for name, dtype in self.dtypes.items():
+            if self.length(name) != n:
+                os.truncate(self.path(name), n * dtype.itemsize)
+        return n
+
+    def close(self):
+        """Larga os memmaps das colunas desta pasta"""
+        with _maps_lock:
+            for name in self.dtypes:
+                _maps.pop(self.path(name), None)
+
+
+class TickStore:
+    """Ticks de todos os mercados guardados em ``root``"""
+
+    def __init__(self, root=TICKS_DIR):
+        self.root = Path(root)
+        self._lock = threading.Lock()
+        # mercado -> (ticks, índice de blocos)
+        self._files = {}
+
+    def market_dir(self, market_id):
+        return self.root / quote(str(market_id), safe='')
+
+    @contextmanager
+    def _locked(self, market_id):
+        """Lock exclusivo por mercado entre processos (escritores de ticks)"""
+        directory = self.market_dir(market_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / '.lock', 'w') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _market(self, market_id):
+        files = self._files.get(market_id)
+        if files is None:
+            directory = self.market_dir(market_id)
+            files = (ColumnFiles(directory, COLUMNS), ColumnFiles(directory, BLOCKS))
+            self._files[market_id] = files
+        return files
+
+    # ---------- leitura ----------
+
+    def markets(self):
+        """Mercados com pelo menos um tick"""
+        if not self.root.exists():
+            return []
+        return sorted(unquote(path.name) for path in self.root.iterdir()
+                      if path.is_dir() and self.count(unquote(path.name)))
+
+    def count(self, market_id):
+        """Número de ticks completos do mercado"""
+        return self._market(market_id)[0].count()
+
+    def columns(self, market_id):
+        """As três colunas inteiras do mercado (memmaps, sem cópia)"""
+        return tuple(self._market(market_id)[0].columns().values())
+
+    def time_range(self, market_id):
+        """(primeiro ts, último ts, número de ticks) em milissegundos"""
+        ts = self.columns(market_id)[0]
+        if not len(ts):
+            return None, None, 0
+        return int(ts[0]), int(ts[-1]), len(ts)
+
+    def _search(self, ts, blocks, value, side):
+        """Posição de ``value`` em ``ts`` tocando só no índice e num bloco"""
+        k = int(np.searchsorted(blocks, value, side))
+        lo = (k - 1) * BLOCK_SIZE if k > 0 else 0
+        hi = k * BLOCK_SIZE if k < len(blocks) else len(ts)
+        hi = min(hi, len(ts))
+        return lo + int(np.searchsorted(ts[lo:hi], value, side))
+
+    def locate(self, market_id, start=None, end=None):
+        """Índices [i, j) dos ticks com start <= ts <= end (ms)"""
+        ts = self.columns(market_id)[0]
+        blocks = self._market(market_id)[1].column('blocks')
+        i = 0 if start is None else self._search(ts, blocks, start, 'left')
+        j = len(ts) if end is None else self._search(ts, blocks, end, 'right')
+        return i, max(i, j)
+
+    def read(self, market_id, start=None, end=None):
+        """(ts, price, volume) entre ``start`` e ``end`` como fatias sem cópia.
+
+        ``start``/``end`` aceitam o mesmo que ``to_millis``.
+        """
+        i, j = self.locate(market_id, to_millis(start), to_millis(end))
+        return tuple(column[i:j] for column in self.columns(market_id))
+
+    def last(self, market_id):
+        """(ts, preço) do último tick do mercado ou None"""
+        files = self._market(market_id)[0]
+        n = files.count()
+        if not n:
+            return None
+        return int(files.value('ts', n - 1)), float(files.value('price', n - 1))
+
+    def last_prices(self, market_ids):
+        """Último preço de cada mercado num array (NaN para mercados sem ticks)"""
+        prices = np.full(len(market_ids), np.nan)
+        for i, market_id in enumerate(market_ids):
+            files = self._market(market_id)[0]
+            n = files.count()
+            if n:
+                prices[i] = files.value('price', n - 1)
+        return prices
+
+    # ---------- escrita ----------
+
+    def append(self, market_id, ts, price, volume=None):
+        """Acrescenta ticks ao fim do mercado; ``ts`` em ms e não decrescente.
+
+        Retorna o número total de ticks do mercado depois da escrita.
+        """
+        ts = np.ascontiguousarray(ts, dtype=COLUMNS['ts'])
+        price = np.ascontiguousarray(price, dtype=COLUMNS['price'])
+        volume = (np.zeros(len(ts), dtype=COLUMNS['volume']) if volume is None
+                  else np.ascontiguousarray(volume, dtype=COLUMNS['volume']))
+        if not (len(ts) == len(price) == len(volume)):
+            raise ValueError('ts, price e volume têm tamanhos diferentes')
+        if np.any(np.diff(ts) < 0):
+            raise ValueError('ticks fora de ordem temporal')
+
+        with self._lock, self._locked(market_id):
+            files, index = self._market(market_id)
+            n = self._repair(market_id)
+            if not len(ts):
+                return n
+            if n and ts[0] < files.value('ts', n - 1):
+                raise ValueError(f'ticks anteriores ao último tick de {market_id}')
+
+            files.append({'ts': ts, 'price': price, 'volume': volume})
+
+            # Novas entradas do índice: primeiro tick de cada bloco iniciado
+            first_block = -(-n // BLOCK_SIZE)
+            starts = np.arange(first_block * BLOCK_SIZE, n + len(ts), BLOCK_SIZE) - n
+            if len(starts):
+                index.append({'blocks': ts[starts]})
+            return n + len(ts)
+
+    def _repair(self, market_id):
+        """Corta colunas e índice ao número de ticks completos (com ``_locked``)"""
+        files, index = self._market(market_id)
+        n = files.repair()
+        if index.count() != -(-n // BLOCK_SIZE):
+            index.path('blocks').unlink(missing_ok=True)
+            index.append({'blocks': files.column('ts')[:n:BLOCK_SIZE]})
+        return n
+
+    def drop(self, market_id):
+        """Apaga todos os ticks de um mercado"""
+        with self._lock:
+            for column_files in self._files.pop(market_id, ()):
+                column_files.close()
+            shutil.rmtree(self.market_dir(market_id), ignore_errors=True)
+
+    def close(self):
+        """Liberta os memmaps abertos"""
+        with self._lock:
+            for files in self._files.values():
+                for column_files in files:
+                    column_files.close()
+            self._files.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Armazém de ticks por mercado')
+    parser.add_argument('command', choices=['info'])
+    parser.add_argument('markets', nargs='*', help='mercados (todos por omissão)')
+    parser.add_argument('--dir', default=TICKS_DIR, help='pasta do armazém de ticks')
+    args = parser.parse_intermixed_args(argv)
+
+    store = TickStore(args.dir)
+    for market in args.markets or store.markets():
+        first, last, count = store.time_range(market)
+        if not count:
+            print(f'{market}: sem ticks')
+            continue
+        print(f'{market}: {count} ticks de {np.datetime64(first, "ms")} a {np.datetime64(last, "ms")}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())